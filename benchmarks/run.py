@@ -0,0 +1,202 @@
+"""
+Headless benchmarks of every page's data path on synthetic data.
+
+    python -m benchmarks.run --scales 1 10 100 --output benchmark_results.json
+
+For each scale the synthetic files are generated once (and reused from
+--data-dir afterwards), then each step is timed --repeat times by calling
+the same functions the pages call, without Streamlit caching and without a
+Streamlit server. Steps that hold the whole performance frame in memory are
+skipped above --max-memory-rows; the out-of-core rollups run at every scale.
+Results are written as JSON (timings in seconds).
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from benchmarks import synthetic
+from dashboards import demand_supply, demand_variation, route_performance
+from pipeline import demand_cube, dimensions, loaders, od_matrix, query, registry, ridership_profile, ridership_store, rollups, route_index, route_join, streaming
+
+
+DEFAULT_DATA_DIR = os.path.join("data", "synthetic")
+
+# Routes opened in the route drill-down benchmark
+DRILL_DOWN_ROUTES = 20
+
+# Above this many trips the in-memory steps are skipped (about 4 GB of frame)
+MAX_MEMORY_ROWS = 60_000_000
+
+
+# Peak resident memory of this process so far (scales run in the given order)
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / 1024 ** (2 if sys.platform == "darwin" else 1), 1)
+
+
+def time_step(function, repeat):
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - start)
+    return {"seconds": [round(value, 4) for value in seconds],
+            "min": round(min(seconds), 4), "median": round(statistics.median(seconds), 4)}
+
+
+def data_files(data_dir, scale, seed):
+    directory = os.path.join(data_dir, f"{scale:g}x")
+    ridership = os.path.join(directory, "ridership.csv")
+    performance = os.path.join(directory, "performance.parquet")
+    if os.path.exists(ridership) and os.path.exists(performance):
+        return {"ridership": ridership, "performance": performance, "generated": False}
+    start = time.perf_counter()
+    result = synthetic.generate(directory, scale, seed)
+    result["generate_seconds"] = round(time.perf_counter() - start, 2)
+    result["derive_rows_per_second"] = round(result["rows"] / result["derive"]) if result["derive"] else None
+    result["generated"] = True
+    return result
+
+
+# Time every step of one scale; returns one result record
+def run_scale(scale, data_dir, repeat, max_memory_rows, seed):
+    files = data_files(data_dir, scale, seed)
+    performance_rows = pq.ParquetFile(files["performance"]).metadata.num_rows
+    steps = {}
+
+    def step(name, function):
+        steps[name] = time_step(function, repeat)
+        print(f"  {name:42} {steps[name]['median']:9.3f}s")
+
+    # Results of the last run of a step that later steps build on
+    loaded = {}
+
+    # Loading (app start / first request)
+    step("load.dimensions", lambda: loaded.update(dims=dimensions.build_dimensions(
+        pd.read_csv(files["ridership"], usecols=dimensions.RIDERSHIP_COLUMNS),
+        loaders.distinct_rows(files["performance"], dimensions.PERFORMANCE_COLUMNS))))
+    dims = loaded["dims"]
+    step("load.ridership", lambda: loaded.update(
+        ridership=dimensions.encode_ridership(pd.read_csv(files["ridership"]), dims)))
+    ridership = loaded["ridership"]
+    step("overview.headline", lambda: loaders.headline_numbers(files["ridership"]))
+    step("overview.performance_sample", lambda: loaders.load_performance_sample(files["performance"]))
+    step("registry.fingerprint", lambda: registry.fingerprint(files["performance"]))
+
+    # Demand vs. Supply: the cube (stored aggregates, then every rollup), and
+    # grouped shares for every analysis type / grouping and a route drill-down
+    step("demand_supply.cube", lambda: loaded.update(cube=demand_cube.build_cube(ridership_store.aggregate(
+        pd.read_csv(files["ridership"], usecols=ridership_store.CUBE_KEYS + ridership_store.MEASURES))["cube"])))
+    cube = loaded["cube"]
+
+    def shares():
+        for analysis_type in ["Weekly Comparison", "Daily Comparison"]:
+            for group_by in demand_cube.DIMENSIONS:
+                demand_supply.demand_supply_shares(demand_cube.query(cube, [group_by]), analysis_type, group_by)
+        filters = {}
+        for dimension in demand_cube.DRILL_PATH[:-1]:
+            filters[dimension] = demand_cube.members(cube, dimension, filters)[0]
+            demand_cube.drill_down(cube, filters)
+    step("demand_supply.shares", shares)
+
+    # Origin-Destination: the sparse matrix, then top corridors and the heatmap block
+    step("origin_destination.matrix", lambda: loaded.update(od=od_matrix.build_od_matrix(ridership)))
+    od = loaded["od"]
+    step("origin_destination.queries", lambda: [
+        (od_matrix.top_corridors(od, 15, measure), od_matrix.top_cities_matrix(od, 20, measure))
+        for measure in od_matrix.MEASURES])
+
+    # Variation Over Time
+    step("demand_variation.passenger_profile", lambda: ridership_profile.build_time_profile(ridership))
+
+    # Out of core: bounded memory whatever the scale
+    step("route_performance.streaming_rollups", lambda: streaming.stream_rollups(files["performance"]))
+
+    skipped = None
+    if performance_rows > max_memory_rows:
+        skipped = f"{performance_rows:,} trips > --max-memory-rows {max_memory_rows:,}"
+        print(f"  in-memory steps skipped: {skipped}")
+    else:
+        step("load.performance", lambda: loaded.update(performance=dimensions.encode_performance(
+            loaders.load_performance(files["performance"])[0], dims)))
+        performance = loaded["performance"]
+        backend = query.PandasBackend(performance, routes=route_index.build_route_index(performance))
+
+        step("demand_variation.trips", lambda: demand_variation.process_trips_data.__wrapped__(backend, None))
+        step("route_performance.rollups", lambda: loaded.update(rollups=rollups.build_delay_rollups(backend)))
+        cube = loaded["rollups"]["cube"]
+        step("route_performance.route_stats", lambda: rollups.rollup(cube, rollups.ROLLUP_KEYS["route"])
+             .query("trips >= 50").nlargest(10, "avg_delay"))
+
+        route_ids = loaded["rollups"]["route"].nlargest(DRILL_DOWN_ROUTES, "trips")["OperatorLineId"]
+        step("route_performance.route_profile", lambda: [
+            route_performance.route_profile.__wrapped__(backend, None, route_id) for route_id in route_ids])
+        step("route_performance.route_join", lambda: route_join.build_route_join(ridership, loaded["rollups"]["route"]))
+        step("route_performance.day_boxes", lambda: rollups.day_boxes(cube, loaded["rollups"]["day_sketch"]))
+        loaded.clear()
+
+    return {
+        "scale": scale,
+        "ridership_rows": len(ridership),
+        "performance_rows": performance_rows,
+        "data": {key: value for key, value in files.items() if key not in ("ridership", "performance")},
+        "steps": steps,
+        "skipped_in_memory": skipped,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "pyarrow": pa.__version__,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard data paths on synthetic data.")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1], help="multiples of the real data size")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="where synthetic data is generated / reused")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per step")
+    parser.add_argument("--max-memory-rows", type=int, default=MAX_MEMORY_ROWS,
+                        help="skip in-memory steps above this many trips")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON results file")
+    args = parser.parse_args()
+
+    results = []
+    for scale in args.scales:
+        print(f"scale {scale:g}x")
+        results.append(run_scale(scale, args.data_dir, args.repeat, args.max_memory_rows, args.seed))
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "environment": environment(),
+            "repeat": args.repeat,
+            "results": results,
+        }, f, indent=2)
+    print(f"wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Synthetic ridership and performance data with the schema of the real files,
+at a multiple of their size.
+
+    python -m benchmarks.synthetic --scale 10 --output data/synthetic/10x
+
+Scale 1 is the size of the real data: one row per route in
+`2024_public_transport_ridership.csv` and one month of trips as in
+`2024_march_bus_performance.parquet`. Trip rows reference the ridership
+routes (OperatorLineId = RouteID), operators and clusters, and delays have
+a heavy right tail, so every dashboard path does realistic work.
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from pipeline import preprocess, ridership_profile, time_buckets
+from pipeline.dimensions import METRO_MAPPING
+
+
+# Size of the real data: routes in the ridership file, and trips in one
+# month (the routes' weekly rides, about 1.32 million, times 31 / 7)
+REAL_RIDERSHIP_ROWS = 10_664
+REAL_PERFORMANCE_ROWS = 5_800_000
+
+# Trip rows generated (and derived) per chunk / parquet row group
+CHUNK_ROWS = 1_000_000
+
+MONTH = "2024-03"
+
+AGENCIES = ["אגד", "קווים", "מטרופולין", "סופרבוס", "נתיב אקספרס", "אלקטרה אפיקים", "דן", "אקסטרה",
+            "אפיקים", "גלים", "בית שמש אקספרס", "דן בדרום"]
+CLUSTERS = sorted({name for names in METRO_MAPPING.values() for name in names})
+METROPOLINS = ["י-ם", "גולן גליל ועמקים", "מרכז", "מטרופולין חיפה", "הדרום", "גוש דן", "שרון", "באר שבע"]
+CITIES = ["ירושלים", "תל אביב יפו", "חיפה", "באר שבע", "אשדוד", "פתח תקווה", "נתניה", "חולון", "ראשון לציון",
+          "בני ברק", "רמת גן", "אשקלון", "רחובות", "בית שמש", "כפר סבא", "חדרה", "נצרת", "עפולה", "אילת", "טבריה"]
+ROUTE_TYPES = ["עירוני", "בינעירוני", "אזורי"]
+SERVICE_TYPES = ["מקומי מאסף", "מאסף", "מהיר", "ישיר", "עירוני עורקי מאסף", "עירוני עורקי מהיר"]
+ROUTE_PARTICULARS = ["סדיר", "תלמידים", "קווים מזינים", "לילה", "עונתי"]
+DAY_LABELS = {"WorkDay": "ימי חול", "Friday": "שישי", "Saturday": "שבת"}
+
+# Share of a route's passengers per day type and time range (rows sum to 1)
+DAY_SHARES = {"WorkDay": 0.80, "Friday": 0.12, "Saturday": 0.08}
+RANGE_SHARES = [0.02, 0.05, 0.25, 0.15, 0.17, 0.26, 0.10]
+
+# Departures per hour of day, relative (0:00 ... 23:00)
+HOUR_WEIGHTS = np.array([1, 0.5, 0.3, 0.3, 1, 3, 7, 9, 8, 6, 5, 5, 5, 5, 6, 8, 9, 8, 6, 4, 3, 2, 2, 1.5])
+
+
+def scaled_rows(real_rows, scale):
+    return max(1, int(round(real_rows * scale)))
+
+
+# One row per route, with every column of the ridership CSV
+def make_ridership(scale=1, seed=0):
+    rng = np.random.default_rng(seed)
+    n = scaled_rows(REAL_RIDERSHIP_ROWS, scale)
+
+    daily_rides = np.maximum(1, np.round(rng.lognormal(2.3, 1.0, n)))
+    weekly_rides = np.round(daily_rides * rng.uniform(4.5, 6.5, n))
+    riders_per_ride = np.round(rng.lognormal(2.4, 0.7, n), 1)
+    weekly_passengers = np.round(weekly_rides * riders_per_ride, 1)
+
+    data = pd.DataFrame({
+        "RouteID": np.arange(10_000, 10_000 + n),
+        "RouteName": rng.integers(1, 1000, n).astype("float64"),
+        "AgencyName": rng.choice(AGENCIES, n),
+        "ClusterName": rng.choice(CLUSTERS, n),
+        "Metropolin": rng.choice(METROPOLINS, n),
+        "OriginCityName": rng.choice(CITIES, n),
+        "DestinationCityName": rng.choice(CITIES, n),
+        "RouteType": rng.choice(ROUTE_TYPES, n),
+        "ServiceType": rng.choice(SERVICE_TYPES, n),
+        "RouteParticular": rng.choice(ROUTE_PARTICULARS, n, p=[0.8, 0.1, 0.05, 0.03, 0.02]),
+        "RouteLength": np.round(rng.lognormal(3.1, 0.8, n), 1),
+        "AVGPassengersPerWeek": np.round(rng.exponential(1.0, n), 1),
+        "StationsInRoute": rng.integers(5, 110, n).astype("float64"),
+        "AverageSpeed": np.round(rng.uniform(12, 80, n), 2),
+        "AverageTripDuration": np.round(rng.lognormal(3.9, 0.5, n), 2),
+        "DailyRides": daily_rides,
+        "WeekyRides": weekly_rides,
+        "DailyPassengers": np.round(weekly_passengers / 5.7, 2),
+        "WeeklyPassengers": weekly_passengers,
+        "AVGCommutersPerRide(Weekly)": riders_per_ride,
+    })
+
+    # Average passengers per ride in each day type / time range
+    columns = ridership_profile.profile_columns()
+    shares = np.array([DAY_SHARES[day] * share for day in time_buckets.DAY_TYPES for share in RANGE_SHARES])
+    noise = rng.uniform(0.5, 1.5, (n, len(columns)))
+    profile = np.round(riders_per_ride[:, None] * shares / shares.mean() * noise, 1)
+    data = pd.concat([data, pd.DataFrame(profile, columns=columns)], axis=1)
+
+    peak = np.asarray(columns)[profile.argmax(axis=1)]
+    data["MaxRidership"] = [f"{DAY_LABELS[label.split(' - ')[0]]} - {label.split(' - ')[1]}" for label in peak]
+    return data
+
+
+# Raw `bitzua_bus_trip` rows (what pipeline.preprocess reads) for the routes
+# of `ridership`, busier routes getting more trips
+def make_raw_trips(ridership, rows, seed=0):
+    rng = np.random.default_rng(seed)
+    weights = ridership["DailyRides"].to_numpy(dtype="float64")
+    route = rng.choice(len(ridership), rows, p=weights / weights.sum())
+
+    days = pd.date_range(f"{MONTH}-01", periods=pd.Period(MONTH).days_in_month, freq="D")
+    trip_day = days[rng.integers(0, len(days), rows)]
+    hour = rng.choice(24, rows, p=HOUR_WEIGHTS / HOUR_WEIGHTS.sum())
+    planned = trip_day + pd.to_timedelta(hour * 60 + rng.integers(0, 60, rows), unit="m")
+
+    # Mostly small delays, a few very late or early departures
+    delay = rng.gamma(1.5, 2.5, rows) - 2.5
+    tail = rng.random(rows) < 0.03
+    delay[tail] += rng.pareto(1.2, tail.sum()) * 10 * rng.choice([-0.3, 1.0], tail.sum())
+    actual = (planned + pd.to_timedelta(np.round(delay * 60), unit="s")).strftime("%Y-%m-%d %H:%M:%S")
+    actual = pd.Series(actual).where(rng.random(rows) >= 0.002)
+
+    return pd.DataFrame({
+        "trip_dt": trip_day.strftime("%Y-%m-%d"),
+        "trip_time": planned.strftime("%H:%M:%S"),
+        "bitzua_history_start_dt": actual,
+        # 1 = Sunday ... 7 = Saturday
+        "trip_day_in_week": ((trip_day.dayofweek + 1) % 7 + 1).astype("int64"),
+        "OperatorLineId": ridership["RouteID"].to_numpy()[route],
+        "operator_nm": ridership["AgencyName"].to_numpy()[route],
+        "cluster_nm": ridership["ClusterName"].to_numpy()[route],
+    })
+
+
+# Performance parquet with the derived columns, like the app's March file,
+# generated and derived one chunk at a time. Returns the derive timings.
+def write_performance(path, ridership, rows, seed=0, chunk_rows=CHUNK_ROWS):
+    writer = None
+    timings = {"rows": 0, "derive": 0.0}
+    try:
+        for chunk, start in enumerate(range(0, rows, chunk_rows)):
+            raw = make_raw_trips(ridership, min(chunk_rows, rows - start), seed + chunk)
+            started = time.perf_counter()
+            derived = preprocess.derive_performance_columns(raw).drop(columns=["month"])
+            timings["derive"] += time.perf_counter() - started
+            timings["rows"] += len(derived)
+
+            table = pa.Table.from_pandas(derived, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table.cast(writer.schema))
+    finally:
+        if writer is not None:
+            writer.close()
+    return timings
+
+
+# Both files for one scale; returns their paths and generation timings
+def generate(output_dir, scale=1, seed=0):
+    os.makedirs(output_dir, exist_ok=True)
+    ridership_path = os.path.join(output_dir, "ridership.csv")
+    performance_path = os.path.join(output_dir, "performance.parquet")
+
+    ridership = make_ridership(scale, seed)
+    ridership.to_csv(ridership_path, index=False)
+    timings = write_performance(performance_path, ridership, scaled_rows(REAL_PERFORMANCE_ROWS, scale), seed)
+    return {"ridership": ridership_path, "performance": performance_path,
+            "ridership_rows": len(ridership), **timings}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic ridership and performance data.")
+    parser.add_argument("--scale", type=float, default=1, help="multiple of the real data size")
+    parser.add_argument("--output", required=True, help="output directory")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    result = generate(args.output, args.scale, args.seed)
+    print(f"{result['ridership_rows']:,} routes, {result['rows']:,} trips in {args.output} "
+          f"({time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 import streamlit as st
 # import pandas as pd
 import plotly.express as px
+from pipeline import demand_cube, ridership_store, timing
+from pipeline.figure_cache import FigureCache
 
 
 # Load dataset
@@ -11,54 +13,97 @@ import plotly.express as px
 #     return data
 
 
+# Data this page asks for (see main.page_resources)
+REQUIRES = ("demand_cube", "figure_cache")
+
+# Labels of the drill-down selectors, along demand_cube.DRILL_PATH
+DRILL_LABELS = {"Metropolin": "Metropolitan area:", "ClusterName": "Region:", "AgencyName": "Operator:"}
+
+# Groups shown at most (the largest by demand or supply share)
+MAX_GROUPS = 40
+
 # Custom display names:
 display_names = {
     "Metropolin": "Metropolitan Area",
     "ClusterName": "Regions",
+    "AgencyName": "Operators",
+    "RouteType": "Route Type",
+    "ServiceType": "Service Type",
+    "OriginCityName": "Origin City",
+    "RouteID": "Routes",
     "DailyPassengers": "Daily Passengers",
     "DailyRides": "Daily Rides",
     "WeeklyPassengers": "Weekly Passengers",
     "WeekyRides": "Weekly Rides"
 }
 
-# Correct city/region names
-region_name_corrections = {
-    "חולון עירוני ומטרופוליני+תחרות חולון": "חולון עירוני",
-    "קווי נצרת - שאמ": "נצרת - שאם",
-    "קווי נצרת - נסיעות ותיירות": "נצרת"
-}
+# City/region name corrections are applied once at load time (pipeline/dimensions.py)
 
 
-# Set different chart sizes for ClusterName and Metropolin
-def get_chart_size(group_by_option):
+# Set different chart sizes for all clusters and for fewer groups
+def get_chart_size(group_by_option, groups=0):
     # return: (width, height, l, r)
-    if group_by_option == "ClusterName":
+    if group_by_option == "ClusterName" and groups > 20:
         return 1500, 1500, 10, 10   # Larger size for clusters
     else:
-        return 900, 600, 50, 50  # Smaller size for metropolitan areas
+        return 900, max(600, 30 * groups), 50, 50  # Smaller size for metropolitan areas
 
 
-# Generate the bar chart with dynamic size adjustment
-def generate_bar_chart(grouped_data, group_by_option, sort_order):
-    width, height, l, r = get_chart_size(group_by_option)
+def measure_columns(analysis_type):
+    if analysis_type == "Weekly Comparison":
+        return 'WeeklyPassengers', 'WeekyRides'
+    return 'DailyPassengers', 'DailyRides'
+
+
+# Demand and supply totals per group, and each group's share of the total (%).
+# `data` is route rows or totals per group from the cube (summing is the same).
+def demand_supply_shares(data, analysis_type, group_by_option):
+    # Filter and aggregate data based on selection
+    demand_col, supply_col = measure_columns(analysis_type)
+
+    # Aggregate data by the selected criteria
+    grouped_data = data.groupby(group_by_option, observed=True).agg({
+        demand_col: 'sum',
+        supply_col: 'sum'
+    }).reset_index()
 
-    # Sorting logic
+    # Calculate percentage of demand and supply
+    grouped_data["Demand (%)"] = round((grouped_data[demand_col] / grouped_data[demand_col].sum()) * 100, 2)
+    grouped_data["Supply (%)"] = round((grouped_data[supply_col] / grouped_data[supply_col].sum()) * 100, 2)
+
+    # Filter out rows where both demand and supply percentages are less than 1 (for clusters only)
+    if group_by_option == "ClusterName":
+        grouped_data = grouped_data[(grouped_data["Demand (%)"] >= 1) | (grouped_data["Supply (%)"] >= 1)]
+
+    # Long lists (origin cities, routes) keep their largest groups
+    if len(grouped_data) > MAX_GROUPS:
+        grouped_data = grouped_data.loc[grouped_data[["Demand (%)", "Supply (%)"]].max(axis=1)
+                                        .nlargest(MAX_GROUPS).index]
+    return grouped_data
+
+
+# Sorting logic
+def sort_groups(grouped_data, group_by_option, sort_order):
     if sort_order == "Supply":
         grouped_data = grouped_data.sort_values("Supply (%)", ascending=True)
     elif sort_order == "Demand":
         grouped_data = grouped_data.sort_values("Demand (%)", ascending=True)
     elif sort_order == "Name":
         grouped_data = grouped_data.sort_values(group_by_option, ascending=False)
+    return grouped_data
 
-    # Apply city name corrections
-    grouped_data[group_by_option] = grouped_data[group_by_option].replace(region_name_corrections)
+
+# Generate the bar chart with dynamic size adjustment
+def generate_bar_chart(grouped_data, group_by_option, sort_order, selection=""):
+    width, height, l, r = get_chart_size(group_by_option, len(grouped_data))
+    grouped_data = sort_groups(grouped_data, group_by_option, sort_order)
 
     fig_bar = px.bar(
         grouped_data,
         y=group_by_option,
         x=["Demand (%)", "Supply (%)"],
         orientation='h',
-        title=f"Demand vs Supply Percentage by {display_names.get(group_by_option, group_by_option)}",
+        title=f"Demand vs Supply Percentage by {display_names.get(group_by_option, group_by_option)}{selection}",
         labels={"value": "Percentage", "variable": "Metric"},
         text_auto=True,
         barmode='group',
@@ -75,8 +120,9 @@ def generate_bar_chart(grouped_data, group_by_option, sort_order):
         plot_bgcolor='rgba(0,0,0,0)',
         paper_bgcolor='white',
         xaxis_title="Percentage",
-        yaxis_title="Regions",
+        yaxis_title=display_names.get(group_by_option, group_by_option),
         xaxis=dict(showgrid=True, gridwidth=1, gridcolor='lightgrey'),
+        yaxis=dict(type='category'),
         font=dict(size=14),
         title_font=dict(size=22)
     )
@@ -84,7 +130,45 @@ def generate_bar_chart(grouped_data, group_by_option, sort_order):
     return fig_bar
 
 
-def show(ridership_data):
+# Change of demand and supply per group between two snapshots (%), for the
+# groups shown in the shares chart, in the same order
+def generate_change_chart(changes, grouped_data, group_by_option, analysis_type, snapshot, previous_snapshot):
+    demand_col, supply_col = measure_columns(analysis_type)
+    width, height, l, r = get_chart_size(group_by_option, len(grouped_data))
+
+    changes = changes.set_index(group_by_option).reindex(grouped_data[group_by_option]).reset_index()
+    changes = changes.rename(columns={f"{demand_col}_change_pct": "Demand change (%)",
+                                      f"{supply_col}_change_pct": "Supply change (%)"})
+
+    fig_change = px.bar(
+        changes,
+        y=group_by_option,
+        x=["Demand change (%)", "Supply change (%)"],
+        orientation='h',
+        title=f"Change in Demand and Supply, {snapshot} vs. {previous_snapshot}",
+        labels={"value": "Change (%)", "variable": "Metric"},
+        text_auto='.1f',
+        barmode='group',
+        color_discrete_map={"Demand change (%)": "#2E86C1", "Supply change (%)": "#F39C12"}
+    )
+    fig_change.update_traces(textangle=0, textposition='inside')
+    fig_change.update_layout(
+        height=height,
+        width=width,
+        margin=dict(l=l, r=r, t=50, b=50),
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='white',
+        xaxis_title="Change (%)",
+        yaxis_title=display_names.get(group_by_option, group_by_option),
+        xaxis=dict(showgrid=True, gridwidth=1, gridcolor='lightgrey', zeroline=True, zerolinecolor='grey'),
+        yaxis=dict(type='category'),
+        font=dict(size=14),
+        title_font=dict(size=22)
+    )
+    return fig_change
+
+
+def show(resources):
     st.title("📊 Demand vs. Supply Analysis")
     st.markdown("##### Analyze demand and supply discrepancies in public transportation by comparing ridership data with service frequency.")
 
@@ -94,7 +178,8 @@ def show(ridership_data):
         st.markdown("##### 🤔 How to Use", unsafe_allow_html=True, help=""" # This visualization compares passenger demand with bus service frequency across different regions.
 
     - Analysis type: choose between Weekly to Daily Comparison
-    - Group By: Choose to view data by Metropolitan Area or Regions
+    - Group By: Choose to view data by Metropolitan Area, Regions, Operators, Route or Service Type, or Origin City
+    - Drill down: pick a metropolitan area, then a region, then an operator, to see the level below within it (down to single routes)
     - Sort By:
        `Supply`: Sort by bus service frequency
        `Demand`: Sort by passenger numbers
@@ -108,44 +193,95 @@ def show(ridership_data):
     - Longer orange bars vs. short blue bars suggest over-serviced routes
         """)
 
-    # Load data
-    data = ridership_data
+    # Demand / supply cube of every ridership snapshot (see pipeline/demand_cube.py)
+    demand_cubes = resources["demand_cube"]
+    cubes = demand_cubes["cubes"]
+    snapshots = list(cubes)
 
     # Select columns for demand vs. supply comparison
     # st.markdown("#### Feature Selection", unsafe_allow_html=True)
     col1, col2, col3 = st.columns(3)
 
+    # Snapshot and year-over-year comparison, when the store holds several
+    snapshot, previous_snapshot = snapshots[-1], None
+    if len(snapshots) > 1:
+        col4, col5, _ = st.columns(3)
+        with col4:
+            snapshot = st.selectbox("Snapshot:", snapshots[::-1])
+        with col5:
+            earlier = [name for name in snapshots if name < snapshot][::-1]
+            previous_snapshot = st.selectbox("Compare with:", earlier + ["None"])
+            if previous_snapshot == "None":
+                previous_snapshot = None
+    cube = cubes[snapshot]
+
+    # Drill-down along metro area -> region -> operator; each selector lists
+    # the members within the selection above it
+    filters = {}
+    drill_columns = st.columns(len(DRILL_LABELS))
+    for level, (column, (dimension, label)) in enumerate(zip(drill_columns, DRILL_LABELS.items())):
+        enabled = len(filters) == level
+        with column:
+            choice = st.selectbox(label, ["All"] + (demand_cube.members(cube, dimension, filters) if enabled else []),
+                                  disabled=not enabled)
+        if enabled and choice != "All":
+            filters[dimension] = choice
+
     with col1:
         # User selection for analysis type
         analysis_type = st.selectbox("Analysis type:", ["Weekly Comparison", "Daily Comparison"])
     with col2:
-        # Select group-by criteria
-        group_by_option = st.selectbox("Group by:", ["Metropolin", "ClusterName"], format_func=lambda x: display_names.get(x, x))
+        # Select group-by criteria (a drill-down selection shows the level below it instead)
+        group_by_option = st.selectbox("Group by:", demand_cube.DIMENSIONS, format_func=lambda x: display_names.get(x, x),
+                                       disabled=bool(filters))
     with col3:
         sort_order = st.selectbox("Sort by:", ["Supply", "Demand", "Name"])
 
-    # Filter and aggregate data based on selection
-    if analysis_type == "Weekly Comparison":
-        demand_col, supply_col = 'WeeklyPassengers', 'WeekyRides'
-    else:
-        demand_col, supply_col = 'DailyPassengers', 'DailyRides'
+    selection = ""
+    if filters:
+        group_by_option = demand_cube.DRILL_PATH[len(filters)]
+        selection = f" in {' / '.join(filters.values())}"
 
-    # Aggregate data by the selected criteria
-    grouped_data = data.groupby(group_by_option).agg({
-        demand_col: 'sum',
-        supply_col: 'sum'
-    }).reset_index()
+    # The totals per group are read from the cube; the finished figure is
+    # cached per selection and dataset version
+    def build_figure():
+        with timing.span("cube_query"):
+            totals = demand_cube.query(cube, [group_by_option], filters)
+        grouped_data = demand_supply_shares(totals, analysis_type, group_by_option)
 
-    # Calculate percentage of demand and supply
-    grouped_data["Demand (%)"] = round((grouped_data[demand_col] / grouped_data[demand_col].sum()) * 100, 2)
-    grouped_data["Supply (%)"] = round((grouped_data[supply_col] / grouped_data[supply_col].sum()) * 100, 2)
+        # Generate the customized bar chart
+        fig_bar = generate_bar_chart(grouped_data, group_by_option, sort_order, selection)
+        return fig_bar
 
-    # Filter out rows where both demand and supply percentages are less than 1 (for clusters only)
-    if group_by_option == "ClusterName":
-        grouped_data = grouped_data[(grouped_data["Demand (%)"] >= 1) | (grouped_data["Supply (%)"] >= 1)]
+    with timing.span("figure"):
+        fig_bar = resources["figure_cache"].figure(
+            FigureCache.make_key("demand_supply", demand_cubes["fingerprint"], snapshot=snapshot,
+                                 analysis_type=analysis_type, group_by=group_by_option, sort_order=sort_order,
+                                 filters=tuple(filters.items())),
+            build_figure)
+    with timing.span("figure.chart"):
+        st.plotly_chart(fig_bar)
+
+    # Year-over-year change per group, from the cubes of both snapshots
+    if previous_snapshot is not None:
+        def build_change_figure():
+            grouped_data = sort_groups(demand_supply_shares(demand_cube.query(cube, [group_by_option], filters),
+                                                            analysis_type, group_by_option),
+                                       group_by_option, sort_order)
+            changes = ridership_store.compare(demand_cube.query(cube, [group_by_option], filters),
+                                              demand_cube.query(cubes[previous_snapshot], [group_by_option], filters),
+                                              group_by_option)
+            return generate_change_chart(changes, grouped_data, group_by_option, analysis_type,
+                                         snapshot, previous_snapshot)
 
-    # Generate the customized bar chart
-    fig_bar = generate_bar_chart(grouped_data, group_by_option, sort_order)
-    st.plotly_chart(fig_bar)
+        with timing.span("change_figure"):
+            fig_change = resources["figure_cache"].figure(
+                FigureCache.make_key("demand_supply.change", demand_cubes["fingerprint"], snapshot=snapshot,
+                                     previous=previous_snapshot, analysis_type=analysis_type,
+                                     group_by=group_by_option, sort_order=sort_order,
+                                     filters=tuple(filters.items())),
+                build_change_figure)
+        with timing.span("change_figure.chart"):
+            st.plotly_chart(fig_change)
 
     ########################
@@ -2,8 +2,13 @@ import pandas as pd
 import streamlit as st
 # import numpy as np
 import plotly.graph_objects as go
+from pipeline import result_cache, ridership_profile, time_buckets, timing
+from pipeline.figure_cache import FigureCache
 
 
+# Data this page asks for (see main.page_resources)
+REQUIRES = ("ridership", "performance_query", "figure_cache")
+
 # Define a consistent color palette
 COLOR_MAPPING = {
     'WorkDay': '#2E86C1',
@@ -21,80 +26,47 @@ COLOR_MAPPING = {
 #     return passenger_data, trips_data
 
 
-# Process trips data
-@st.cache_data(ttl=3600)
-def process_trips_data(trips_df):
-    trips_df['hour'] = pd.to_datetime(trips_df['trip_time']).dt.hour
-
-    day_mapping = {
-        1: 'WorkDay',
-        2: 'WorkDay',
-        3: 'WorkDay',
-        4: 'WorkDay',
-        5: 'WorkDay',
-        6: 'Friday',
-        7: 'Saturday'
-    }
-    trips_df['day_type'] = trips_df['trip_day_in_week'].map(day_mapping)
-
-    def get_time_range(hour):
-        if 0 <= hour < 4:
-            return '00:00-03:59'
-        elif 4 <= hour < 6:
-            return '04:00-05:59'
-        elif 6 <= hour < 9:
-            return '06:00-08:59'
-        elif 9 <= hour < 12:
-            return '09:00-11:59'
-        elif 12 <= hour < 15:
-            return '12:00-14:59'
-        elif 15 <= hour < 19:
-            return '15:00-18:59'
-        else:
-            return '19:00-23:59'
-
-    trips_df['time_range'] = trips_df['hour'].apply(get_time_range)
-
-    grouped_trips = trips_df.groupby(['day_type', 'time_range']).size().reset_index(name='trip_count')
+# Cached functions take the dataset (underscore: not part of the cache key)
+# plus its fingerprint, which is the actual cache key.
+
+# Process trips data: trip counts per day type and time range, and the
+# number of days of that day type in the data (for trips per average day).
+# Counts trips per (weekday, minute of day) through the query layer, then
+# buckets those at most 7 x 1440 rows.
+@result_cache.cached(ttl=3600)
+@timing.timed("process_trips_data")
+def process_trips_data(_trips_query, fingerprint, scheme="ridership"):
+    counts = _trips_query.count_by(['trip_day_in_week', 'minute_of_day'])
+    grouped_trips = pd.DataFrame({
+        'day_type': time_buckets.day_type(counts['trip_day_in_week']),
+        'time_range': time_buckets.bucket(counts['minute_of_day'], scheme),
+        'trip_count': counts['rows']
+    }).groupby(['day_type', 'time_range'], observed=True)['trip_count'].sum().reset_index()
+    grouped_trips['day_type'] = grouped_trips['day_type'].astype(str)
+    grouped_trips['time_range'] = grouped_trips['time_range'].astype(str)
+
+    dates = _trips_query.count_by(['trip_day_in_week', 'date'])
+    days = pd.Series(time_buckets.day_type(dates['trip_day_in_week'])).value_counts()
+    grouped_trips['days'] = grouped_trips['day_type'].map(days.rename(index=str))
     return grouped_trips
 
 
-# Process passenger data
-@st.cache_data(ttl=3600)
-def process_passenger_data(data):
-    workday_columns = [col for col in data.columns if col.startswith('WorkDay')]
-    friday_columns = [col for col in data.columns if col.startswith('Friday')]
-    saturday_columns = [col for col in data.columns if col.startswith('Saturday')]
-
-    ride_columns = {
-        "WorkDay": workday_columns,
-        "Friday": friday_columns,
-        "Saturday": saturday_columns
-    }
-
-    all_data = []
-    for day_type, columns in ride_columns.items():
-        melted_data = data.melt(
-            id_vars=["RouteID", "Metropolin"],
-            value_vars=columns,
-            var_name="TimePeriod",
-            value_name="Passengers"
-        )
-        melted_data['DayType'] = day_type
-        melted_data['TimeRange'] = melted_data['TimePeriod'].str.split(' - ').str[1]
-        all_data.append(melted_data)
-
-    return pd.concat(all_data)
+# Process passenger data: the per day type / time range sums the charts look up
+@result_cache.cached(ttl=3600)
+@timing.timed("process_passenger_data")
+def process_passenger_data(_data, fingerprint):
+    return ridership_profile.build_time_profile(_data)
 
 
-# Calculate passengers per trip without normalization
-@st.cache_data(ttl=3600)
-def calculate_passengers_per_trip(passenger_data, trips_data, selected_day):
-    passenger_day_data = passenger_data[passenger_data['DayType'] == selected_day]
-    trips_day_data = trips_data[trips_data['day_type'] == selected_day]
+# Calculate passengers per trip on an average day of the selected type
+@result_cache.cached(ttl=3600)
+@timing.timed("calculate_passengers_per_trip")
+def calculate_passengers_per_trip(_passenger_data, _trips_data, fingerprint, selected_day):
+    passenger_day_data = _passenger_data[_passenger_data['DayType'] == selected_day]
+    trips_day_data = _trips_data[_trips_data['day_type'] == selected_day]
 
-    passenger_grouped = passenger_day_data.groupby('TimeRange')['Passengers'].sum().reset_index()
-    trips_grouped = trips_day_data.groupby('time_range')['trip_count'].sum().reset_index()
+    passenger_grouped = passenger_day_data.groupby('TimeRange', observed=True)['Passengers'].sum().reset_index()
+    trips_grouped = trips_per_day(trips_day_data)
 
     merged_data = pd.merge(passenger_grouped, trips_grouped,
                            left_on='TimeRange', right_on='time_range', how='inner')
@@ -103,17 +75,22 @@ def calculate_passengers_per_trip(passenger_data, trips_data, selected_day):
     return merged_data
 
 
-# Create visualization
+# Trips per time range on an average day (the ridership passengers are per day)
+def trips_per_day(trips_day_data):
+    return pd.DataFrame({'time_range': trips_day_data['time_range'],
+                         'trip_count': trips_day_data['trip_count'] / trips_day_data['days']}).reset_index(drop=True)
+
+
+# Create visualization (the figure for one day type)
 def create_dashboard_visualizations(passenger_data, trips_data, selected_day, show_trips):
     passenger_day_data = passenger_data[passenger_data['DayType'] == selected_day]
     trips_day_data = trips_data[trips_data['day_type'] == selected_day]
 
-    # Process passenger data
-    passenger_grouped = passenger_day_data.groupby('TimeRange')['Passengers'].sum().reset_index()
-    trips_grouped = (trips_day_data.groupby('time_range')['trip_count'].sum() / 90).reset_index()
+    # Precomputed passenger totals for the selected day
+    passenger_grouped = passenger_day_data[['TimeRange', 'Passengers']].reset_index(drop=True)
+    trips_grouped = trips_per_day(trips_day_data)
 
-    time_order = ['00:00-03:59', '04:00-05:59', '06:00-08:59', '09:00-11:59',
-                  '12:00-14:59', '15:00-18:59', '19:00-23:59']
+    time_order = time_buckets.labels("ridership")
 
     # Merge data to ensure synchronized time ranges
     if show_trips:
@@ -146,7 +123,7 @@ def create_dashboard_visualizations(passenger_data, trips_data, selected_day, sh
                 customdata=merged_data[['Passengers', 'trip_count', 'passengers_per_trip']],
                 hovertemplate=(
                         f"<span style='color: {COLOR_MAPPING[selected_day]}'>Passengers:</span> %{{customdata[0]:,.0f}}<br>" +
-                        "<span style='color: #E74C3C'>Trips:</span> %{customdata[1]:.0f}<br>" +
+                        "<span style='color: #E74C3C'>Trips per day:</span> %{customdata[1]:.0f}<br>" +
                         "<b>Passengers per Trip: %{customdata[2]:.1f}</b>" +
                         "<extra></extra>"
                 )
@@ -168,9 +145,9 @@ def create_dashboard_visualizations(passenger_data, trips_data, selected_day, sh
 
     else:
         # Original single trace visualization
-        passenger_grouped['Time Range'] = pd.Categorical(passenger_grouped['TimeRange'],
-                                                         categories=time_order,
-                                                         ordered=True)
+        passenger_grouped['TimeRange'] = pd.Categorical(passenger_grouped['TimeRange'],
+                                                        categories=time_order,
+                                                        ordered=True)
         passenger_grouped = passenger_grouped.sort_values('TimeRange')
 
         fig = go.Figure()
@@ -204,11 +181,11 @@ def create_dashboard_visualizations(passenger_data, trips_data, selected_day, sh
         hovermode='x unified'  # Show all traces for the same x-value
     )
 
-    st.plotly_chart(fig)
+    return fig
 
 
 # Main function to show the dashboard
-def show(ridership_data, performance_data):
+def show(resources):
     st.title("⏳ Public Transport Variation Over Time")
     st.markdown("##### Analyze passenger demand and trip counts throughout the day for different day types.")
 
@@ -232,9 +209,8 @@ def show(ridership_data, performance_data):
     - Understand trip frequency and demand correlation
         """)
 
-    passenger_data, trips_data = ridership_data, performance_data
-    processed_passenger_data = process_passenger_data(passenger_data)
-    processed_trips_data = process_trips_data(trips_data)
+    ridership, performance_query = resources["ridership"], resources["performance_query"]
+    figures = resources["figure_cache"]
 
     col1, col2 = st.columns(2)
     with col1:
@@ -243,41 +219,61 @@ def show(ridership_data, performance_data):
         if selected_day != "All Days":
             show_trips = st.checkbox("Show trip count", value=False)
 
+    # Figures are cached per selection and dataset version; the passenger and
+    # trip aggregates are only needed when a figure has to be built
     if selected_day == "All Days":
-        combined_data = processed_passenger_data.groupby(['DayType', 'TimeRange'])['Passengers'].sum().reset_index()
-
-        fig = go.Figure()
-
-        for day_type in ['WorkDay', 'Friday', 'Saturday']:
-            day_data = combined_data[combined_data['DayType'] == day_type]
-            fig.add_trace(
-                go.Scatter(
-                    x=day_data['TimeRange'],
-                    y=day_data['Passengers'],
-                    mode='lines+markers',
-                    name=day_type,
-                    line=dict(color=COLOR_MAPPING[day_type], shape='spline'),
-                    hovertemplate=(
-                        "Passengers: %{y:,.0f}<extra></extra>"
+        def build_figure():
+            passenger_totals = process_passenger_data(ridership.data, ridership.fingerprint)
+            combined_data = passenger_totals
+
+            fig = go.Figure()
+
+            for day_type in ['WorkDay', 'Friday', 'Saturday']:
+                day_data = combined_data[combined_data['DayType'] == day_type]
+                fig.add_trace(
+                    go.Scatter(
+                        x=day_data['TimeRange'],
+                        y=day_data['Passengers'],
+                        mode='lines+markers',
+                        name=day_type,
+                        line=dict(color=COLOR_MAPPING[day_type], shape='spline'),
+                        hovertemplate=(
+                            "Passengers: %{y:,.0f}<extra></extra>"
+                        )
                     )
                 )
+
+            fig.update_layout(
+                title="Passenger Demand for All Days",
+                xaxis_title="Time Range",
+                yaxis_title="Passenger Count",
+                legend=dict(
+                    yanchor="top",
+                    y=0.99,
+                    xanchor="right",
+                    x=0.99,
+                    orientation="v"
+                ),
+                margin=dict(l=40, r=40, t=50, b=50),
+                plot_bgcolor="white"
             )
 
-        fig.update_layout(
-            title="Passenger Demand for All Days",
-            xaxis_title="Time Range",
-            yaxis_title="Passenger Count",
-            legend=dict(
-                yanchor="top",
-                y=0.99,
-                xanchor="right",
-                x=0.99,
-                orientation="v"
-            ),
-            margin=dict(l=40, r=40, t=50, b=50),
-            plot_bgcolor="white"
-        )
+            return fig
 
-        st.plotly_chart(fig)
+        with timing.span("figure"):
+            fig = figures.figure(FigureCache.make_key("demand_variation", ridership.fingerprint, selected_day=selected_day),
+                                 build_figure)
     else:
-        create_dashboard_visualizations(processed_passenger_data, processed_trips_data, selected_day, show_trips)
\ No newline at end of file
+        def build_figure():
+            passenger_totals = process_passenger_data(ridership.data, ridership.fingerprint)
+            processed_trips_data = process_trips_data(performance_query, performance_query.fingerprint)
+            return create_dashboard_visualizations(passenger_totals, processed_trips_data, selected_day, show_trips)
+
+        with timing.span("figure"):
+            fig = figures.figure(
+                FigureCache.make_key("demand_variation", (ridership.fingerprint, performance_query.fingerprint),
+                                     selected_day=selected_day, show_trips=show_trips),
+                build_figure)
+
+    with timing.span("figure.chart"):
+        st.plotly_chart(fig)
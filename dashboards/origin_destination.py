@@ -0,0 +1,147 @@
+import streamlit as st
+import plotly.graph_objects as go
+from pipeline import od_matrix, timing
+from pipeline.figure_cache import FigureCache
+
+
+# Data this page asks for (see main.page_resources)
+REQUIRES = ("od_matrix", "figure_cache")
+
+display_names = {
+    "WeeklyPassengers": "Weekly Passengers",
+    "WeekyRides": "Weekly Rides",
+}
+
+MEASURE_COLORS = {
+    "WeeklyPassengers": "#2E86C1",
+    "WeekyRides": "#F39C12",
+}
+
+
+# Horizontal bars of the largest corridors, largest on top
+def generate_corridor_chart(corridors, measure, title):
+    corridors = corridors.iloc[::-1]
+    fig = go.Figure(
+        go.Bar(
+            x=corridors[measure],
+            y=[f"{origin} → {destination}" for origin, destination
+               in zip(corridors["origin_name"], corridors["destination_name"])],
+            orientation='h',
+            marker=dict(color=MEASURE_COLORS[measure]),
+            customdata=corridors[["WeeklyPassengers", "WeekyRides", "routes"]].values,
+            hovertemplate=(
+                    "%{y}<br>" +
+                    "Weekly passengers: %{customdata[0]:,.0f}<br>" +
+                    "Weekly rides: %{customdata[1]:,.0f}<br>" +
+                    "Routes: %{customdata[2]}<extra></extra>"
+            )
+        )
+    )
+    fig.update_layout(
+        title=title,
+        xaxis_title=display_names[measure],
+        yaxis=dict(type='category'),
+        height=max(500, 30 * len(corridors)),
+        margin=dict(l=50, r=50, t=50, b=50),
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='white',
+        xaxis=dict(showgrid=True, gridwidth=1, gridcolor='lightgrey'),
+    )
+    return fig
+
+
+# Heatmap of the dense block of the top cities (origins as rows)
+def generate_heatmap(block, measure):
+    fig = go.Figure(
+        go.Heatmap(
+            z=block.values,
+            x=list(block.columns),
+            y=list(block.index),
+            colorscale="Blues",
+            hovertemplate="%{y} → %{x}<br>" + display_names[measure] + ": %{z:,.0f}<extra></extra>"
+        )
+    )
+    fig.update_layout(
+        title=f"{display_names[measure]} between the {len(block)} Busiest Cities",
+        xaxis_title="Destination",
+        yaxis_title="Origin",
+        xaxis=dict(type='category', tickangle=90),
+        yaxis=dict(type='category', autorange='reversed'),
+        height=max(600, 28 * len(block)),
+    )
+    return fig
+
+
+def show(resources):
+    st.title("🧭 Origin–Destination Demand")
+    st.markdown("##### Explore the busiest corridors between cities and how demand flows across the network.")
+
+    col1, col2 = st.columns([3, 1])
+
+    with col2:
+        st.markdown("##### 🤔 How to Use", unsafe_allow_html=True, help=""" # This visualization shows passenger demand and bus service between the origin and destination cities of the routes.
+
+    - Measure: Weekly passengers (demand) or weekly rides (supply)
+    - Corridors: Number of origin → destination pairs to rank
+    - City: Show only the corridors from or to one city
+    - Cities in heatmap: The busiest cities shown in the matrix
+    - Include routes within a city: Urban routes start and end in the same city and dominate the totals; they are left out by default
+
+    Interpretation Tips:
+    - Rows of the heatmap are origins, columns are destinations
+    - Asymmetric cells show corridors busier in one direction
+        """)
+
+    # Sparse city x city matrix, built once per dataset (see pipeline/od_matrix.py)
+    od = resources["od_matrix"]
+    figures = resources["figure_cache"]
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        measure = st.selectbox("Measure:", od_matrix.MEASURES, format_func=lambda x: display_names.get(x, x))
+    with col2:
+        n_corridors = st.slider("Corridors:", 5, 30, 15, step=5)
+    with col3:
+        city = st.selectbox("City:", ["All"] + list(od_matrix.ranked_cities(od, measure)))
+    within_city = st.checkbox("Include routes within a city", value=False)
+    city = None if city == "All" else city
+
+    # Outbound / inbound totals of the selected city
+    if city is not None:
+        totals = od["totals"].loc[od_matrix.city_code(od, city)]
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric(f"Outbound {display_names[measure]}", f"{totals[f'out_{measure}']:,.0f}")
+        with col2:
+            st.metric(f"Inbound {display_names[measure]}", f"{totals[f'in_{measure}']:,.0f}")
+        with col3:
+            st.metric(f"Within {city}", f"{totals[f'within_{measure}']:,.0f}")
+
+    def build_corridor_figure():
+        with timing.span("top_corridors"):
+            corridors = od_matrix.top_corridors(od, n_corridors, measure, within_city, city)
+        title = f"Top {n_corridors} Corridors by {display_names[measure]}" + (f" from or to {city}" if city else "")
+        return generate_corridor_chart(corridors, measure, title)
+
+    with timing.span("corridors"):
+        fig_corridors = figures.figure(
+            FigureCache.make_key("origin_destination.corridors", od["fingerprint"], measure=measure,
+                                 n_corridors=n_corridors, city=city, within_city=within_city),
+            build_corridor_figure)
+    with timing.span("corridors.chart"):
+        st.plotly_chart(fig_corridors, use_container_width=True)
+
+    n_cities = st.slider("Cities in heatmap:", 10, 40, 20, step=5)
+
+    def build_heatmap():
+        with timing.span("top_cities_matrix"):
+            block = od_matrix.top_cities_matrix(od, n_cities, measure, within_city)
+        return generate_heatmap(block, measure)
+
+    with timing.span("heatmap"):
+        fig_heatmap = figures.figure(
+            FigureCache.make_key("origin_destination.heatmap", od["fingerprint"], measure=measure,
+                                 n_cities=n_cities, within_city=within_city),
+            build_heatmap)
+    with timing.span("heatmap.chart"):
+        st.plotly_chart(fig_heatmap, use_container_width=True)
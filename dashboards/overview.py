@@ -17,18 +17,51 @@ import streamlit as st
 #     return data
 
 
-def show(ridership_data, performance_data):
+# Data this page asks for (see main.page_resources)
+REQUIRES = ("headline", "ridership", "performance_sample")
+
+
+def coverage_ratio(headline):
+    return round((headline["total_day_trips"] / headline["daily_passengers"]) * 100, 2)  # round((total_trips/(daily_passengers * 365))*100, 2)
+
+
+# Change of a headline number against the previous snapshot, as a small line
+# under it (empty for the first snapshot). Ratios change in percentage points.
+def change_note(value, previous_value, previous_snapshot, points=False, padding=40):
+    if previous_value is None:
+        return ""
+    if points:
+        change, unit = value - previous_value, " pp"
+    elif previous_value:
+        change, unit = (value - previous_value) / previous_value * 100, "%"
+    else:
+        return ""
+    color = "green" if change >= 0 else "red"
+    arrow = "▲" if change >= 0 else "▼"
+    return (f'<small style="font-size: 14px; color: {color}; padding-left: {padding}px;">'
+            f'{arrow} {abs(change):.1f}{unit} vs {previous_snapshot}</small>')
+
+
+def show(resources):
     # Load data for statistics
     st.markdown("### Data Overview")
 
-    data = ridership_data
+    # Key statistics per ridership snapshot, precomputed (no dataset is loaded for them)
+    headlines = resources["headline"]
+    snapshots = list(headlines)
+    if len(snapshots) > 1:
+        snapshot = st.selectbox("Snapshot:", snapshots[::-1])
+    else:
+        snapshot = snapshots[-1]
+    headline = headlines[snapshot]
+    position = snapshots.index(snapshot)
+    previous_snapshot = snapshots[position - 1] if position > 0 else None
+    previous = headlines[previous_snapshot] if previous_snapshot else {}
 
-    # Calculate key statistics
-    total_trips = data["WeekyRides"].sum()
-    total_day_trips = data["DailyRides"].sum()
-    daily_passengers = int(data["DailyPassengers"].sum())
-    ratio = round((total_day_trips/daily_passengers)*100, 2)  # round((total_trips/(daily_passengers * 365))*100, 2)
-    total_routes = data["RouteID"].nunique()
+    total_trips = headline["total_trips"]
+    daily_passengers = headline["daily_passengers"]
+    ratio = coverage_ratio(headline)
+    total_routes = headline["total_routes"]
 
     col1, col2, col3, col4 = st.columns(4)
 
@@ -36,8 +69,9 @@ def show(ridership_data, performance_data):
         st.markdown(
             f"""
             <div style="display: flex; flex-direction: column; line-height: 1.3; align-items: flex-start;">
-                <span style="font-size: 18px;">🚍 Total Trips in 2024</span>
+                <span style="font-size: 18px;">🚍 Total Trips in {snapshot}</span>
                 <span style="font-size: 34px; color: #333; text-align: center; padding-left: 40px;"><b>{round((total_trips / 1000000), 1):,}M</b></span>
+                {change_note(total_trips, previous.get("total_trips"), previous_snapshot)}
             </div>
             """,
             unsafe_allow_html=True
@@ -49,6 +83,7 @@ def show(ridership_data, performance_data):
             <div style="display: flex; flex-direction: column; line-height: 1.3; align-items: flex-start;">
                 <span style="font-size: 18px;">🧑‍🤝‍🧑 Daily Passengers</span>
                 <span style="font-size: 34px; color: #333; text-align: center; padding-left: 40px;"><b>{round((daily_passengers / 1000000), 1):,}M</b></span>
+                {change_note(daily_passengers, previous.get("daily_passengers"), previous_snapshot)}
             </div>
             """,
             unsafe_allow_html=True
@@ -60,6 +95,7 @@ def show(ridership_data, performance_data):
             <div style="display: flex; flex-direction: column; line-height: 1.3; align-items: flex-start;">
                 <span style="font-size: 18px;">🛣️ Total Routes Available</span>
                 <span style="font-size: 34px; color: #333; text-align: center; padding-left: 50px;;"><b>{total_routes}</b></span>
+                {change_note(total_routes, previous.get("total_routes"), previous_snapshot)}
             </div>
             """,
             unsafe_allow_html=True
@@ -88,7 +124,8 @@ def show(ridership_data, performance_data):
                 </div>
                 <div style="text-align: center; width: 100%;">
                     <small style="font-size: 15px; color: black;">{ratio_status}</small><br>
-                    <small style="font-size: 15px; color: black;">Balanced range: 15%-30%</small>
+                    <small style="font-size: 15px; color: black;">Balanced range: 15%-30%</small><br>
+                    {change_note(ratio, coverage_ratio(previous) if previous else None, previous_snapshot, points=True, padding=0)}
                 </div>
             </div>
             """,
@@ -104,7 +141,8 @@ def show(ridership_data, performance_data):
     - **Performance Data (March 2024):** Compares planned vs. actual bus trips to analyze service efficiency. [🔗](https://data.gov.il/dataset/bitzua_bus_trip/resource/aba233c2-6a5a-487d-b0a8-9413ef849f15?filters=erua_hachraga_ind%3A0)
     """)
 
-    # Select dataset
+    # Select dataset. Resources load on first use, so the performance sample
+    # is only read once its preview is selected.
     selected_dataset = st.radio(
         "Select dataset to view:",
         ("Ridership Data", "Performance Data"),
@@ -113,12 +151,12 @@ def show(ridership_data, performance_data):
 
     # Load selected dataset
     if selected_dataset == "Ridership Data":
-        data = ridership_data
+        data = resources["ridership"].data
 
     else:
-        data = performance_data
-        excluded_columns = ["planned_time", "actual_time", "delay_minutes", "delay_category", "hour", "date", "day_name", "metro_area"]
-        data = data.drop(columns=excluded_columns)
+        data = resources["performance_sample"]
+        excluded_columns = ["planned_time", "actual_time", "delay_minutes", "delay_category", "hour", "date", "day_name", "metro_area", "month"]
+        data = data.drop(columns=excluded_columns, errors="ignore")
 
     # Add filter options
     with st.expander("🔍 Filter Data"):
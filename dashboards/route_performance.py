@@ -2,56 +2,34 @@ import pandas as pd
 import streamlit as st
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
+from pipeline import chart_summaries, result_cache, timing
+from pipeline.figure_cache import FigureCache
+from pipeline.rollups import metro_kpis
 
 
-# @st.cache_data(ttl=3600)
-# def load_and_process_data(performance_data):
-#     # df = pd.read_parquet("data/2024_bus_performance.parquet")
-#     df = performance_data
-#
-#     # Time processing
-#     df['planned_time'] = pd.to_datetime(df['trip_dt'] + ' ' + df['trip_time'])
-#     df['actual_time'] = pd.to_datetime(df['bitzua_history_start_dt'])
-#
-#     # Calculate delays considering potential date crossover
-#     time_diff = df['actual_time'] - df['planned_time']
-#     df['delay_minutes'] = time_diff.dt.total_seconds() / 60
-#     df.loc[df['delay_minutes'] > 720, 'delay_minutes'] -= 1440
-#     df.loc[df['delay_minutes'] < -720, 'delay_minutes'] += 1440
-#
-#     # Add delay categories
-#     df['delay_category'] = pd.cut(
-#         df['delay_minutes'],
-#         bins=[-float('inf'), -5, -2, 2, 5, float('inf')],
-#         labels=['Early (>5min)', 'Slightly Early (2-5min)',
-#                 'On Time (±2min)', 'Slightly Late (2-5min)', 'Late (>5min)']
-#     )
-#
-#     # Time-related features
-#     df['hour'] = df['planned_time'].dt.strftime('%H:00')  # Format as hour of day
-#     df['date'] = df['planned_time'].dt.date
-#     df['day_name'] = pd.Categorical(df['trip_day_in_week'].map({
-#         1: 'Sunday', 2: 'Monday', 3: 'Tuesday',
-#         4: 'Wednesday', 5: 'Thursday', 6: 'Friday', 7: 'Saturday'
-#     }))
-#
-#     # Add metropolitan area mapping
-#     metro_mapping = {
-#         'North': ['מתמ"ז-קריות','רמת הגולן' ,'נתניה עירוני', 'נצרת', 'חדרה' ,'גליל עמקים', 'חיפה', 'כרמיאל עירוני כרמיאל-חיפה חיפה-טבריה', 'מטרונית חיפה', 'העמקים', 'הגליל', 'קריית שמונה עירוני', 'קווי נצרת – שאמ' , 'קריית שמונה-חיפה'],
-#         'Center': ['חולון','רחובות' ,'תל אביב', 'ביתר עילית ועמק האלה', 'ירושלים', 'מרכז', 'שרון', 'בית שמש', 'חשמונאים', 'תל אביב-גליל עמקים', 'ירושלים-ב.ברק קו 402', 'ירושלים מרכז', 'רשל"צ עירוני', 'פרוזדור ירושלים', 'ירושלים-תל אביב', 'אונו-אלעד', 'רשל"צ פרברי', 'בקעת אונו אלעד', 'שרון חולון מרחבי', 'כביש 4 -ירושלים-בני ברק', 'פתח תקוה-ראש העין'],
-#         'South': ['דרום', 'צפון הנגב', 'אשדוד', 'באר שבע', 'אשקלון', 'הנגב', 'אילות', 'אילת', 'דרומי', 'צפון הנגב', 'רהט והנגב המערבי', 'הנגב'],
-#         'Inter-city': ['ירושלים קווי צפון', 'ירושלים צפון-ציר מזרחי', 'חיפה-ירושלים-אילת', 'חיפה-שרון-ירושלים', 'בין עירוני', 'ירושלים-באר שבע', 'קווי נצרת - נסיעות ותיירות', 'חיפה-ירושלים-אילת', 'חיפה-שרון-ירושלים', 'תל אביב-אשקלון', 'תל אביב-חדרה', 'אשדוד-אשקלון-ירושלים', 'תל אביב-שרון-חיפה', 'חדרה-נתניה']
-#     }
-#
-#     # Create metropolitan area column
-#     df['metro_area'] = 'Other'
-#     for area, clusters in metro_mapping.items():
-#         df.loc[df['cluster_nm'].str.contains('|'.join(clusters), na=False), 'metro_area'] = area
-#
-#     return df
-
-
-def show(performance_data):
+# Data this page asks for (see main.page_resources)
+REQUIRES = ("performance_query", "delay_rollups", "route_join", "figure_cache")
+
+# Derived columns (delay_minutes, delay_category, hour, date, day_name, metro_area)
+# are materialized offline by `python -m pipeline.preprocess`.
+
+
+# Delay histogram (delays up to 20 minutes, 30 bins) and hourly curve of one
+# route, cached per route so switching between routes is a lookup
+@result_cache.cached(ttl=3600, max_entries=500)
+@timing.timed("route_profile")
+def route_profile(_performance_query, fingerprint, route_id):
+    route_data = _performance_query.scan(['delay_minutes', 'hour'], filters=[('OperatorLineId', '==', route_id)])
+
+    delays = route_data['delay_minutes'].dropna().to_numpy(dtype='float64')
+    counts, edges = chart_summaries.histogram(delays[delays <= 20], bins=30)
+
+    hourly_delays = route_data.groupby('hour', observed=True)['delay_minutes'].agg(['mean', 'count']) \
+        .reset_index()
+    return counts, edges, hourly_delays
+
+
+def show(resources):
 
     # Define color mapping for metro areas
     metro_colors = {
@@ -88,6 +66,10 @@ def show(performance_data):
           - South
           - Inter-city routes
 
+    Passengers Affected Tab:
+        Routes ranked by their daily passengers on trips
+        departing more than 5 minutes late
+
     Key Metrics to Watch:
         - Average delay
         - Percentage of delayed trips
@@ -95,11 +77,17 @@ def show(performance_data):
         """)
 
     # Load data
-    # df = load_and_process_data(performance_data)
-    df = performance_data
+    performance_query = resources["performance_query"]
+    rollups = resources["delay_rollups"]
+    fingerprint = performance_query.fingerprint
+
+    # Finished figures are cached per widget state and dataset version, so
+    # going back to a previous setting skips the Plotly build entirely
+    figures = resources["figure_cache"]
 
     # Create tabs
-    tab1, tab2, tab3 = st.tabs(["📊 Route Analysis", "🕒 Time Patterns", "🗺 Regional Analysis"])
+    tab1, tab2, tab3, tab4 = st.tabs(["📊 Route Analysis", "🕒 Time Patterns", "🗺 Regional Analysis",
+                                      "👥 Passengers Affected"])
 
     with tab1:
         col1, col2, col3 = st.columns(3)
@@ -110,67 +98,73 @@ def show(performance_data):
         with col3:
             delay_threshold = st.slider("Significant delay threshold (minutes):", 1, 15, 5)
 
-        # Calculate route performance metrics
-        route_stats = df.groupby(['OperatorLineId', 'operator_nm', 'cluster_nm', 'metro_area']).agg({
-            'delay_minutes': ['mean', 'std', 'count'],
-            'delay_category': lambda x: (x == 'On Time (±2min)').mean()
-        }).reset_index()
+        with timing.span("route_stats"):
+            # Route performance metrics, from the precomputed route rollup
+            route_stats = rollups['route'].rename(columns={
+                'OperatorLineId': 'line_id', 'operator_nm': 'operator', 'cluster_nm': 'cluster', 'trips': 'trip_count'
+            })[['line_id', 'operator', 'cluster', 'metro_area', 'avg_delay', 'std_delay', 'trip_count', 'on_time_ratio']]
 
-        route_stats.columns = ['line_id', 'operator', 'cluster', 'metro_area', 'avg_delay',
-                               'std_delay', 'trip_count', 'on_time_ratio']
+            # Filter and sort routes
+            worst_routes = route_stats[route_stats['trip_count'] >= min_trips] \
+                .nlargest(n_worst_routes, 'avg_delay')
 
-        # Filter and sort routes
-        worst_routes = route_stats[route_stats['trip_count'] >= min_trips] \
-            .nlargest(n_worst_routes, 'avg_delay')
+        def build_worst_routes_figure():
+            # Create visualization for worst performing routes
+            fig1 = go.Figure()
 
-        # Create visualization for worst performing routes
-        fig1 = go.Figure()
+            for metro_area, color in metro_colors.items():
+                filtered_routes = worst_routes[worst_routes['metro_area'] == metro_area]
+                fig1.add_trace(
+                    go.Bar(
+                        x=[str(x) for x in filtered_routes['line_id']],  # Convert to string for categorical
+                        y=filtered_routes['avg_delay'],
+                        text=filtered_routes['avg_delay'].round(1),
+                        textposition='auto',
+                        marker=dict(color=color),
+                        error_y=dict(
+                            type='data',
+                            array=worst_routes['std_delay'],
+                            visible=True
+                        ),
+                        hovertemplate=(
+                                "Line: %{x}<br>" +
+                                "Average Delay: %{y:.1f} minutes<br>" +
+                                "Trips: %{customdata[0]}<br>" +
+                                "Region: %{customdata[1]}<br>" +
+                                "Metro Area: %{customdata[3]}<br>" +
+                                "On-time: %{customdata[2]:.1%}"
+                        ),
+                        customdata=worst_routes[['trip_count', 'cluster', 'on_time_ratio', 'metro_area']].values,
+                        name=metro_area
+                    )
+                )
 
-        for metro_area, color in metro_colors.items():
-            filtered_routes = worst_routes[worst_routes['metro_area'] == metro_area]
-            fig1.add_trace(
-                go.Bar(
-                    x=[str(x) for x in filtered_routes['line_id']],  # Convert to string for categorical
-                    y=filtered_routes['avg_delay'],
-                    text=filtered_routes['avg_delay'].round(1),
-                    textposition='auto',
-                    marker=dict(color=color),
-                    error_y=dict(
-                        type='data',
-                        array=worst_routes['std_delay'],
-                        visible=True
-                    ),
-                    hovertemplate=(
-                            "Line: %{x}<br>" +
-                            "Average Delay: %{y:.1f} minutes<br>" +
-                            "Trips: %{customdata[0]}<br>" +
-                            "Region: %{customdata[1]}<br>" +
-                            "Metro Area: %{customdata[3]}<br>" +
-                            "On-time: %{customdata[2]:.1%}"
-                    ),
-                    customdata=worst_routes[['trip_count', 'cluster', 'on_time_ratio', 'metro_area']].values,
-                    name=metro_area
+            fig1.update_layout(
+                title=f"Top {n_worst_routes} Routes with Poorest Performance",
+                xaxis_title="Route Number",
+                yaxis_title="Average Delay (minutes)",
+                height=600,
+                xaxis={'type': 'category'},  # Force categorical axis
+                showlegend=True,
+                legend=dict(
+                    title="Metro Area",
+                    orientation="h",  # Horizontal legend
+                    y=1.02,
+                    x=0.5,
+                    xanchor='center',
+                    yanchor='bottom'
                 )
             )
 
-        fig1.update_layout(
-            title=f"Top {n_worst_routes} Routes with Poorest Performance",
-            xaxis_title="Route Number",
-            yaxis_title="Average Delay (minutes)",
-            height=600,
-            xaxis={'type': 'category'},  # Force categorical axis
-            showlegend=True,
-            legend=dict(
-                title="Metro Area",
-                orientation="h",  # Horizontal legend
-                y=1.02,
-                x=0.5,
-                xanchor='center',
-                yanchor='bottom'
-            )
-        )
+            return fig1
 
-        st.plotly_chart(fig1, use_container_width=True)
+        with timing.span("fig1"):
+            fig1 = figures.figure(
+                FigureCache.make_key("route_performance.worst", fingerprint,
+                                     min_trips=min_trips, n_worst_routes=n_worst_routes),
+                build_worst_routes_figure)
+        with timing.span("fig1.chart"):
+            st.plotly_chart(fig1, use_container_width=True)
 
         # Detailed route analysis
         with st.container():
@@ -189,119 +183,154 @@ def show(performance_data):
                     label_visibility="collapsed"
                 )
 
-        route_data = df[df['OperatorLineId'].astype(str) == selected_route]
+        route_id = int(selected_route) if selected_route is not None else -1
 
-        fig2 = make_subplots(
-            rows=1, cols=2,
-            subplot_titles=(
-                "Distribution of Delays (minutes)",
-                "Average Delay by Hour of Day (minutes)"
-            )
-        )
+        def build_route_figure():
+            delay_counts, delay_edges, hourly_delays = route_profile(performance_query, performance_query.fingerprint, route_id)
 
-        fig2.add_trace(
-            go.Histogram(
-                x=route_data[route_data['delay_minutes'] <= 20]['delay_minutes'],
-                nbinsx=30,
-                name="Delay Distribution"
-            ),
-            row=1, col=1
-        )
+            fig2 = make_subplots(
+                rows=1, cols=2,
+                subplot_titles=(
+                    "Distribution of Delays (minutes)",
+                    "Average Delay by Hour of Day (minutes)"
+                )
+            )
 
-        hourly_delays = route_data.groupby('hour')['delay_minutes'].agg(['mean', 'count']) \
-            .reset_index()
-        fig2.add_trace(
-            go.Scatter(
-                x=hourly_delays['hour'],
-                y=hourly_delays['mean'],
-                mode='lines+markers',
-                name="Average Delay",
-                marker=dict(size=hourly_delays['count'] / 10),
-                hovertemplate=(
-                        "Hour: %{x}<br>" +
-                        "Average Delay: %{y:.1f} minutes<br>" +
-                        "Trips: %{customdata}<extra></extra>"
+            fig2.add_trace(
+                chart_summaries.histogram_trace(
+                    delay_counts, delay_edges,
+                    name="Delay Distribution",
+                    hovertemplate="Delay: %{x:.1f} minutes<br>Trips: %{y}<extra></extra>"
                 ),
-                customdata=hourly_delays['count']
-            ),
-            row=1, col=2
-        )
+                row=1, col=1
+            )
+            fig2.add_trace(
+                go.Scatter(
+                    x=hourly_delays['hour'],
+                    y=hourly_delays['mean'],
+                    mode='lines+markers',
+                    name="Average Delay",
+                    marker=dict(size=hourly_delays['count'] / 10),
+                    hovertemplate=(
+                            "Hour: %{x}<br>" +
+                            "Average Delay: %{y:.1f} minutes<br>" +
+                            "Trips: %{customdata}<extra></extra>"
+                    ),
+                    customdata=hourly_delays['count']
+                ),
+                row=1, col=2
+            )
 
-        fig2.update_layout(height=500, showlegend=False)
-        st.plotly_chart(fig2, use_container_width=True)
+            fig2.update_layout(height=500, showlegend=False)
+            chart_summaries.enforce_budget(fig2)
+            return fig2
+
+        with timing.span("fig2"):
+            fig2 = figures.figure(
+                FigureCache.make_key("route_performance.route", fingerprint, route_id=route_id),
+                build_route_figure)
+        with timing.span("fig2.chart"):
+            st.plotly_chart(fig2, use_container_width=True)
+
+        # Delay percentiles of the selected route, from the quantile sketches
+        route_quantiles = rollups['quantiles']['route']
+        route_quantiles = route_quantiles[route_quantiles['OperatorLineId'] == route_id]
+        if len(route_quantiles):
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("Median Delay", f"{route_quantiles['median'].iloc[0]:.1f} minutes")
+            with col2:
+                st.metric("90th Percentile", f"{route_quantiles['p90'].iloc[0]:.1f} minutes")
+            with col3:
+                st.metric("95th Percentile", f"{route_quantiles['p95'].iloc[0]:.1f} minutes")
 
     with tab2:
         st.subheader("Time-Based Analysis")
-        fig3 = make_subplots(
-            rows=2, cols=2,
-            subplot_titles=(
-                "Average Delays by Hour of Day (minutes)",
-                "Delay Category Distribution",
-                "Delays by Day of Week (minutes)",
-                "Daily Delay Trend (minutes)"
-            ),
-            vertical_spacing=0.15
-        )
-
-        hourly_stats = df.groupby('hour')['delay_minutes'].agg(['mean', 'std', 'count']) \
-            .reset_index()
-        fig3.add_trace(
-            go.Scatter(
-                x=hourly_stats['hour'],
-                y=hourly_stats['mean'],
-                mode='lines+markers',
-                error_y=dict(type='data', array=hourly_stats['std'] / 2),
-                hovertemplate=(
-                        "Hour: %{x}<br>" +
-                        "Average Delay: %{y:.1f} minutes<br>" +
-                        "Trips: %{customdata}<extra></extra>"
+        def build_time_figure():
+            fig3 = make_subplots(
+                rows=2, cols=2,
+                subplot_titles=(
+                    "Average Delays by Hour of Day (minutes)",
+                    "Delay Category Distribution",
+                    "Delays by Day of Week (minutes)",
+                    "Daily Delay Trend (minutes)"
                 ),
-                customdata=hourly_stats['count']
-            ),
-            row=1, col=1
-        )
-
-        delay_dist = df['delay_category'].value_counts()
-        fig3.add_trace(
-            go.Bar(
-                x=delay_dist.index,
-                y=delay_dist.values,
-                hovertemplate="Category: %{x}<br>Count: %{y:,}<extra></extra>"
-            ),
-            row=1, col=2
-        )
+                vertical_spacing=0.15
+            )
 
-        fig3.add_trace(
-            go.Box(
-                x=df['day_name'],
-                y=df['delay_minutes'],
-                hovertemplate=(
-                        "Day: %{x}<br>" +
-                        "Delay: %{y:.1f} minutes<extra></extra>"
+            hourly_stats = rollups['hour'].rename(columns={'avg_delay': 'mean', 'std_delay': 'std', 'trips': 'count'})
+            fig3.add_trace(
+                go.Scatter(
+                    x=hourly_stats['hour'],
+                    y=hourly_stats['mean'],
+                    mode='lines+markers',
+                    error_y=dict(type='data', array=hourly_stats['std'] / 2),
+                    hovertemplate=(
+                            "Hour: %{x}<br>" +
+                            "Average Delay: %{y:.1f} minutes<br>" +
+                            "Trips: %{customdata}<extra></extra>"
+                    ),
+                    customdata=hourly_stats['count']
+                ),
+                row=1, col=1
+            )
+            hourly_quantiles = rollups['quantiles']['hour']
+            for name, label, dash in [('median', 'Median', 'dot'), ('p90', '90th Percentile', 'dash')]:
+                fig3.add_trace(
+                    go.Scatter(
+                        x=hourly_quantiles['hour'],
+                        y=hourly_quantiles[name],
+                        mode='lines',
+                        line=dict(dash=dash, width=1),
+                        name=label,
+                        hovertemplate="Hour: %{x}<br>" + label + ": %{y:.1f} minutes<extra></extra>"
+                    ),
+                    row=1, col=1
                 )
-            ),
-            row=2, col=1
-        )
 
-        daily_stats = df.groupby('date')['delay_minutes'].agg(['mean', 'count']) \
-            .reset_index()
-        fig3.add_trace(
-            go.Scatter(
-                x=daily_stats['date'],
-                y=daily_stats['mean'],
-                mode='lines',
-                hovertemplate=(
-                        "Date: %{x|%Y-%m-%d}<br>" +
-                        "Average Delay: %{y:.1f} minutes<br>" +
-                        "Trips: %{customdata}<extra></extra>"
+            delay_dist = rollups['category']
+            fig3.add_trace(
+                go.Bar(
+                    x=delay_dist.index,
+                    y=delay_dist.values,
+                    hovertemplate="Category: %{x}<br>Count: %{y:,}<extra></extra>"
                 ),
-                customdata=daily_stats['count']
-            ),
-            row=2, col=2
-        )
+                row=1, col=2
+            )
 
-        fig3.update_layout(height=900, showlegend=False)
-        st.plotly_chart(fig3, use_container_width=True)
+            # Box statistics per day of week from the rollups (see rollups.day_boxes),
+            # so the browser gets five numbers and a few outlier points per day
+            day_box, day_outliers = chart_summaries.box_traces(
+                rollups['day_boxes'], 'day_name',
+                hovertemplate="Day: %{x}<extra></extra>"
+            )
+            fig3.add_trace(day_box, row=2, col=1)
+            fig3.add_trace(day_outliers, row=2, col=1)
+
+            daily_stats = rollups['date'].rename(columns={'avg_delay': 'mean', 'trips': 'count'})
+            fig3.add_trace(
+                go.Scatter(
+                    x=daily_stats['date'],
+                    y=daily_stats['mean'],
+                    mode='lines',
+                    hovertemplate=(
+                            "Date: %{x|%Y-%m-%d}<br>" +
+                            "Average Delay: %{y:.1f} minutes<br>" +
+                            "Trips: %{customdata}<extra></extra>"
+                    ),
+                    customdata=daily_stats['count']
+                ),
+                row=2, col=2
+            )
+
+            fig3.update_layout(height=900, showlegend=False)
+            chart_summaries.enforce_budget(fig3)
+            return fig3
+
+        with timing.span("fig3"):
+            fig3 = figures.figure(FigureCache.make_key("route_performance.time", fingerprint), build_time_figure)
+        with timing.span("fig3.chart"):
+            st.plotly_chart(fig3, use_container_width=True)
 
     with tab3:
         st.subheader("Regional Performance Analysis")
@@ -311,101 +340,199 @@ def show(performance_data):
             "Select Metropolitan Area:", ["Center", "North", "South", "Inter-city", "All"], horizontal=True
         )
 
-        # Filter data based on selection
-        if metro_area != "All":
-            df_filtered = df[df['metro_area'] == metro_area]
-            title_prefix = f"Performance in {metro_area} Region"
-        else:
-            df_filtered = df
-            title_prefix = "Performance Across All Regions"
-
-        # Regional analysis
-        cluster_stats = df_filtered.groupby(['cluster_nm', 'metro_area']).agg({
-            'delay_minutes': ['mean', 'std', 'count'],
-            'delay_category': lambda x: (x == 'On Time (±2min)').mean()
-        }).reset_index()
-
-        cluster_stats.columns = ['region', 'metro_area', 'avg_delay', 'std_delay', 'trips', 'on_time_ratio']
+        def build_regional_figure():
+            # Regional analysis, from the precomputed cluster rollup
+            cluster_stats = rollups['cluster'].merge(
+                rollups['quantiles']['cluster'][['cluster_nm', 'metro_area', 'median', 'p90']],
+                on=['cluster_nm', 'metro_area'], how='left'
+            ).rename(columns={'cluster_nm': 'region'})
+            cluster_stats = cluster_stats[['region', 'metro_area', 'avg_delay', 'std_delay', 'trips', 'on_time_ratio',
+                                           'median', 'p90']]
+
+            # Filter data based on selection
+            if metro_area != "All":
+                cluster_stats = cluster_stats[cluster_stats['metro_area'] == metro_area]
+                title_prefix = f"Performance in {metro_area} Region"
+            else:
+                title_prefix = "Performance Across All Regions"
+
+            fig4 = go.Figure()
+
+            if metro_area == "All":
+                for area, color in metro_colors.items():
+                    area_data = cluster_stats[cluster_stats['metro_area'] == area]
+                    fig4.add_trace(
+                        go.Bar(
+                            x=area_data['region'],
+                            y=area_data['avg_delay'],
+                            marker=dict(color=color),
+                            name=area,  # Legend entry per metro_area
+                            error_y=dict(type='data', array=area_data['std_delay']),
+                            hovertemplate=(
+                                    "Region: %{x}<br>" +
+                                    "Average Delay: %{y:.1f} minutes<br>" +
+                                    "Trips: %{customdata[0]:,}<br>" +
+                                    "On-time: %{customdata[1]:.1%}<br>" +
+                                    "Median / p90: %{customdata[2]:.1f} / %{customdata[3]:.1f} minutes<extra></extra>"
+                            ),
+                            customdata=area_data[['trips', 'on_time_ratio', 'median', 'p90']].values
+                        )
+                    )
 
-        fig4 = go.Figure()
+                fig4.update_layout(
+                    title=title_prefix,
+                    xaxis_title="Region",
+                    yaxis_title="Average Delay (minutes)",
+                    showlegend=True,  # Enable legend
+                    height=700,
+                    legend=dict(
+                        title="Metro Area",
+                        orientation="h",  # Horizontal legend
+                        y=1.02,
+                        x=0.5,
+                        xanchor='center',
+                        yanchor='bottom'
+                    )
+                )
 
-        if metro_area == "All":
-            for area, color in metro_colors.items():
-                area_data = cluster_stats[cluster_stats['metro_area'] == area]
+            else:
                 fig4.add_trace(
                     go.Bar(
-                        x=area_data['region'],
-                        y=area_data['avg_delay'],
-                        marker=dict(color=color),
-                        name=area,  # Legend entry per metro_area
-                        error_y=dict(type='data', array=area_data['std_delay']),
+                        x=cluster_stats['region'],
+                        y=cluster_stats['avg_delay'],
+                        marker=dict(color=metro_colors.get(metro_area, '#7f7f7f')),
+                        name=metro_area,  # Legend for selected metro_area
+                        error_y=dict(type='data', array=cluster_stats['std_delay']),
                         hovertemplate=(
                                 "Region: %{x}<br>" +
                                 "Average Delay: %{y:.1f} minutes<br>" +
                                 "Trips: %{customdata[0]:,}<br>" +
-                                "On-time: %{customdata[1]:.1%}<extra></extra>"
+                                "On-time: %{customdata[1]:.1%}<br>" +
+                                "Median / p90: %{customdata[2]:.1f} / %{customdata[3]:.1f} minutes<extra></extra>"
                         ),
-                        customdata=area_data[['trips', 'on_time_ratio']].values
+                        customdata=cluster_stats[['trips', 'on_time_ratio', 'median', 'p90']].values
                     )
                 )
 
-            fig4.update_layout(
-                title=title_prefix,
-                xaxis_title="Region",
-                yaxis_title="Average Delay (minutes)",
-                showlegend=True,  # Enable legend
-                height=700,
-                legend=dict(
-                    title="Metro Area",
-                    orientation="h",  # Horizontal legend
-                    y=1.02,
-                    x=0.5,
-                    xanchor='center',
-                    yanchor='bottom'
+                fig4.update_layout(
+                    title=title_prefix,
+                    xaxis_title="Region",
+                    yaxis_title="Average Delay (minutes)",
+                    xaxis=dict(tickangle=90),
+                    height=700
                 )
-            )
 
-        else:
-            fig4.add_trace(
-                go.Bar(
-                    x=cluster_stats['region'],
-                    y=cluster_stats['avg_delay'],
-                    marker=dict(color=metro_colors.get(metro_area, '#7f7f7f')),
-                    name=metro_area,  # Legend for selected metro_area
-                    error_y=dict(type='data', array=cluster_stats['std_delay']),
-                    hovertemplate=(
-                            "Region: %{x}<br>" +
-                            "Average Delay: %{y:.1f} minutes<br>" +
-                            "Trips: %{customdata[0]:,}<br>" +
-                            "On-time: %{customdata[1]:.1%}<extra></extra>"
-                    ),
-                    customdata=cluster_stats[['trips', 'on_time_ratio']].values
-                )
-            )
-
-            fig4.update_layout(
-                title=title_prefix,
-                xaxis_title="Region",
-                yaxis_title="Average Delay (minutes)",
-                xaxis=dict(tickangle=90),
-                height=700
-            )
+            return fig4
 
-        st.plotly_chart(fig4, use_container_width=True)
+        with timing.span("fig4"):
+            fig4 = figures.figure(
+                FigureCache.make_key("route_performance.regional", fingerprint, metro_area=metro_area),
+                build_regional_figure)
+        with timing.span("fig4.chart"):
+            st.plotly_chart(fig4, use_container_width=True)
 
-        # Summary metrics
+        # Summary metrics, cached per selection like the figures
         st.subheader("📊 Key Performance Indicators")
+
+        def build_kpis():
+            kpis = metro_kpis(rollups['metro_kpis'], metro_area, delay_threshold)
+            # Percentiles of the selection, combined from the route sketches
+            quantile_rollups = rollups['quantiles']
+            if metro_area == "All" or metro_area in quantile_rollups['metro'].index:
+                selected = quantile_rollups['all'] if metro_area == "All" else quantile_rollups['metro'].loc[metro_area]
+                kpis.update(median=selected['median'], p90=selected['p90'], p95=selected['p95'])
+            return {name: float(value) for name, value in kpis.items()}
+
+        with timing.span("kpis"):
+            kpis = figures.value(
+                FigureCache.make_key("route_performance.kpis", fingerprint,
+                                     metro_area=metro_area, delay_threshold=delay_threshold),
+                build_kpis)
         col1, col2, col3 = st.columns(3)
 
         with col1:
-            avg_delay = df_filtered['delay_minutes'].mean()
-            st.metric("Average Delay", f"{avg_delay:.1f} minutes")
+            st.metric("Average Delay", f"{kpis['avg_delay']:.1f} minutes")
 
         with col2:
-            late_pct = (df_filtered['delay_minutes'] > delay_threshold).mean() * 100
-            st.metric(f"Trips Delayed >{delay_threshold}min", f"{late_pct:.1f}%")
+            st.metric(f"Trips Delayed >{delay_threshold}min", f"{kpis['late_pct']:.1f}%")
 
         with col3:
-            on_time = ((df_filtered['delay_minutes'] >= -2) &
-                       (df_filtered['delay_minutes'] <= 2)).mean() * 100
-            st.metric("On-Time Performance", f"{on_time:.1f}%")
\ No newline at end of file
+            st.metric("On-Time Performance", f"{kpis['on_time_pct']:.1f}%")
+
+        if 'median' in kpis:
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("Median Delay", f"{kpis['median']:.1f} minutes")
+            with col2:
+                st.metric("90th Percentile", f"{kpis['p90']:.1f} minutes")
+            with col3:
+                st.metric("95th Percentile", f"{kpis['p95']:.1f} minutes")
+
+    with tab4:
+        st.subheader("Passengers Affected by Delays")
+
+        # Ridership routes joined with their lines' delays (see pipeline/route_join.py)
+        route_join = resources["route_join"]
+        coverage = route_join["coverage"]
+        st.caption(
+            f"{coverage['matched_routes']:,} of {coverage['routes']:,} ridership routes matched to performance lines "
+            f"({coverage['matched_passengers'] / coverage['passengers']:.0%} of daily passengers)."
+            if coverage['passengers'] else "No ridership routes to match."
+        )
+
+        n_affected_routes = st.slider("Routes to rank:", 5, 30, 15, step=5)
+
+        def build_affected_figure():
+            affected = route_join["routes"].nlargest(n_affected_routes, "delayed_passengers")
+
+            fig5 = go.Figure()
+            for metro_area, color in list(metro_colors.items()) + [('Other', '#7f7f7f')]:
+                area_routes = affected[affected['metro_area'] == metro_area]
+                fig5.add_trace(
+                    go.Bar(
+                        # Route ids repeat across regions, so the region is part of the label
+                        x=[f"{route} ({cluster})" for route, cluster in zip(area_routes['RouteID'],
+                                                                           area_routes['ClusterName'])],
+                        y=area_routes['delayed_passengers'],
+                        marker=dict(color=color),
+                        name=metro_area,
+                        hovertemplate=(
+                                "Route: %{x}<br>" +
+                                "Operator: %{customdata[0]}<br>" +
+                                "Region: %{customdata[1]}<br>" +
+                                "Passengers on late trips: %{y:,.0f} a day<br>" +
+                                "Daily passengers: %{customdata[2]:,.0f}<br>" +
+                                "Trips >5 min late: %{customdata[3]:.1%}<br>" +
+                                "Average delay: %{customdata[4]:.1f} minutes<br>" +
+                                "Passengers per ride: %{customdata[5]:.1f}<extra></extra>"
+                        ),
+                        customdata=area_routes[['AgencyName', 'ClusterName', 'DailyPassengers', 'late_ratio',
+                                                'avg_delay', 'AVGCommutersPerRide(Weekly)']].astype(object).values
+                    )
+                )
+
+            fig5.update_layout(
+                title=f"Top {n_affected_routes} Routes by Daily Passengers on Late Trips",
+                xaxis_title="Route Number",
+                yaxis_title="Passengers on Trips >5 min Late (per day)",
+                height=600,
+                xaxis={'type': 'category', 'categoryorder': 'total descending'},
+                showlegend=True,
+                legend=dict(
+                    title="Metro Area",
+                    orientation="h",
+                    y=1.02,
+                    x=0.5,
+                    xanchor='center',
+                    yanchor='bottom'
+                )
+            )
+            return fig5
+
+        with timing.span("fig5"):
+            fig5 = figures.figure(
+                FigureCache.make_key("route_performance.affected", route_join["fingerprint"],
+                                     n_routes=n_affected_routes),
+                build_affected_figure)
+        with timing.span("fig5.chart"):
+            st.plotly_chart(fig5, use_container_width=True)
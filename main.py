@@ -1,5 +1,6 @@
 import streamlit as st
-from dashboards import demand_supply, demand_variation, route_performance, overview
+from dashboards import demand_supply, demand_variation, origin_destination, route_performance, overview
+from pipeline import artifacts, demand_cube, dimensions, figure_cache, ingest, loaders, od_matrix, query, registry, resources, result_cache, ridership_store, rollups, route_index, route_join, shared_frames, streaming, timing
 import pandas as pd
 import os
 
@@ -11,28 +12,214 @@ st.set_page_config(
     layout="wide"
 )
 
+# Timing of this script run (see pipeline/timing.py); the page is filled in
+# once the sidebar selection is known
+trace = timing.start(page=None)
 
-# Load data only once
-@st.cache_data(ttl=3600)
-def load_ridership_data():
-    file_path = "data/2024_public_transport_ridership.csv"
-    return pd.read_csv(file_path)
 
+# Shallow copies handed out by the dataset registry stay independent of the shared frames
+pd.set_option("mode.copy_on_write", True)
 
-@st.cache_data(ttl=3600)
-def load_performance_data():
+RIDERSHIP_PATH = "data/2024_public_transport_ridership.csv"
+
+
+# The latest snapshot of the ridership store (`python -m pipeline.ridership_store`),
+# or the original CSV export when there is no store
+def ridership_path():
+    return ridership_store.latest_path(ridership_store.STORE_PATH, RIDERSHIP_PATH)
+
+
+# Version of all ridership snapshots (the store, or the CSV export)
+def ridership_snapshots_fingerprint():
+    if ridership_store.snapshots():
+        return registry.fingerprint(ridership_store.STORE_PATH)
+    return registry.fingerprint(RIDERSHIP_PATH)
+
+
+# Shared integer-coded dimensions (clusters, metro areas, operators, cities, routes).
+# The ridership dimensions are built from the ridership names alone, so loading
+# ridership never reads the performance data; the performance data only adds
+# the clusters, operators and lines it has on top (distinct values only).
+@st.cache_resource(ttl=3600)
+@timing.timed("load_ridership_dimensions", cache=True)
+def load_ridership_dimensions(file_path, fingerprint):
+    return dimensions.build_ridership_dimensions(
+        ridership_store.read_ridership(file_path, dimensions.RIDERSHIP_COLUMNS))
+
+
+@st.cache_resource(ttl=3600)
+@timing.timed("load_dimensions", cache=True)
+def load_dimensions(ridership_fingerprint, performance_fingerprint):
+    performance_names = loaders.distinct_rows(columns=dimensions.PERFORMANCE_COLUMNS)
+    return dimensions.add_performance_dimensions(load_ridership_dimensions(ridership_path(), ridership_fingerprint),
+                                                 performance_names)
+
+
+def current_dimensions():
+    return load_dimensions(registry.fingerprint(ridership_path()),
+                           registry.fingerprint(loaders.default_performance_path()))
+
+
+# Version of the encoded performance frame: its codes depend on both datasets
+def snapshot_key():
+    return f"{registry.fingerprint(ridership_path())}-{registry.fingerprint(loaders.default_performance_path())}"
+
+
+# The base datasets are encoded once and stored as Arrow snapshots; every
+# process then memory-maps them and shares their pages (see pipeline/shared_frames.py)
+@timing.timed("load_ridership_data", cache=True)
+def read_ridership_data(file_path):
+    fingerprint = registry.fingerprint(file_path)
+    return shared_frames.load("ridership", fingerprint, lambda: dimensions.encode_ridership(
+        ridership_store.read_ridership(file_path), load_ridership_dimensions(file_path, fingerprint)))
+
+
+@timing.timed("load_performance_data", cache=True)
+def read_performance_data(file_path):
     # file_url = "https://drive.google.com/file/d/1jR7O6RUW4pAB-aWwQTCwD2BQtIHOYptp/view?usp=sharing"
     # output = "data/2024_march_bus_performance.parquet blah "
     # file_path = "data/2024_bus_performance.parquet"
     # gdown.download(file_url, output, fuzzy=True, quiet=False)
     # file_path = "data/2024_march_bus_performance.parquet"
-    file_path = os.path.join(os.getcwd(), "data", "2024_march_bus_performance.parquet")
-    return pd.read_parquet(file_path)
+    # Only the columns the pages use, with compact (categorical / 32-bit) types
+    return shared_frames.load("performance", snapshot_key(), lambda: dimensions.encode_performance(
+        loaders.load_performance(file_path)[0], current_dimensions()))
+
+
+# Load data only once per process (and again only when the files change).
+# Cached functions get the dataset fingerprint as their key instead of
+# hashing whole DataFrames. A new ridership snapshot is a new source.
+@st.cache_resource
+def load_datasets(ridership_source):
+    datasets = registry.DatasetRegistry()
+    datasets.register("ridership", ridership_source, read_ridership_data)
+    datasets.register("performance", loaders.default_performance_path(), read_performance_data)
+    return datasets
+
+
+# Small results are kept in the process-wide result cache, which evicts the
+# least recently used entries beyond its memory budget (see pipeline/result_cache.py)
+@result_cache.cached(ttl=3600)
+@timing.timed("load_performance_sample")
+def load_performance_sample(fingerprint):
+    return loaders.load_performance_sample()
+
 
+# Query layer over the performance data: the loaded frame (pandas, default) or
+# the parquet files directly (PERFORMANCE_BACKEND=arrow), see pipeline/query.py
+# Maps names in results read straight from parquet onto the shared dimension codes
+def encode_performance_result(frame):
+    return dimensions.encode_performance(loaders.compact_performance_types(frame), current_dimensions())
+
+
+@st.cache_resource(ttl=3600)
+@timing.timed("load_performance_query", cache=True)
+def load_performance_query(kind, fingerprint):
+    if kind == "arrow":
+        return query.ArrowBackend(loaders.default_performance_path(), encode_performance_result, fingerprint)
+    performance = load_datasets(ridership_path()).get("performance").data
+    return query.PandasBackend(performance, fingerprint, routes=route_index.build_route_index(performance))
+
+
+# Delay rollups for the Under-performing Routes page, built once per dataset version.
+# A dataset maintained by `python -m pipeline.ingest` carries its own running
+# totals, which are read as they are. Without a loaded frame (Arrow backend) they are streamed batch by batch, so
+# memory stays bounded whatever the size of the data (see pipeline/streaming.py).
+# Read-only: shared between sessions, pages must not modify them.
+@st.cache_resource(ttl=3600)
+@timing.timed("load_delay_rollups", cache=True)
+def load_delay_rollups(_performance_query, fingerprint):
+    partials = ingest.current_partials(loaders.default_performance_path())
+    if partials is not None:
+        return streaming.rollups_from_partials(partials, postprocess=encode_performance_result)
+    if _performance_query.name == "arrow":
+        return streaming.stream_rollups(loaders.default_performance_path(), postprocess=encode_performance_result)
+    return rollups.build_delay_rollups(_performance_query)
+
+
+# Ridership demand per route joined with the route delay rollup through the
+# route key mapping (see pipeline/route_join.py), built once per version of
+# both datasets and of the mapping file.
+# Read-only: shared between sessions, pages must not modify them.
+@st.cache_resource(ttl=3600)
+@timing.timed("load_route_join", cache=True)
+def load_route_join(_ridership, _delay_rollups, fingerprint):
+    return {"fingerprint": fingerprint,
+            **route_join.build_route_join(_ridership, _delay_rollups["route"], route_join.read_overrides())}
+
+
+# Origin-destination matrix of the ridership data in sparse (COO) form, built
+# once per dataset version (see pipeline/od_matrix.py).
+# Read-only: shared between sessions, pages must not modify them.
+@st.cache_resource(ttl=3600)
+@timing.timed("load_od_matrix", cache=True)
+def load_od_matrix(_ridership, fingerprint):
+    return {"fingerprint": fingerprint, **od_matrix.build_od_matrix(_ridership)}
+
+
+# Demand / supply totals by metro area, cluster and route of every ridership
+# snapshot, oldest first (see pipeline/ridership_store.py).
+# Read-only: shared between sessions, pages must not modify them.
+@st.cache_resource(ttl=3600)
+@timing.timed("load_ridership_snapshots", cache=True)
+def load_ridership_snapshots(fingerprint):
+    return {"fingerprint": fingerprint,
+            "aggregates": ridership_store.all_aggregates(ridership_store.STORE_PATH, RIDERSHIP_PATH)}
+
+
+# Demand / supply cube of every ridership snapshot: all rollups of the stored
+# cube base, so the Demand vs. Supply page only filters small tables.
+# Read-only: shared between sessions, pages must not modify them.
+@st.cache_resource(ttl=3600)
+@timing.timed("load_demand_cube", cache=True)
+def load_demand_cube(fingerprint):
+    return {"fingerprint": fingerprint,
+            "cubes": demand_cube.build_cubes(load_ridership_snapshots(fingerprint)["aggregates"])}
+
+
+# Headline numbers of each snapshot for the Home page, stored as a tiny
+# artifact so a cold process does not load any dataset before the first paint
+@result_cache.cached(ttl=3600)
+@timing.timed("load_headline")
+def load_headline(fingerprint):
+    return artifacts.cached_json("headlines", fingerprint, lambda: {
+        snapshot: ridership_store.headline(aggregates)
+        for snapshot, aggregates in load_ridership_snapshots(fingerprint)["aggregates"].items()})
+
+
+# Serialized Plotly figures keyed by page, widget values and dataset
+# fingerprint, shared by all sessions (see pipeline/figure_cache.py).
+# Views pre-rendered by `python -m pipeline.prerender` are served from disk.
+@st.cache_resource
+@timing.timed("load_figure_cache", cache=True)
+def load_figure_cache():
+    return figure_cache.FigureCache(artifact_dir=figure_cache.VIEWS_DIR,
+                                    write_artifacts=figure_cache.prerendering())
+
+
+# Everything a page can declare in its REQUIRES; nothing is loaded until a page asks
+def page_resources(page_module):
+    datasets = load_datasets(ridership_path())
+    return resources.PageResources({
+        "ridership": lambda: datasets.get("ridership"),
+        "performance": lambda: datasets.get("performance"),
+        "performance_sample": lambda: load_performance_sample(datasets.fingerprint("performance")),
+        "performance_query": lambda: load_performance_query(query.backend_kind(), datasets.fingerprint("performance")),
+        "delay_rollups": lambda: load_delay_rollups(
+            load_performance_query(query.backend_kind(), datasets.fingerprint("performance")),
+            datasets.fingerprint("performance")),
+        "route_join": lambda: load_route_join(
+            datasets.get("ridership").data,
+            load_delay_rollups(load_performance_query(query.backend_kind(), datasets.fingerprint("performance")),
+                               datasets.fingerprint("performance")),
+            (datasets.fingerprint("ridership"), datasets.fingerprint("performance"), route_join.mapping_fingerprint())),
+        "od_matrix": lambda: load_od_matrix(datasets.get("ridership").data, datasets.fingerprint("ridership")),
+        "ridership_snapshots": lambda: load_ridership_snapshots(ridership_snapshots_fingerprint()),
+        "demand_cube": lambda: load_demand_cube(ridership_snapshots_fingerprint()),
+        "headline": lambda: load_headline(ridership_snapshots_fingerprint()),
+        "figure_cache": load_figure_cache,
+    }, page_module.REQUIRES)
 
-# Load data at the start
-ridership_data = load_ridership_data()
-performance_data = load_performance_data()
 
 # Sidebar logo
 # st.sidebar.image("data/logo.webp")
@@ -45,9 +232,16 @@ page = st.sidebar.radio(
         "🏠 Home",
         "Demand vs. Supply",
         "Variation Over Time",
-        "Under-performing Routes"
+        "Under-performing Routes",
+        "Origin-Destination"
     ]
 )
+trace.page = page
+
+# Developer performance panel: ?perf=1 in the URL or DASHBOARD_PERF_PANEL=1
+show_performance_panel = st.query_params.get("perf") == "1" or os.environ.get("DASHBOARD_PERF_PANEL") == "1"
+if show_performance_panel:
+    performance_panel = st.sidebar.container()
 
 # Expander for additional information
 with st.sidebar.expander("📄 About the Project"):
@@ -78,6 +272,8 @@ if page == "🏠 Home":
               Explore patterns in demand and availability based on hourly, daily, and weekly trends.
             - **Identifying Under-Performance Routes:**  
               Detect routes with the lowest adherence to scheduled departure times by comparing planned vs. actual trip execution.
+            - **Origin-Destination Demand:**  
+              Find the busiest corridors between cities and how passenger flows spread across the network.
     
             **Please select an option from the sidebar to explore insights and findings.**
         """)
@@ -85,14 +281,49 @@ if page == "🏠 Home":
         st.image("data/image.webp", caption="Public Transportation in Action by ChatGPT", width=320)
 
     # main page statistics:
-    overview.show(ridership_data, performance_data)
+    with timing.span("overview.show"):
+        overview.show(page_resources(overview))
 
 # Load pages based on user selection
 elif page == "Demand vs. Supply":
-    demand_supply.show(ridership_data)
+    with timing.span("demand_supply.show"):
+        demand_supply.show(page_resources(demand_supply))
 
 elif page == "Variation Over Time":
-    demand_variation.show(ridership_data, performance_data)
+    with timing.span("demand_variation.show"):
+        demand_variation.show(page_resources(demand_variation))
 
 elif page == "Under-performing Routes":
-    route_performance.show(performance_data)
+    with timing.span("route_performance.show"):
+        route_performance.show(page_resources(route_performance))
+
+elif page == "Origin-Destination":
+    with timing.span("origin_destination.show"):
+        origin_destination.show(page_resources(origin_destination))
+
+# End of the run: log the timings and show them if asked
+timing_record = timing.finish()
+if show_performance_panel:
+    with performance_panel.expander("⏱ Performance", expanded=True):
+        st.metric("Script run", f"{timing_record['seconds'] * 1000:,.0f} ms")
+        st.dataframe(
+            pd.DataFrame([{"span": "  " * entry["depth"] + entry["name"], "ms": entry["seconds"] * 1000,
+                           "start (ms)": entry["start"] * 1000}
+                          for entry in sorted(timing_record["spans"], key=lambda entry: entry["start"])]),
+            hide_index=True, use_container_width=True)
+        if timing_record["caches"]:
+            st.dataframe(pd.DataFrame.from_dict(timing_record["caches"], orient="index")
+                         .rename_axis("cache").reset_index(), hide_index=True, use_container_width=True)
+    with performance_panel.expander("🧠 Cache memory"):
+        results = result_cache.RESULTS.stats()
+        figures = load_figure_cache().stats()
+        st.metric("Result cache", f"{results['bytes'] / 1024 ** 2:,.1f} / {results['max_bytes'] / 1024 ** 2:,.0f} MB",
+                  help=f"{results['entries']} entries")
+        st.dataframe(result_cache.RESULTS.report(), hide_index=True, use_container_width=True)
+        st.dataframe(result_cache.RESULTS.largest(), hide_index=True, use_container_width=True)
+        st.metric("Figure cache", f"{figures['bytes'] / 1024 ** 2:,.1f} / {figures['max_bytes'] / 1024 ** 2:,.0f} MB",
+                  help=f"{figures['entries']} figures, {figures['evictions']} evicted")
+        # Memory-mapped, shared by all sessions and processes
+        st.dataframe(pd.DataFrame([{"snapshot": name, "mb": size / 1024 ** 2}
+                                   for name, size in shared_frames.snapshots().items()],
+                                  columns=["snapshot", "mb"]), hide_index=True, use_container_width=True)
@@ -0,0 +1,47 @@
+import json
+import os
+
+
+# Small precomputed results, stored next to the data and keyed by the
+# fingerprint of the dataset they were computed from
+ARTIFACTS_DIR = os.path.join("data", "artifacts")
+
+
+def artifact_path(name, fingerprint, extension="json"):
+    return os.path.join(ARTIFACTS_DIR, f"{name}-{fingerprint}.{extension}")
+
+
+def load_json(name, fingerprint):
+    path = artifact_path(name, fingerprint)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+# Write to a temporary file first so a concurrent reader never sees half a
+# file, then remove the artifacts of older fingerprints
+def save_json(name, fingerprint, value):
+    os.makedirs(ARTIFACTS_DIR, exist_ok=True)
+    path = artifact_path(name, fingerprint)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(value, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    for file_name in os.listdir(ARTIFACTS_DIR):
+        if file_name.startswith(f"{name}-") and file_name.endswith(".json") \
+                and os.path.join(ARTIFACTS_DIR, file_name) != path:
+            os.remove(os.path.join(ARTIFACTS_DIR, file_name))
+
+
+# Return the stored artifact, building (and storing) it on first use
+def cached_json(name, fingerprint, build):
+    value = load_json(name, fingerprint)
+    if value is None:
+        value = build()
+        try:
+            save_json(name, fingerprint, value)
+        except OSError:
+            # Read-only deployments still work, they just rebuild per process
+            pass
+    return value
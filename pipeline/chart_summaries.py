@@ -0,0 +1,138 @@
+import logging
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on the serialized size of one figure sent to the browser
+FIGURE_BYTE_BUDGET = 100_000
+
+# Outlier points kept per box (a deterministic sample of the rest)
+MAX_OUTLIERS = 50
+
+OUTLIER_META = "outliers"
+
+
+# Tukey box statistics of one group, with whiskers at the most extreme
+# values within 1.5 IQR (Plotly's convention) and sampled outliers
+def box_stats(values, max_outliers=MAX_OUTLIERS, seed=0):
+    values = np.asarray(values, dtype="float64")
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return None
+
+    q1, median, q3 = np.percentile(values, [25, 50, 75])
+    iqr = q3 - q1
+    inside = values[(values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)]
+    outliers = values[(values < q1 - 1.5 * iqr) | (values > q3 + 1.5 * iqr)]
+    if len(outliers) > max_outliers:
+        outliers = np.random.default_rng(seed).choice(outliers, max_outliers, replace=False)
+
+    return {
+        "q1": q1, "median": median, "q3": q3,
+        "lowerfence": inside.min(), "upperfence": inside.max(),
+        "mean": values.mean(), "count": len(values),
+        "outliers": np.sort(outliers),
+    }
+
+
+# Box statistics per group, as one small frame (one row per group)
+def grouped_box_stats(frame, group, value, max_outliers=MAX_OUTLIERS):
+    rows = []
+    for name, values in frame.groupby(group, observed=True)[value]:
+        stats = box_stats(values.to_numpy(), max_outliers)
+        if stats is not None:
+            rows.append({group: name, **stats})
+    return pd.DataFrame(rows)
+
+
+# A precomputed box trace (plus an outlier scatter) from grouped_box_stats;
+# empty traces when there are no groups (e.g. no valid delays)
+def box_traces(stats, group, hovertemplate=None):
+    if stats.empty:
+        return go.Box(hovertemplate=hovertemplate), go.Scatter(mode="markers", meta=OUTLIER_META)
+    box = go.Box(
+        x=stats[group].astype(str).tolist(),
+        q1=stats["q1"], median=stats["median"], q3=stats["q3"],
+        lowerfence=stats["lowerfence"], upperfence=stats["upperfence"],
+        mean=stats["mean"],
+        hovertemplate=hovertemplate,
+    )
+    lengths = [len(points) for points in stats["outliers"]]
+    outlier_x = np.repeat(stats[group].astype(str).to_numpy(), lengths)
+    outlier_y = np.concatenate(list(stats["outliers"])) if lengths else np.array([])
+    outliers = go.Scatter(
+        x=outlier_x, y=np.round(outlier_y, 1),
+        mode="markers", marker=dict(size=4, opacity=0.5),
+        meta=OUTLIER_META, hovertemplate="Outlier: %{y:.1f}<extra></extra>",
+    )
+    return box, outliers
+
+
+# Histogram counts computed on the server (NaNs ignored)
+def histogram(values, bins, value_range=None):
+    values = np.asarray(values, dtype="float64")
+    return np.histogram(values[~np.isnan(values)], bins=bins, range=value_range)
+
+
+def histogram_trace(counts, edges, **kwargs):
+    return go.Bar(x=(edges[:-1] + edges[1:]) / 2, y=counts, width=np.diff(edges), **kwargs)
+
+
+def figure_bytes(fig):
+    return len(fig.to_json().encode("utf-8"))
+
+
+# Per-point properties of a trace, thinned together
+POINT_PROPERTIES = ["x", "y", "text", "hovertext", "customdata", "width", "marker.size", "marker.color",
+                    "error_y.array"]
+
+
+def trace_points(trace):
+    if trace.type == "box":
+        return 0
+    for name in ("x", "y"):
+        values = trace[name]
+        if values is not None and not isinstance(values, str):
+            return len(values)
+    return 0
+
+
+# Keep every other point of a trace (in every per-point property it has)
+def thin_trace(trace):
+    points = trace_points(trace)
+    for name in POINT_PROPERTIES:
+        parent, _, prop = name.rpartition(".")
+        owner = trace[parent] if parent and parent in trace else (trace if not parent else None)
+        if owner is None or prop not in owner:
+            continue
+        values = owner[prop]
+        if values is not None and not isinstance(values, (str, int, float)) and len(values) == points:
+            owner[prop] = values[::2]
+
+
+# Keep a figure under the byte budget: outlier traces are thinned first,
+# then the trace with the most points, until the figure fits. Only a figure
+# with nothing left to thin (one point per trace) can stay over budget.
+def enforce_budget(fig, budget=FIGURE_BYTE_BUDGET):
+    size = figure_bytes(fig)
+    thinned = False
+    while size > budget:
+        outliers = [trace for trace in fig.data if trace.meta == OUTLIER_META and trace_points(trace) > 1]
+        others = [trace for trace in fig.data if trace_points(trace) > 1]
+        if outliers:
+            for trace in outliers:
+                thin_trace(trace)
+        elif others:
+            thin_trace(max(others, key=trace_points))
+        else:
+            logger.warning("Figure is %s bytes, over the %s byte budget", size, budget)
+            break
+        thinned = True
+        size = figure_bytes(fig)
+    if thinned:
+        logger.info("Figure thinned to %s bytes to fit the %s byte budget", size, budget)
+    return fig
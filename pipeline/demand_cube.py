@@ -0,0 +1,81 @@
+import itertools
+
+import numpy as np
+
+from pipeline import ridership_store
+
+
+# Dimensions of the demand / supply cube. Its base (stored with each ridership
+# snapshot, see pipeline/ridership_store.py) holds one row per route and
+# combination of these.
+DIMENSIONS = ridership_store.CUBE_KEYS[:-1]
+ROUTE = "RouteID"
+
+# Drill-down of the Demand vs. Supply page: metro area -> region -> operator -> route
+DRILL_PATH = ["Metropolin", "ClusterName", "AgencyName", ROUTE]
+
+# Additive measures, plus the number of distinct routes (not additive, so it
+# is counted in each rollup)
+VALUES = ridership_store.MEASURES + ["rows", "routes"]
+
+
+# Sum the cube base over everything except `by`
+def rollup(base, by):
+    if not by:
+        totals = base[ridership_store.MEASURES + ["rows"]].sum().to_frame().T
+        totals["routes"] = base[ROUTE].nunique()
+        return totals
+    grouped = base.groupby(by, observed=True)
+    result = grouped[ridership_store.MEASURES + ["rows"]].sum()
+    result["routes"] = grouped[ROUTE].nunique()
+    return result.reset_index()
+
+
+# Every rollup of the base over a subset of DIMENSIONS (64 tables, each at
+# most the size of the base), keyed by its dimensions in DIMENSIONS order.
+# The base itself answers route-level queries.
+def build_cube(base):
+    cube = {}
+    for size in range(len(DIMENSIONS) + 1):
+        for keys in itertools.combinations(DIMENSIONS, size):
+            cube[keys] = rollup(base, list(keys))
+    cube[tuple(ridership_store.CUBE_KEYS)] = base
+    return cube
+
+
+# Smallest table of the cube holding all of `columns`
+def cuboid(cube, columns):
+    if ROUTE in columns:
+        return cube[tuple(ridership_store.CUBE_KEYS)]
+    return cube[tuple(dimension for dimension in DIMENSIONS if dimension in columns)]
+
+
+# Totals per group of `by` within the cells matching `filters` ({dimension:
+# value}). Read from the rollup over exactly those dimensions, so only route
+# queries group anything.
+def query(cube, by, filters=None):
+    filters = filters or {}
+    table = cuboid(cube, list(by) + list(filters))
+    mask = np.ones(len(table), dtype=bool)
+    for column, value in filters.items():
+        mask &= (table[column] == value).to_numpy()
+    selected = table[mask]
+    if ROUTE in by:
+        return rollup(selected, list(by))
+    return selected[list(by) + VALUES].reset_index(drop=True)
+
+
+# Values of a dimension within the cells matching `filters`, sorted
+def members(cube, dimension, filters=None):
+    return sorted(query(cube, [dimension], filters)[dimension].astype(str))
+
+
+# Level below a drill-down selection (`filters` set along DRILL_PATH, in
+# order) and its totals within the selection
+def drill_down(cube, filters):
+    level = DRILL_PATH[len(filters)]
+    return level, query(cube, [level], filters)
+
+
+def build_cubes(aggregates):
+    return {snapshot: build_cube(snapshot_aggregates["cube"]) for snapshot, snapshot_aggregates in aggregates.items()}
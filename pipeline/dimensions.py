@@ -0,0 +1,167 @@
+import pandas as pd
+
+
+# Columns each dataset contributes to the shared dimensions
+RIDERSHIP_COLUMNS = ["RouteID", "RouteName", "AgencyName", "ClusterName", "Metropolin",
+                     "OriginCityName", "DestinationCityName"]
+PERFORMANCE_COLUMNS = ["OperatorLineId", "operator_nm", "cluster_nm", "metro_area"]
+
+# Correct city/region names of the ridership data (applied once, when names
+# are mapped to codes). Performance names are kept as they are.
+NAME_CORRECTIONS = {
+    "חולון עירוני ומטרופוליני+תחרות חולון": "חולון עירוני",
+    "קווי נצרת - שאמ": "נצרת - שאם",
+    "קווי נצרת - נסיעות ותיירות": "נצרת"
+}
+
+METRO_AREAS = ['Center', 'North', 'South', 'Inter-city', 'Other']
+
+# Cluster name substrings per metro area (matched on the raw, uncorrected names)
+METRO_MAPPING = {
+    'North': ['מתמ"ז-קריות', 'רמת הגולן', 'נתניה עירוני', 'נצרת', 'חדרה', 'גליל עמקים', 'חיפה', 'כרמיאל עירוני כרמיאל-חיפה חיפה-טבריה', 'מטרונית חיפה', 'העמקים', 'הגליל', 'קריית שמונה עירוני', 'קווי נצרת – שאמ', 'קריית שמונה-חיפה'],
+    'Center': ['חולון', 'רחובות', 'תל אביב', 'ביתר עילית ועמק האלה', 'ירושלים', 'מרכז', 'שרון', 'בית שמש', 'חשמונאים', 'תל אביב-גליל עמקים', 'ירושלים-ב.ברק קו 402', 'ירושלים מרכז', 'רשל"צ עירוני', 'פרוזדור ירושלים', 'ירושלים-תל אביב', 'אונו-אלעד', 'רשל"צ פרברי', 'בקעת אונו אלעד', 'שרון חולון מרחבי', 'כביש 4 -ירושלים-בני ברק', 'פתח תקוה-ראש העין'],
+    'South': ['דרום', 'צפון הנגב', 'אשדוד', 'באר שבע', 'אשקלון', 'הנגב', 'אילות', 'אילת', 'דרומי', 'צפון הנגב', 'רהט והנגב המערבי', 'הנגב'],
+    'Inter-city': ['ירושלים קווי צפון', 'ירושלים צפון-ציר מזרחי', 'חיפה-ירושלים-אילת', 'חיפה-שרון-ירושלים', 'בין עירוני', 'ירושלים-באר שבע', 'קווי נצרת - נסיעות ותיירות', 'חיפה-ירושלים-אילת', 'חיפה-שרון-ירושלים', 'תל אביב-אשקלון', 'תל אביב-חדרה', 'אשדוד-אשקלון-ירושלים', 'תל אביב-שרון-חיפה', 'חדרה-נתניה']
+}
+
+
+# Metro area of each distinct cluster name. Same substring rules as the
+# original per-row loop (later areas win), evaluated once per name.
+def metro_area_of(cluster_names):
+    clusters = pd.Series(pd.unique(pd.Series(cluster_names).dropna()), dtype=object)
+    metro = pd.Series('Other', index=clusters.index)
+    for area, patterns in METRO_MAPPING.items():
+        metro[clusters.str.contains('|'.join(patterns), na=False)] = area
+    return dict(zip(clusters, metro))
+
+
+def map_metro_area(cluster_names):
+    return cluster_names.map(metro_area_of(cluster_names)).fillna('Other').astype("category")
+
+
+def canonical_names(names):
+    return pd.Series(names, dtype=object).map(lambda name: NAME_CORRECTIONS.get(name, name))
+
+
+# Dimension table: one row per (canonical) name, code = position in sorted order
+def build_dimension(*name_columns, corrections=True):
+    names = pd.concat([canonical_names(pd.unique(col.dropna())) if corrections
+                       else pd.Series(pd.unique(col.dropna()), dtype=object) for col in name_columns])
+    names = pd.Index(names.unique()).sort_values()
+    return pd.DataFrame({"code": range(len(names)), "name": names})
+
+
+# The dimension with the names of `name_columns` it does not hold yet appended
+# (sorted, uncorrected): existing codes keep their meaning
+def extend_dimension(dimension, *name_columns):
+    added = build_dimension(*name_columns, corrections=False)
+    added = added[~added["name"].isin(dimension["name"])]
+    names = pd.Index(pd.concat([dimension["name"], added["name"]], ignore_index=True))
+    return pd.DataFrame({"code": range(len(names)), "name": names})
+
+
+def dimension_dtype(dimension):
+    return pd.CategoricalDtype(dimension["name"], ordered=False)
+
+
+# Map a column of raw names onto the dimension's shared categorical dtype,
+# so .cat.codes are the dimension codes in every dataset. Corrections are
+# looked up once per distinct value, not per row.
+def encode(series, dimension, corrections=True):
+    raw = series.astype("category")
+    names = canonical_names(raw.cat.categories) if corrections else raw.cat.categories
+    lookup = pd.Index(dimension["name"]).get_indexer(names)
+    codes = lookup[raw.cat.codes.to_numpy()]
+    codes[raw.cat.codes.to_numpy() < 0] = -1
+    return pd.Series(pd.Categorical.from_codes(codes, dtype=dimension_dtype(dimension)),
+                     index=series.index, name=series.name)
+
+
+# Cluster -> metro area of each name, decided on the raw names; with
+# corrections, a corrected name takes the area of its first raw name
+def cluster_metro_areas(cluster_names, corrections=True):
+    raw = pd.Series(pd.unique(pd.Series(cluster_names).astype(object).dropna()), dtype=object)
+    names = canonical_names(raw) if corrections else raw
+    metro = pd.Series(raw.map(metro_area_of(raw)).to_numpy(), index=names.to_numpy())
+    return metro.groupby(level=0).first()
+
+
+# Dimensions of the ridership data alone, so the ridership frame is encoded
+# without reading the performance data. Names are corrected.
+def build_ridership_dimensions(ridership):
+    clusters = build_dimension(ridership["ClusterName"])
+    clusters["metro_area"] = cluster_metro_areas(ridership["ClusterName"]).reindex(clusters["name"]).to_numpy()
+
+    dims = {
+        "cluster": clusters,
+        "metropolin": build_dimension(ridership["Metropolin"]),
+        "metro_area": pd.DataFrame({"code": range(len(METRO_AREAS)), "name": METRO_AREAS}),
+        "operator": build_dimension(ridership["AgencyName"]),
+        "city": build_dimension(ridership["OriginCityName"], ridership["DestinationCityName"]),
+    }
+
+    # Routes with their attributes as codes
+    dims["route"] = pd.DataFrame({
+        "RouteID": ridership["RouteID"].astype("int32"),
+        "RouteName": ridership["RouteName"],
+        "operator_code": encode(ridership["AgencyName"], dims["operator"]).cat.codes,
+        "cluster_code": encode(ridership["ClusterName"], dims["cluster"]).cat.codes,
+        "metropolin_code": encode(ridership["Metropolin"], dims["metropolin"]).cat.codes,
+    }).drop_duplicates("RouteID").reset_index(drop=True)
+    return dims
+
+
+# The ridership dimensions extended with the clusters and operators that only
+# the performance data has, plus its lines. Performance names are not
+# corrected (the pages show them as in the data), and codes of ridership
+# names are unchanged, so both frames share them.
+def add_performance_dimensions(dims, performance):
+    dims = dict(dims)
+    clusters = extend_dimension(dims["cluster"], performance["cluster_nm"])
+    metro = pd.concat([dims["cluster"].set_index("name")["metro_area"],
+                       cluster_metro_areas(performance["cluster_nm"], corrections=False)])
+    clusters["metro_area"] = metro.groupby(level=0).first().reindex(clusters["name"]).to_numpy()
+    dims["cluster"] = clusters
+    dims["operator"] = extend_dimension(dims["operator"], performance["operator_nm"])
+
+    lines = performance[PERFORMANCE_COLUMNS].drop_duplicates("OperatorLineId")
+    dims["line"] = pd.DataFrame({
+        "OperatorLineId": lines["OperatorLineId"].astype("int32"),
+        "operator_code": encode(lines["operator_nm"], dims["operator"], corrections=False).cat.codes,
+        "cluster_code": encode(lines["cluster_nm"], dims["cluster"], corrections=False).cat.codes,
+        "metro_area_code": encode(lines["metro_area"], dims["metro_area"]).cat.codes,
+    }).reset_index(drop=True)
+    return dims
+
+
+def build_dimensions(ridership, performance):
+    return add_performance_dimensions(build_ridership_dimensions(ridership), performance)
+
+
+RIDERSHIP_ENCODING = {
+    "ClusterName": "cluster",
+    "Metropolin": "metropolin",
+    "AgencyName": "operator",
+    "OriginCityName": "city",
+    "DestinationCityName": "city",
+}
+
+PERFORMANCE_ENCODING = {
+    "cluster_nm": "cluster",
+    "operator_nm": "operator",
+    "metro_area": "metro_area",
+}
+
+
+# Replace name columns with shared-code categoricals (in place)
+def encode_ridership(df, dims):
+    for col, dim in RIDERSHIP_ENCODING.items():
+        df[col] = encode(df[col], dims[dim])
+    return df
+
+
+def encode_performance(df, dims):
+    for col, dim in PERFORMANCE_ENCODING.items():
+        if col in df.columns:
+            df[col] = encode(df[col], dims[dim], corrections=False)
+    return df
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from pipeline import timing
+
+
+# Default memory budget for cached figure JSON (all pages, all sessions)
+DEFAULT_MAX_BYTES = 64 * 1024 ** 2
+
+# Pre-rendered views (see pipeline/prerender.py)
+VIEWS_DIR = os.path.join("data", "artifacts", "views")
+
+# Set while pre-rendering: every view built is also written to VIEWS_DIR
+PRERENDER_ENV = "DASHBOARD_PRERENDER"
+
+
+def prerendering():
+    return os.environ.get(PRERENDER_ENV) == "1"
+
+
+# Finished Plotly figures (and small KPI values), stored as JSON and keyed by
+# page, widget values and dataset fingerprint. Shared by every session of the
+# process; least recently used entries are evicted once the total size in
+# UTF-8 bytes (Hebrew labels take two per character) exceeds max_bytes. With
+# an artifact_dir, entries missing from memory are looked up on disk before
+# being built, and with write_artifacts every built entry is stored there too.
+class FigureCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, artifact_dir=None, write_artifacts=False):
+        self.max_bytes = max_bytes
+        self.artifact_dir = artifact_dir
+        self.write_artifacts = write_artifacts
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.artifact_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(page, fingerprint, **widgets):
+        return (page, fingerprint) + tuple(sorted(widgets.items()))
+
+    # File of a key in the artifact directory: the page name plus a digest
+    # of the whole key, which is stable across processes
+    def artifact_path(self, key):
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:20]
+        return os.path.join(self.artifact_dir, f"{key[0]}-{digest}.json")
+
+    def _get_spec(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+        if self.artifact_dir is not None and os.path.exists(self.artifact_path(key)):
+            with open(self.artifact_path(key), encoding="utf-8") as f:
+                spec = f.read()
+            self._put_spec(key, spec)
+            with self._lock:
+                self.artifact_hits += 1
+            return spec
+        with self._lock:
+            self.misses += 1
+        return None
+
+    # Entries are (spec, size in bytes)
+    def _put_spec(self, key, spec):
+        size = len(spec.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (spec, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def _store(self, key, spec):
+        self._put_spec(key, spec)
+        if self.write_artifacts and self.artifact_dir is not None:
+            os.makedirs(self.artifact_dir, exist_ok=True)
+            path = self.artifact_path(key)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(spec)
+            os.replace(tmp_path, path)
+
+    def get(self, key):
+        spec = self._get_spec(key)
+        return None if spec is None else json.loads(spec)
+
+    def put(self, key, fig):
+        self._store(key, fig.to_json())
+
+    # The cached figure (as a dict, ready for st.plotly_chart) or, on a
+    # miss, the figure returned by build(), which is cached for next time
+    def figure(self, key, build):
+        cached = self.get(key)
+        timing.cache_lookup(f"figures.{key[0]}", hit=cached is not None)
+        if cached is not None:
+            return cached
+        with timing.span(f"{key[0]}.build"):
+            fig = build()
+        self.put(key, fig)
+        return fig
+
+    # Same for a JSON-serializable value, e.g. the KPIs shown for a selection
+    def value(self, key, build):
+        cached = self.get(key)
+        timing.cache_lookup(f"figures.{key[0]}", hit=cached is not None)
+        if cached is not None:
+            return cached
+        with timing.span(f"{key[0]}.build"):
+            value = build()
+        self._store(key, json.dumps(value))
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "artifact_hits": self.artifact_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
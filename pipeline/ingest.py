@@ -0,0 +1,194 @@
+"""
+Incremental append of new months to the preprocessed performance dataset.
+
+Each run derives the columns of one raw `bitzua_bus_trip` export (see
+pipeline/preprocess.py), writes it as new month partitions and computes the
+delay partial aggregates (see pipeline/streaming.py) of those partitions
+only. The partials are then merged into the running totals the app reads
+its rollups from. `_manifest.json` records the months already included, so
+a refresh costs time proportional to the new month, not the whole history.
+
+    python -m pipeline.ingest raw_2024_04.csv                # append a month
+    python -m pipeline.ingest raw_2024_04.csv --replace      # re-ingest it
+    python -m pipeline.ingest --sync                         # adopt an existing dataset
+
+Files and directories starting with "_" are skipped by parquet readers, so
+the manifest and partials live inside the dataset directory.
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+
+from pipeline import loaders, preprocess, registry, streaming
+
+
+MANIFEST_FILE = "_manifest.json"
+PARTIALS_DIR = "_partials"
+TOTAL = "total"
+
+
+def month_dir(dataset, month):
+    return os.path.join(dataset, f"month={month}")
+
+
+def partials_dir(dataset, name):
+    return os.path.join(dataset, PARTIALS_DIR, name)
+
+
+# Month partitions present on disk
+def months_on_disk(dataset):
+    if not os.path.isdir(dataset):
+        return []
+    return sorted(name.split("=", 1)[1] for name in os.listdir(dataset) if name.startswith("month="))
+
+
+def load_manifest(dataset):
+    path = os.path.join(dataset, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {"months": {}}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+# Written last and atomically: readers see either the old or the new state
+def save_manifest(dataset, manifest):
+    path = os.path.join(dataset, MANIFEST_FILE)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+# Replace a partials directory as a whole (write aside, then swap)
+def _replace_partials(partials, directory):
+    tmp_dir = f"{directory}.{os.getpid()}.tmp"
+    streaming.save_partials(partials, tmp_dir)
+    if os.path.isdir(directory):
+        shutil.rmtree(directory)
+    os.replace(tmp_dir, directory)
+
+
+# Aggregate one month partition (read back batch by batch) and record it
+def register_month(dataset, manifest, month, source=None):
+    path = month_dir(dataset, month)
+    partials = streaming.stream_partials(path)
+    _replace_partials(partials, partials_dir(dataset, month))
+    files = loaders.parquet_files(path)
+    manifest["months"][month] = {
+        "rows": int(partials["metro"]["rows"].sum()),
+        "files": len(files),
+        "source": source,
+        "source_fingerprint": registry.fingerprint(source) if source else None,
+        "ingested_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+    return partials
+
+
+# Running totals over every month in the manifest, from the per-month partials
+def rebuild_total(dataset, manifest):
+    total = None
+    for month in sorted(manifest["months"]):
+        total = streaming.merge_partials(total, streaming.load_partials(partials_dir(dataset, month)))
+    if total is not None:
+        _replace_partials(total, partials_dir(dataset, TOTAL))
+    return total
+
+
+def merge_into_total(dataset, partials):
+    total_dir = partials_dir(dataset, TOTAL)
+    total = streaming.load_partials(total_dir) if streaming.has_partials(total_dir) else None
+    _replace_partials(streaming.merge_partials(total, partials), total_dir)
+
+
+# Bring the manifest in line with the partitions on disk: months written by
+# `pipeline.preprocess` (or by hand) are aggregated once, removed months are
+# dropped. Returns the manifest.
+def sync_manifest(dataset):
+    manifest = load_manifest(dataset)
+    on_disk = months_on_disk(dataset)
+    # Months without (complete) partials, e.g. written before a new table was added
+    added = [month for month in on_disk
+             if month not in manifest["months"] or not streaming.has_partials(partials_dir(dataset, month))]
+    removed = [month for month in manifest["months"] if month not in on_disk]
+    for month in removed:
+        del manifest["months"][month]
+        shutil.rmtree(partials_dir(dataset, month), ignore_errors=True)
+    for month in added:
+        register_month(dataset, manifest, month)
+    if added or removed or not streaming.has_partials(partials_dir(dataset, TOTAL)):
+        rebuild_total(dataset, manifest)
+        save_manifest(dataset, manifest)
+    return manifest
+
+
+def ingest(input_path, dataset, replace=False):
+    manifest = sync_manifest(dataset) if os.path.isdir(dataset) else {"months": {}}
+
+    processed = preprocess.derive_performance_columns(preprocess.read_raw(input_path))
+    months = sorted(processed["month"].dropna().unique())
+    existing = [month for month in months if month in manifest["months"]]
+    if existing and not replace:
+        raise ValueError(f"{', '.join(existing)} already ingested (use --replace)")
+
+    for month in existing:
+        shutil.rmtree(month_dir(dataset, month))
+        shutil.rmtree(partials_dir(dataset, month), ignore_errors=True)
+        del manifest["months"][month]
+
+    preprocess.write_partitioned(processed, dataset)
+    del processed
+
+    new_partials = None
+    for month in months:
+        new_partials = streaming.merge_partials(new_partials,
+                                                register_month(dataset, manifest, month, input_path))
+    if existing:
+        # Replaced months cannot be subtracted from the totals: re-merge the
+        # stored per-month partials (small, no data is read)
+        rebuild_total(dataset, manifest)
+    else:
+        merge_into_total(dataset, new_partials)
+    save_manifest(dataset, manifest)
+    return months
+
+
+# Partials of the whole dataset, or None if there is no manifest or it does
+# not match the partitions on disk (the rollups then have to be recomputed)
+def current_partials(dataset):
+    if not os.path.isdir(dataset):
+        return None
+    manifest = load_manifest(dataset)
+    total_dir = partials_dir(dataset, TOTAL)
+    if not manifest["months"] or sorted(manifest["months"]) != months_on_disk(dataset) \
+            or not streaming.has_partials(total_dir):
+        return None
+    return streaming.load_partials(total_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Append new months to the preprocessed performance dataset.")
+    parser.add_argument("input", nargs="?", help="raw bitzua_bus_trip export (.csv or .parquet)")
+    parser.add_argument("--dataset", default=loaders.PERFORMANCE_DATASET_PATH, help="dataset directory")
+    parser.add_argument("--replace", action="store_true", help="re-ingest months that are already included")
+    parser.add_argument("--sync", action="store_true", help="only bring the manifest in line with the dataset")
+    args = parser.parse_args()
+    if args.input is None and not args.sync:
+        parser.error("an input file is required (or --sync)")
+
+    start = time.perf_counter()
+    if args.sync:
+        manifest = sync_manifest(args.dataset)
+        print(f"synced {args.dataset}: {len(manifest['months'])} months in {time.perf_counter() - start:.1f}s")
+        return
+    try:
+        months = ingest(args.input, args.dataset, args.replace)
+    except ValueError as error:
+        parser.error(str(error))
+    print(f"ingested {', '.join(months)} into {args.dataset} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+import logging
+import os
+import sys
+
+import pandas as pd
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from pipeline.route_index import ROUTE_COLUMN, sort_by_route
+from pipeline.time_buckets import minute_of_day
+
+
+logger = logging.getLogger(__name__)
+
+PERFORMANCE_PATH = os.path.join("data", "2024_march_bus_performance.parquet")
+FULL_YEAR_PERFORMANCE_PATH = os.path.join("data", "2024_bus_performance.parquet")
+# Output of `python -m pipeline.preprocess` (partitioned by month / metro area)
+PERFORMANCE_DATASET_PATH = os.path.join("data", "performance")
+
+# Columns the dashboards actually read from the performance data
+PERFORMANCE_COLUMNS = [
+    "OperatorLineId",
+    "operator_nm",
+    "cluster_nm",
+    "metro_area",
+    "minute_of_day",
+    "trip_day_in_week",
+    "delay_minutes",
+    "delay_category",
+    "hour",
+    "date",
+    "day_name",
+]
+
+# Low-cardinality string columns, stored as pandas categoricals
+CATEGORY_COLUMNS = ["cluster_nm", "operator_nm", "metro_area", "delay_category", "day_name", "hour"]
+
+# Numeric columns downcast to compact types
+NUMERIC_DTYPES = {
+    "OperatorLineId": "int32",
+    "minute_of_day": "int16",
+    "trip_day_in_week": "int8",
+    "delay_minutes": "float32",
+}
+
+
+# Prefer the preprocessed dataset when it has been built
+def default_performance_path():
+    if os.path.isdir(PERFORMANCE_DATASET_PATH):
+        return PERFORMANCE_DATASET_PATH
+    return PERFORMANCE_PATH
+
+
+# Parquet files behind a path (a single file or a partitioned dataset directory)
+def parquet_files(file_path):
+    if os.path.isdir(file_path):
+        return sorted(pq.ParquetDataset(file_path).files)
+    return [file_path]
+
+
+def memory_mb(df):
+    return df.memory_usage(deep=True).sum() / 1024 ** 2
+
+
+# Uncompressed size of the whole file as recorded in the parquet footer,
+# i.e. roughly what a plain pd.read_parquet() of every column had to hold.
+def parquet_uncompressed_mb(file_path):
+    total = 0
+    for path in parquet_files(file_path):
+        metadata = pq.ParquetFile(path).metadata
+        total += sum(metadata.row_group(i).total_byte_size for i in range(metadata.num_row_groups))
+    return total / 1024 ** 2
+
+
+# Convert a projected performance frame to compact dtypes (in place).
+# Categoricals are unordered whatever the parquet metadata says, so frames
+# read in different ways compare equal.
+def compact_performance_types(df):
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype("category")
+        elif col in df.columns and df[col].cat.ordered:
+            df[col] = df[col].cat.as_unordered()
+    for col, dtype in NUMERIC_DTYPES.items():
+        if col in df.columns:
+            df[col] = df[col].astype(dtype)
+    if "date" in df.columns:
+        df["date"] = pd.to_datetime(df["date"])
+    return df
+
+
+# Read only the columns the pages use, with compact types.
+# String columns are read as dictionaries so they become categoricals
+# without materializing one Python string per row.
+def load_performance(file_path=None, columns=None):
+    file_path = default_performance_path() if file_path is None else file_path
+    columns = PERFORMANCE_COLUMNS if columns is None else columns
+    available = set(pq.ParquetDataset(file_path).schema.names)
+    # Files written before preprocess stored minute_of_day: derive it from trip_time
+    derive_minutes = "minute_of_day" in columns and "minute_of_day" not in available
+    if derive_minutes:
+        columns = columns + ["trip_time"]
+    columns = [col for col in columns if col in available]
+
+    table = pq.read_table(
+        file_path,
+        columns=columns,
+        read_dictionary=[col for col in CATEGORY_COLUMNS if col in columns]
+    )
+    df = table.to_pandas()
+    if derive_minutes and "trip_time" in df.columns:
+        df["minute_of_day"] = minute_of_day(df.pop("trip_time"))
+    df = compact_performance_types(df)
+    # Each route as one contiguous block of rows (see pipeline/route_index.py)
+    if ROUTE_COLUMN in df.columns:
+        df = sort_by_route(df)
+
+    report = {
+        "file": file_path,
+        "rows": len(df),
+        "columns": len(columns),
+        "parquet_uncompressed_mb": round(parquet_uncompressed_mb(file_path), 1),
+        "loaded_mb": round(memory_mb(df), 1),
+    }
+    logger.info("Loaded %(rows)s rows x %(columns)s columns from %(file)s: "
+                "%(parquet_uncompressed_mb)s MB uncompressed on disk -> %(loaded_mb)s MB in memory", report)
+    return df, report
+
+
+# Distinct combinations of a few columns, read batch by batch so memory
+# stays bounded by the batch size (partition columns are included)
+def distinct_rows(file_path=None, columns=None, batch_size=1_000_000):
+    file_path = default_performance_path() if file_path is None else file_path
+    dataset = ds.dataset(file_path, format="parquet", partitioning="hive")
+    columns = [col for col in columns if col in dataset.schema.names]
+    parts = [batch.to_pandas().drop_duplicates()
+             for batch in dataset.to_batches(columns=columns, batch_size=batch_size)]
+    return pd.concat(parts, ignore_index=True).drop_duplicates(ignore_index=True)
+
+
+# Headline numbers for the Home page: a projected read of four ridership columns
+def headline_numbers(file_path):
+    data = pd.read_csv(file_path, usecols=["RouteID", "WeekyRides", "DailyRides", "DailyPassengers"])
+    return {
+        "total_trips": float(data["WeekyRides"].sum()),
+        "total_day_trips": float(data["DailyRides"].sum()),
+        "daily_passengers": int(data["DailyPassengers"].sum()),
+        "total_routes": int(data["RouteID"].nunique()),
+    }
+
+
+# A handful of complete rows (all columns) for the overview data preview
+def load_performance_sample(file_path=None, num_rows=100):
+    file_path = default_performance_path() if file_path is None else file_path
+    batch = next(pq.ParquetFile(parquet_files(file_path)[0]).iter_batches(batch_size=num_rows))
+    return batch.to_pandas()
+
+
+# Compare the naive full read against the projected, compact read:
+#   python -m pipeline.loaders [path/to/performance.parquet]
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else default_performance_path()
+
+    naive = pd.read_parquet(path)
+    before = memory_mb(naive)
+    del naive
+
+    compact, _ = load_performance(path)
+    after = memory_mb(compact)
+
+    print(f"{path}")
+    print(f"  pd.read_parquet (all columns):   {before:10.1f} MB")
+    print(f"  load_performance (projected):    {after:10.1f} MB")
+    print(f"  saving:                          {100 * (1 - after / before):10.1f} %")
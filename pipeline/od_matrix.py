@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+
+
+# Demand / supply measures of the origin-destination matrix
+MEASURES = ["WeeklyPassengers", "WeekyRides"]
+
+
+# Sparse city x city matrix in coordinate (COO) form: one row per origin /
+# destination pair served by at least one route, with int32 city codes (the
+# shared city dimension, see pipeline/dimensions.py), the summed measures and
+# the number of routes, largest passenger flows first. `cities` maps codes to
+# names; `totals` holds the outbound / inbound totals of every city.
+def build_od_matrix(ridership):
+    origins = ridership["OriginCityName"].cat.codes.to_numpy()
+    destinations = ridership["DestinationCityName"].cat.codes.to_numpy()
+    cities = ridership["OriginCityName"].cat.categories
+    known = (origins >= 0) & (destinations >= 0)
+
+    # Pair id = origin * cities + destination, summed by a bincount per pair
+    pair_ids = origins[known].astype("int64") * len(cities) + destinations[known]
+    pairs, inverse = np.unique(pair_ids, return_inverse=True)
+    matrix = pd.DataFrame({
+        "origin": (pairs // len(cities)).astype("int32"),
+        "destination": (pairs % len(cities)).astype("int32"),
+    })
+    for measure in MEASURES:
+        values = np.nan_to_num(ridership[measure].to_numpy(dtype="float64")[known])
+        matrix[measure] = np.bincount(inverse, weights=values, minlength=len(pairs))
+    route_pairs = np.unique(np.stack([inverse, ridership["RouteID"].to_numpy()[known]]), axis=1)
+    matrix["routes"] = np.bincount(route_pairs[0], minlength=len(pairs)).astype("int32")
+    matrix = matrix.sort_values("WeeklyPassengers", ascending=False, kind="stable", ignore_index=True)
+    return {"matrix": matrix, "cities": cities, "totals": city_totals(matrix, len(cities))}
+
+
+# Outbound and inbound totals per city code, and the part of them on routes
+# that stay within the city (counted on both sides)
+def city_totals(matrix, n_cities):
+    within = (matrix["origin"] == matrix["destination"]).to_numpy()
+    totals = pd.DataFrame(index=pd.RangeIndex(n_cities, name="city"))
+    for measure in MEASURES:
+        values = matrix[measure].to_numpy()
+        totals[f"out_{measure}"] = np.bincount(matrix["origin"], weights=values, minlength=n_cities)
+        totals[f"in_{measure}"] = np.bincount(matrix["destination"], weights=values, minlength=n_cities)
+        totals[f"within_{measure}"] = np.bincount(matrix["origin"][within], weights=values[within],
+                                                  minlength=n_cities)
+    return totals
+
+
+def city_code(od, city):
+    return od["cities"].get_loc(city)
+
+
+# Cities by total (outbound + inbound) of a measure, largest first
+def ranked_cities(od, measure="WeeklyPassengers"):
+    totals = od["totals"]
+    order = (totals[f"out_{measure}"] + totals[f"in_{measure}"]).sort_values(ascending=False, kind="stable")
+    return od["cities"][order.index[order > 0]]
+
+
+# The k largest corridors by a measure, with city names. Routes within a
+# single city are left out unless asked for; `city` keeps the corridors
+# from or to that city.
+def top_corridors(od, k, measure="WeeklyPassengers", within_city=False, city=None):
+    matrix = od["matrix"]
+    keep = np.ones(len(matrix), dtype=bool)
+    if not within_city:
+        keep &= (matrix["origin"] != matrix["destination"]).to_numpy()
+    if city is not None:
+        code = city_code(od, city)
+        keep &= ((matrix["origin"] == code) | (matrix["destination"] == code)).to_numpy()
+    selected = matrix[keep]
+    # The matrix is already ordered by passengers
+    top = selected.head(k) if measure == "WeeklyPassengers" else selected.nlargest(k, measure)
+    return top.assign(origin_name=od["cities"][top["origin"]], destination_name=od["cities"][top["destination"]])
+
+
+# Dense n x n block of the matrix for the n cities with the largest totals
+# (the only part ever made dense), rows = origins, columns = destinations
+def top_cities_matrix(od, n, measure="WeeklyPassengers", within_city=False):
+    top = od["cities"].get_indexer(ranked_cities(od, measure)[:n])
+    position = np.full(len(od["cities"]), -1)
+    position[top] = np.arange(len(top))
+
+    matrix = od["matrix"]
+    rows = position[matrix["origin"].to_numpy()]
+    columns = position[matrix["destination"].to_numpy()]
+    keep = (rows >= 0) & (columns >= 0)
+    if not within_city:
+        keep &= rows != columns
+    dense = np.zeros((len(top), len(top)))
+    dense[rows[keep], columns[keep]] = matrix[measure].to_numpy()[keep]
+    names = od["cities"][top]
+    return pd.DataFrame(dense, index=names, columns=names)
@@ -0,0 +1,231 @@
+"""
+Offline preprocessing of the raw data.gov.il `bitzua_bus_trip` export.
+
+Builds the derived performance columns once (planned/actual time, delay with
+midnight wrap-around, delay category, hour, date, day name, metro area) and
+writes a parquet dataset partitioned by month and metro area, so the
+Streamlit app never parses timestamps or maps strings at request time.
+
+    python -m pipeline.preprocess raw_bitzua_bus_trip.csv data/performance
+
+With --workers N the input is split into chunks of CHUNK_ROWS rows (read
+by the workers for parquet, parsed by the main process for CSV) that a pool
+of N processes derives and writes in parallel. Each chunk writes its own
+files, named after the chunk number, so the output does not depend on which
+worker finishes first.
+"""
+import argparse
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from pipeline.dimensions import map_metro_area
+from pipeline.route_index import sort_by_route
+from pipeline.time_buckets import day_index
+
+
+# Raw columns used to build the derived ones
+RAW_COLUMNS = ["trip_dt", "trip_time", "bitzua_history_start_dt", "trip_day_in_week", "cluster_nm"]
+
+PARTITION_COLUMNS = ["month", "metro_area"]
+
+DELAY_BINS = [-float('inf'), -5, -2, 2, 5, float('inf')]
+DELAY_LABELS = ['Early (>5min)', 'Slightly Early (2-5min)',
+                'On Time (±2min)', 'Slightly Late (2-5min)', 'Late (>5min)']
+
+# Rows per parallel task
+CHUNK_ROWS = 1_000_000
+
+# Rows per written row group: about a hundred routes of a month's trips
+ROW_GROUP_ROWS = 64 * 1024
+
+STAGES = ["read", "derive", "write"]
+
+HOUR_LABELS = [f"{hour:02d}:00" for hour in range(24)]
+
+# trip_day_in_week: 1 = Sunday ... 7 = Saturday
+DAY_NAMES = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
+
+
+# Vectorized derivation of every column the dashboards expect
+def derive_performance_columns(df):
+    df = df.copy()
+
+    trip_date = pd.to_datetime(df['trip_dt'], format='%Y-%m-%d')
+    df['planned_time'] = trip_date + pd.to_timedelta(df['trip_time'])
+    df['actual_time'] = pd.to_datetime(df['bitzua_history_start_dt'], format='mixed')
+
+    # Calculate delays considering potential date crossover
+    delay = (df['actual_time'] - df['planned_time']).dt.total_seconds().to_numpy() / 60
+    delay = np.where(delay > 720, delay - 1440, delay)
+    delay = np.where(delay < -720, delay + 1440, delay)
+    df['delay_minutes'] = delay.astype('float32')
+
+    df['delay_category'] = pd.cut(df['delay_minutes'], bins=DELAY_BINS, labels=DELAY_LABELS)
+
+    # Time-related features, built from integer codes rather than strftime.
+    # Rows without a planned time or with an invalid weekday get code -1
+    # (a missing category), as the strftime / map version gave NaN.
+    hour = df['planned_time'].dt.hour.fillna(-1).to_numpy(dtype='int64')
+    minute = df['planned_time'].dt.minute.fillna(0).to_numpy(dtype='int64')
+    df['hour'] = pd.Categorical.from_codes(hour, categories=HOUR_LABELS)
+    df['minute_of_day'] = np.where(hour >= 0, hour * 60 + minute, -1).astype('int16')
+    df['date'] = df['planned_time'].dt.normalize()
+    df['day_name'] = pd.Categorical.from_codes(day_index(df['trip_day_in_week']), categories=DAY_NAMES)
+
+    df['metro_area'] = map_metro_area(df['cluster_nm'])
+    # Month partition from the trip date, so trips without a planned time
+    # still land in their month; only rows without a trip date have none
+    df['month'] = trip_date.dt.strftime('%Y-%m').astype("category")
+    return df
+
+
+def read_raw(file_path):
+    if file_path.endswith(".csv"):
+        return pd.read_csv(file_path, dtype={"trip_dt": str, "trip_time": str, "bitzua_history_start_dt": str})
+    return pd.read_parquet(file_path)
+
+
+# Rows are written sorted by line id, in row groups of at most
+# ROW_GROUP_ROWS rows, so the line id statistics of each row group cover a
+# narrow range of routes and readers skip every row group but those holding
+# the requested route. Rows without a month (no trip date) belong to no
+# month partition and are not written.
+def write_partitioned(df, output_dir, basename_template=None, row_group_rows=ROW_GROUP_ROWS):
+    df = sort_by_route(df[df["month"].notna()])
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    options = {"basename_template": basename_template} if basename_template else {}
+    pq.write_to_dataset(table, output_dir, partition_cols=PARTITION_COLUMNS,
+                        row_group_size=row_group_rows, **options)
+
+
+# Row ranges (start, stop) of `chunk_rows` rows each, whatever the row
+# groups of the file (a single huge row group still makes even chunks)
+def parquet_chunks(file_path, chunk_rows=CHUNK_ROWS):
+    num_rows = pq.ParquetFile(file_path).metadata.num_rows
+    return [(start, min(start + chunk_rows, num_rows)) for start in range(0, num_rows, chunk_rows)]
+
+
+# Rows start..stop of a parquet file, reading only the row groups that overlap them
+def read_row_range(file_path, start, stop):
+    parquet_file = pq.ParquetFile(file_path)
+    metadata = parquet_file.metadata
+    row_groups, first_row, offset = [], 0, 0
+    for i in range(metadata.num_row_groups):
+        rows = metadata.row_group(i).num_rows
+        if offset < stop and offset + rows > start:
+            if not row_groups:
+                first_row = offset
+            row_groups.append(i)
+        offset += rows
+    return parquet_file.read_row_groups(row_groups).slice(start - first_row, stop - start).to_pandas()
+
+
+# One parallel task: read (parquet row range) or take (CSV rows) a chunk,
+# derive its columns and write it. Returns the row count and stage timings.
+def process_chunk(chunk_id, output_dir, file_path=None, rows=None, raw=None):
+    timings = {"chunk": chunk_id, "read": 0.0}
+    start = time.perf_counter()
+    if raw is None:
+        raw = read_row_range(file_path, *rows)
+        timings["read"] = time.perf_counter() - start
+    timings["rows"] = len(raw)
+
+    start = time.perf_counter()
+    processed = derive_performance_columns(raw)
+    timings["derive"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    write_partitioned(processed, output_dir, basename_template=f"part-{chunk_id:05d}-{{i}}.parquet")
+    timings["write"] = time.perf_counter() - start
+    return timings
+
+
+# Fan the chunks of the input out to `workers` processes. At most two tasks
+# per worker are in flight, so CSV chunks read ahead stay bounded.
+def preprocess_parallel(input_path, output_dir, workers, chunk_rows=CHUNK_ROWS):
+    results = []
+    pending = []
+    read_seconds = 0.0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        if input_path.endswith(".csv"):
+            reader = pd.read_csv(input_path, chunksize=chunk_rows,
+                                 dtype={"trip_dt": str, "trip_time": str, "bitzua_history_start_dt": str})
+            tasks = enumerate(reader)
+        else:
+            tasks = enumerate(parquet_chunks(input_path, chunk_rows))
+        while True:
+            start = time.perf_counter()
+            task = next(tasks, None)
+            read_seconds += time.perf_counter() - start
+            if task is None:
+                break
+            chunk_id, chunk = task
+            if isinstance(chunk, pd.DataFrame):
+                pending.append(pool.submit(process_chunk, chunk_id, output_dir, raw=chunk))
+            else:
+                pending.append(pool.submit(process_chunk, chunk_id, output_dir, input_path, chunk))
+            while len(pending) >= 2 * workers:
+                results.append(pending.pop(0).result())
+        results.extend(future.result() for future in pending)
+
+    results.sort(key=lambda result: result["chunk"])
+    # CSV chunks are parsed by this process, not by the workers
+    if results and input_path.endswith(".csv"):
+        results[0]["read"] += read_seconds
+    return results
+
+
+# Rows per second of every stage (summed over workers) and of the whole run
+def report_throughput(results, elapsed, workers):
+    rows = sum(result["rows"] for result in results)
+    for stage in STAGES:
+        seconds = sum(result[stage] for result in results)
+        rate = rows / seconds if seconds else float("inf")
+        print(f"  {stage:8} {seconds:8.1f}s  {rate:12,.0f} rows/s")
+    print(f"{rows:,} rows in {elapsed:.1f}s with {workers} worker(s): {rows / elapsed:,.0f} rows/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Materialize derived performance columns into a partitioned parquet dataset.")
+    parser.add_argument("input", help="raw bitzua_bus_trip export (.csv or .parquet)")
+    parser.add_argument("output", help="output dataset directory")
+    parser.add_argument("--overwrite", action="store_true", help="replace an existing output directory")
+    parser.add_argument("--workers", type=int, default=1, help="processes deriving and writing chunks in parallel")
+    args = parser.parse_args()
+
+    if os.path.exists(args.output):
+        if not args.overwrite:
+            parser.error(f"{args.output} already exists (use --overwrite)")
+        shutil.rmtree(args.output)
+
+    started = time.perf_counter()
+    if args.workers > 1:
+        results = preprocess_parallel(args.input, args.output, args.workers)
+    else:
+        timings = {}
+        start = time.perf_counter()
+        raw = read_raw(args.input)
+        timings["read"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        processed = derive_performance_columns(raw)
+        timings["derive"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        write_partitioned(processed, args.output)
+        timings["write"] = time.perf_counter() - start
+        results = [dict(timings, rows=len(raw))]
+
+    print(f"wrote {args.output}")
+    report_throughput(results, time.perf_counter() - started, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Pre-render the dashboard views into data/artifacts/views.
+
+Runs the app headlessly (Streamlit's AppTest, no server) and walks every
+page through the widget combinations below. Each figure and KPI set the
+pages build goes through the figure cache, which while pre-rendering also
+writes it to disk; the running app then serves those files and only
+computes views it has not seen. Artifacts are keyed by dataset fingerprint,
+so they are ignored (not served stale) once the data changes.
+
+    python -m pipeline.prerender [--clean]
+"""
+import argparse
+import itertools
+import os
+import shutil
+import time
+
+from pipeline import demand_cube, figure_cache, od_matrix
+
+
+PAGE_WIDGET = "Select an analysis:"
+
+# Every option of a radio or selectbox (resolved when the page is shown).
+# AppTest lists options as displayed, so widgets with a format_func need
+# their values spelled out or parsed back.
+ALL = "*"
+
+
+def route_options(widget):
+    return [option.removeprefix("Route ") for option in widget.options]
+
+
+# Per page, a list of widget combinations: label -> values (a list, ALL or a
+# function of the widget), expanded as a product and set in this order (a
+# widget may only appear after the previous one is set)
+VIEWS = {
+    "🏠 Home": [{}],
+    "Demand vs. Supply": [{
+        "Analysis type:": ALL,
+        "Group by:": demand_cube.DIMENSIONS,
+        "Sort by:": ALL,
+    }],
+    "Variation Over Time": [
+        {"Select a day:": ["All Days"]},
+        {"Select a day:": ["WorkDay", "Friday", "Saturday"], "Show trip count": [False, True]},
+    ],
+    "Under-performing Routes": [
+        # Drill-down of every route in the default worst-routes list
+        {" ": route_options},
+        {"Select Metropolitan Area:": ALL, "Significant delay threshold (minutes):": list(range(1, 16))},
+        {"Routes to rank:": list(range(5, 31, 5))},
+    ],
+    "Origin-Destination": [{
+        "Measure:": od_matrix.MEASURES,
+        "Include routes within a city": [False, True],
+        "Corridors:": list(range(5, 31, 5)),
+    }],
+}
+
+
+def find_widget(app, label):
+    for kind in ("radio", "selectbox", "checkbox", "slider"):
+        for widget in getattr(app, kind):
+            if widget.label == label:
+                return widget
+    raise KeyError(f"No widget labelled {label!r}")
+
+
+def _check(app, context):
+    if len(app.exception):
+        raise RuntimeError(f"{context}: {app.exception[0].value}")
+
+
+# Visit every combination of VIEWS; returns the number of views rendered
+def prerender(script="main.py", timeout=600):
+    from streamlit.testing.v1 import AppTest
+
+    os.environ[figure_cache.PRERENDER_ENV] = "1"
+    app = AppTest.from_file(os.path.abspath(script), default_timeout=timeout)
+    app.run()
+    rendered = 0
+    for page, combinations in VIEWS.items():
+        for combination in combinations:
+            find_widget(app, PAGE_WIDGET).set_value(page).run()
+            _check(app, page)
+            values = {}
+            for label, choices in combination.items():
+                if choices == ALL:
+                    choices = list(find_widget(app, label).options)
+                elif callable(choices):
+                    choices = choices(find_widget(app, label))
+                values[label] = choices
+            for combo in itertools.product(*values.values()):
+                for label, value in zip(values, combo):
+                    find_widget(app, label).set_value(value).run()
+                _check(app, f"{page} {dict(zip(values, combo))}")
+                rendered += 1
+    return rendered
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-render the dashboard views to static artifacts.")
+    parser.add_argument("--clean", action="store_true", help="remove previously rendered views first")
+    args = parser.parse_args()
+
+    if args.clean and os.path.isdir(figure_cache.VIEWS_DIR):
+        shutil.rmtree(figure_cache.VIEWS_DIR)
+
+    start = time.perf_counter()
+    rendered = prerender()
+    files = len(os.listdir(figure_cache.VIEWS_DIR)) if os.path.isdir(figure_cache.VIEWS_DIR) else 0
+    print(f"rendered {rendered} views ({files} artifacts in {figure_cache.VIEWS_DIR}) "
+          f"in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+import numpy as np
+import pandas as pd
+
+
+# Mergeable delay quantile sketches.
+#
+# A sketch is a sparse histogram of delay_minutes: one row per cell x bin
+# with a trip count. Three sketches are kept (SKETCHES): per route, where
+# operator, cluster and metro area are attributes of the route, so any
+# selection of routes, clusters or metro areas is answered by summing the
+# counts of the matching cells; per hour; and per day of week. Merging two
+# sketches is a plain sum per cell and bin, so sketches of batches, months
+# or filters combine exactly.
+#
+# Size: a sketch has one row per occupied bin of each cell, whatever the
+# number of trips. Most delays of a route fall in a few dozen bins, so a
+# year of about 8,000 routes makes a route sketch of a few hundred thousand
+# rows at most. Hours and days of week are kept apart rather than as route
+# x hour cells, which would multiply that by the hours of service of every
+# route for no view that needs it.
+#
+# Error bound: a quantile is reported inside the bin holding the exact order
+# statistic (numpy's method="lower"), so it is off by less than that bin's
+# width: 0.5 minutes for delays within +-10 minutes, 1 minute within +-30,
+# 5 minutes within +-120, 15 minutes within +-240 and 60 minutes within a
+# day. Two open overflow bins count the trips beyond a day early or late
+# (data errors rather than delays); a quantile that falls in one of them is
+# reported as +-1440, the edge of the bin.
+
+SKETCHES = {
+    "route_sketch": ["OperatorLineId", "operator_nm", "cluster_nm", "metro_area"],
+    "hour_sketch": ["hour"],
+    "day_sketch": ["day_name"],
+}
+
+# Every column the sketches group by
+SKETCH_COLUMNS = [key for keys in SKETCHES.values() for key in keys]
+
+SKETCH_EDGES = np.concatenate([
+    [-np.inf],
+    np.arange(-1440, -240, 60),
+    np.arange(-240, -120, 15),
+    np.arange(-120, -30, 5),
+    np.arange(-30, -10, 1),
+    np.arange(-10, 10, 0.5),
+    np.arange(10, 30, 1),
+    np.arange(30, 121, 5),
+    np.arange(135, 241, 15),
+    np.arange(300, 1441, 60),
+    [np.inf],
+]).astype("float64")
+
+QUANTILES = {"median": 0.5, "p90": 0.9, "p95": 0.95}
+
+# Quartiles of a box plot
+BOX_QUANTILES = {"q1": 0.25, "median": 0.5, "q3": 0.75}
+
+
+def bin_of(values):
+    bins = np.searchsorted(SKETCH_EDGES, values, side="right") - 1
+    return np.clip(bins, 0, len(SKETCH_EDGES) - 2).astype("int16")
+
+
+# A value standing for each bin: its middle, or the finite edge of an
+# overflow bin
+def bin_points(bins):
+    lower, upper = SKETCH_EDGES[bins], SKETCH_EDGES[bins + 1]
+    with np.errstate(invalid="ignore"):
+        middle = (lower + upper) / 2
+    return np.where(np.isneginf(lower), upper, np.where(np.isposinf(upper), lower, middle))
+
+
+# Sketch of the trips in `frame` (keys + delay_minutes; missing delays are skipped)
+def build_sketch(frame, keys):
+    frame = frame[frame["delay_minutes"].notna()]
+    work = frame[keys].assign(bin=bin_of(frame["delay_minutes"].to_numpy(dtype="float64")), count=1)
+    return work.groupby(keys + ["bin"], observed=True)["count"].sum().reset_index()
+
+
+# Every sketch of SKETCHES from one frame of trips
+def build_sketches(frame):
+    return {name: build_sketch(frame, keys) for name, keys in SKETCHES.items()}
+
+
+def merge_sketches(left, right, keys):
+    combined = pd.concat([left, right], ignore_index=True)
+    return combined.groupby(keys + ["bin"], observed=True)["count"].sum().reset_index()
+
+
+# Quantiles per group of `by` (an empty list for one overall row)
+def sketch_quantiles(sketch, by, quantiles=QUANTILES):
+    counts = sketch.groupby(list(by) + ["bin"], observed=True)["count"].sum()
+    counts = counts[counts > 0].reset_index()
+    if by:
+        grouped = counts.groupby(list(by), observed=True, sort=False)["count"]
+        total, cumulative = grouped.transform("sum"), grouped.cumsum()
+    else:
+        total, cumulative = counts["count"].sum(), counts["count"].cumsum()
+    before = cumulative - counts["count"]
+
+    bins = counts["bin"].to_numpy()
+    lower = SKETCH_EDGES[bins]
+    width = SKETCH_EDGES[bins + 1] - lower
+    finite = np.isfinite(width)
+    result = counts[list(by)].drop_duplicates().reset_index(drop=True) if by else pd.DataFrame(index=[0])
+    for name, q in quantiles.items():
+        # 0-based rank of the order statistic, and the one bin that holds it
+        rank = np.floor(q * (total - 1))
+        holds = (before <= rank) & (rank < cumulative)
+        with np.errstate(invalid="ignore"):
+            estimate = lower + (rank - before + 0.5) / counts["count"] * width
+        estimate = np.where(finite, estimate, bin_points(bins))
+        result[name] = estimate[holds.to_numpy()]
+    result["trips"] = counts.groupby(list(by), observed=True, sort=False)["count"].sum().to_numpy() \
+        if by else counts["count"].sum()
+    return result
+
+
+# Box statistics per group of `by`, in the format of
+# chart_summaries.grouped_box_stats: quartiles as above, whiskers at the
+# Tukey fences (1.5 IQR) clipped to the occupied bins, and one outlier point
+# (see bin_points) per occupied bin beyond the fences. Means are taken from
+# `means` (per group, e.g. exact from the cube) or else from the bin points.
+def box_stats(sketch, by, means=None):
+    stats = sketch_quantiles(sketch, [by], BOX_QUANTILES)
+    counts = sketch.groupby([by, "bin"], observed=True)["count"].sum()
+    counts = counts[counts > 0].reset_index()
+    counts["lower"] = SKETCH_EDGES[counts["bin"].to_numpy()]
+    counts["upper"] = SKETCH_EDGES[counts["bin"].to_numpy() + 1]
+    counts["point"] = bin_points(counts["bin"].to_numpy())
+
+    rows = []
+    for _, row in stats.iterrows():
+        cells = counts[counts[by] == row[by]]
+        iqr = row["q3"] - row["q1"]
+        low, high = row["q1"] - 1.5 * iqr, row["q3"] + 1.5 * iqr
+        inside = cells[(cells["upper"] > low) & (cells["lower"] <= high)]
+        beyond = cells[(cells["upper"] <= low) | (cells["lower"] > high)]
+        rows.append({
+            by: row[by], "q1": row["q1"], "median": row["median"], "q3": row["q3"],
+            "lowerfence": min(row["q1"], max(low, inside["lower"].min())),
+            "upperfence": max(row["q3"], min(high, inside["upper"].max())),
+            "mean": means[row[by]] if means is not None else np.average(cells["point"], weights=cells["count"]),
+            "count": row["trips"],
+            "outliers": beyond["point"].to_numpy(),
+        })
+    return pd.DataFrame(rows)
+
+
+# Quantiles for the views of the Under-performing Routes page
+def quantile_rollups(sketches):
+    route_sketch = sketches["route_sketch"]
+    return {
+        "route": sketch_quantiles(route_sketch, ["OperatorLineId"]),
+        "hour": sketch_quantiles(sketches["hour_sketch"], ["hour"]),
+        "cluster": sketch_quantiles(route_sketch, ["cluster_nm", "metro_area"]),
+        "metro": sketch_quantiles(route_sketch, ["metro_area"]).set_index("metro_area"),
+        "all": sketch_quantiles(route_sketch, []).iloc[0],
+    }
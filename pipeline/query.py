@@ -0,0 +1,210 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow.dataset as ds
+
+from pipeline import route_index
+
+
+# Aggregations the pages use, over either a loaded pandas frame or the
+# parquet files themselves.
+#
+# Filters are lists of (column, op, value) tuples combined with AND, with
+# op one of ==, !=, <, <=, >, >=, in.
+#
+#   PERFORMANCE_BACKEND=arrow streamlit run main.py
+#
+# switches the dashboard to the Arrow backend. It expects the preprocessed
+# dataset (python -m pipeline.preprocess), which has every derived column.
+
+STATS = ("count", "sum", "sumsq", "mean", "std", "min", "max")
+
+# Additive partial statistics computed by Arrow: name -> (source, function).
+# Every statistic in STATS is derived from these.
+_ARROW_PARTIALS = {
+    "count": ("value", "count"),
+    "sum": ("value", "sum"),
+    "sumsq": ("value_sq", "sum"),
+    "min": ("value", "min"),
+    "max": ("value", "max"),
+}
+
+
+def _mask(frame, filters):
+    mask = np.ones(len(frame), dtype=bool)
+    for column, op, value in filters or []:
+        values = frame[column]
+        if op == "==":
+            mask &= (values == value).to_numpy()
+        elif op == "!=":
+            mask &= (values != value).to_numpy()
+        elif op == "<":
+            mask &= (values < value).to_numpy()
+        elif op == "<=":
+            mask &= (values <= value).to_numpy()
+        elif op == ">":
+            mask &= (values > value).to_numpy()
+        elif op == ">=":
+            mask &= (values >= value).to_numpy()
+        elif op == "in":
+            mask &= values.isin(value).to_numpy()
+        else:
+            raise ValueError(f"Unsupported filter operator: {op}")
+    return mask
+
+
+def _expression(filters):
+    expression = None
+    for column, op, value in filters or []:
+        field = ds.field(column)
+        if op == "==":
+            condition = field == value
+        elif op == "!=":
+            condition = field != value
+        elif op == "<":
+            condition = field < value
+        elif op == "<=":
+            condition = field <= value
+        elif op == ">":
+            condition = field > value
+        elif op == ">=":
+            condition = field >= value
+        elif op == "in":
+            condition = field.isin(list(value))
+        else:
+            raise ValueError(f"Unsupported filter operator: {op}")
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+# Both backends return groups ordered by key value (categoricals by label),
+# so results are comparable row by row
+def sort_by_keys(result, by):
+    def sort_key(values):
+        return values.astype(str) if isinstance(values.dtype, pd.CategoricalDtype) else values
+    return result.sort_values(list(by), key=sort_key, kind="stable").reset_index(drop=True)
+
+
+class QueryBackend:
+    name = None
+    # Version of the data behind the backend, for use as a cache key
+    fingerprint = None
+
+    def scan(self, columns, filters=None):
+        raise NotImplementedError
+
+    # One row per group with the requested statistics of `column`
+    # (count ignores missing values, std is the sample std). With
+    # dropna=False rows with a missing key form groups of their own.
+    def group_stats(self, by, column, stats=("mean", "std", "count"), filters=None, dropna=True):
+        raise NotImplementedError
+
+    # Number of rows per group (missing values included)
+    def count_by(self, by, filters=None, dropna=True):
+        raise NotImplementedError
+
+    # Groups with the largest `stat`, among groups with at least `min_count` values
+    def top_n(self, by, column, n, stat="mean", min_count=0, filters=None):
+        stats = ("count", stat) if stat != "count" else ("count",)
+        result = self.group_stats(by, column, stats, filters)
+        result = result[result["count"] >= min_count]
+        return result.nlargest(n, stat).reset_index(drop=True)
+
+    def histogram(self, column, bins, value_range, filters=None):
+        values = self.scan([column], filters)[column].to_numpy(dtype="float64")
+        values = values[~np.isnan(values)]
+        return np.histogram(values, bins=bins, range=value_range)
+
+
+class PandasBackend(QueryBackend):
+    name = "pandas"
+
+    # With the frame sorted by line id, a route index turns an equality
+    # filter on OperatorLineId into a positional slice
+    def __init__(self, frame, fingerprint=None, routes=None):
+        self._frame = frame
+        self.fingerprint = fingerprint
+        self._routes = routes
+
+    def scan(self, columns, filters=None):
+        frame = self._frame
+        filters = list(filters or [])
+        if self._routes is not None and filters and filters[0][:2] == (route_index.ROUTE_COLUMN, "=="):
+            frame = route_index.route_rows(frame, self._routes, filters.pop(0)[2])
+        if not filters:
+            return frame[columns]
+        return frame.loc[_mask(frame, filters), columns]
+
+    def group_stats(self, by, column, stats=("mean", "std", "count"), filters=None, dropna=True):
+        frame = self.scan(list(by) + [column], filters)
+        values = frame[column].astype("float64")
+        work = frame[list(by)].assign(value=values, value_sq=values ** 2)
+        grouped = work.groupby(list(by), observed=True, sort=False, dropna=dropna)
+        result = pd.DataFrame(index=grouped.size().index)
+        for stat in stats:
+            if stat == "sumsq":
+                result[stat] = grouped["value_sq"].sum()
+            else:
+                result[stat] = grouped["value"].agg(stat)
+        return sort_by_keys(result.reset_index(), by)
+
+    def count_by(self, by, filters=None, dropna=True):
+        frame = self.scan(list(by), filters)
+        grouped = frame.groupby(list(by), observed=True, sort=False, dropna=dropna)
+        return sort_by_keys(grouped.size().reset_index(name="rows"), by)
+
+
+class ArrowBackend(QueryBackend):
+    name = "arrow"
+
+    # postprocess: optional function applied to every pandas result
+    # (e.g. mapping names onto the shared dimension codes)
+    def __init__(self, path, postprocess=None, fingerprint=None):
+        self._dataset = ds.dataset(path, format="parquet", partitioning="hive")
+        self._postprocess = postprocess
+        self.fingerprint = fingerprint
+
+    def _finish(self, frame):
+        return self._postprocess(frame) if self._postprocess else frame
+
+    def scan(self, columns, filters=None):
+        table = self._dataset.to_table(columns=list(columns), filter=_expression(filters))
+        return self._finish(table.to_pandas())
+
+    # Groups are aggregated by Arrow into additive partial statistics, which
+    # are summed again once the keys are mapped by postprocess: names that
+    # map to the same key end up in one group, as in the pandas backend.
+    def group_stats(self, by, column, stats=("mean", "std", "count"), filters=None, dropna=True):
+        value = ds.field(column).cast("float64")
+        projection = {key: ds.field(key) for key in by}
+        projection["value"] = value
+        projection["value_sq"] = value * value
+        table = self._dataset.to_table(columns=projection, filter=_expression(filters))
+
+        aggregations = [(source, function) for source, function in _ARROW_PARTIALS.values()]
+        partials = table.group_by(list(by)).aggregate(aggregations).to_pandas()
+        partials = partials.rename(columns={f"{source}_{function}": name
+                                            for name, (source, function) in _ARROW_PARTIALS.items()})
+        partials = self._finish(partials)
+
+        grouped = partials.groupby(list(by), observed=True, sort=False, dropna=dropna)
+        result = grouped[["count", "sum", "sumsq"]].sum()
+        result["min"] = grouped["min"].min()
+        result["max"] = grouped["max"].max()
+        n = result["count"]
+        result["mean"] = result["sum"] / n.where(n > 0)
+        variance = (result["sumsq"] - result["sum"] ** 2 / n) / (n - 1)
+        result["std"] = np.sqrt(variance.clip(lower=0)).where(n > 1)
+        return sort_by_keys(result[list(stats)].reset_index(), by)
+
+    def count_by(self, by, filters=None, dropna=True):
+        table = self._dataset.to_table(columns=list(by), filter=_expression(filters))
+        result = table.group_by(list(by)).aggregate([([], "count_all")]).to_pandas()
+        result = self._finish(result.rename(columns={"count_all": "rows"}))
+        grouped = result.groupby(list(by), observed=True, sort=False, dropna=dropna)["rows"].sum()
+        return sort_by_keys(grouped.reset_index(), by)
+
+
+def backend_kind():
+    return os.environ.get("PERFORMANCE_BACKEND", "pandas")
@@ -0,0 +1,89 @@
+import hashlib
+import os
+import threading
+
+import pyarrow.parquet as pq
+
+from pipeline import timing
+
+
+# Parquet footer summaries, keyed by (path, size, mtime) so a file's footer
+# is read once per version of the file
+_footer_cache = {}
+
+
+def _files(path):
+    if os.path.isdir(path):
+        return sorted(
+            os.path.join(root, name)
+            for root, _, names in os.walk(path)
+            for name in names
+            if not name.startswith(".")
+        )
+    return [path]
+
+
+def _footer_summary(path, stat_key):
+    if stat_key not in _footer_cache:
+        metadata = pq.ParquetFile(path).metadata
+        _footer_cache[stat_key] = f"{metadata.num_rows}:{metadata.num_row_groups}:{metadata.schema.to_arrow_schema()}"
+    return _footer_cache[stat_key]
+
+
+# Cheap dataset version id: file paths, sizes, mtimes and (for parquet) the
+# row counts / schema from the footers. Never reads the data itself.
+def fingerprint(path):
+    digest = hashlib.sha1()
+    for file_path in _files(path):
+        stat = os.stat(file_path)
+        stat_key = (file_path, stat.st_size, stat.st_mtime_ns)
+        digest.update(repr(stat_key).encode())
+        if file_path.endswith(".parquet"):
+            digest.update(_footer_summary(file_path, stat_key).encode())
+    return digest.hexdigest()[:16]
+
+
+# A loaded dataset and the fingerprint of the files it was loaded from.
+# `data` hands out shallow copies: callers can add columns or filter
+# without touching the shared frame (with copy-on-write enabled, writes to
+# existing columns are copied as well).
+class DatasetHandle:
+    def __init__(self, name, path, fingerprint, frame):
+        self.name = name
+        self.path = path
+        self.fingerprint = fingerprint
+        self._frame = frame
+
+    @property
+    def data(self):
+        return self._frame.copy(deep=False)
+
+
+# Loaded datasets, one per name, reloaded only when the fingerprint of
+# the underlying files changes
+class DatasetRegistry:
+    def __init__(self):
+        self._sources = {}
+        self._handles = {}
+        self._lock = threading.RLock()
+
+    def register(self, name, path, loader):
+        self._sources[name] = (path, loader)
+
+    def path(self, name):
+        return self._sources[name][0]
+
+    def fingerprint(self, name):
+        return fingerprint(self.path(name))
+
+    def get(self, name):
+        path, loader = self._sources[name]
+        current = fingerprint(path)
+        with self._lock:
+            handle = self._handles.get(name)
+            reload = handle is None or handle.fingerprint != current
+            timing.cache_lookup(f"datasets.{name}", hit=not reload)
+            if reload:
+                handle = DatasetHandle(name, path, current, loader(path))
+                self._handles[name] = handle
+            return handle
@@ -0,0 +1,22 @@
+from pipeline import timing
+
+
+# Data a page can ask for, loaded only when the page first asks.
+# Pages declare what they use in a module-level REQUIRES tuple; asking for
+# anything else is an error, which keeps the declarations honest.
+class PageResources:
+    def __init__(self, loaders, declared):
+        unknown = set(declared) - set(loaders)
+        if unknown:
+            raise KeyError(f"Unknown page resources: {sorted(unknown)}")
+        self._loaders = loaders
+        self._declared = tuple(declared)
+        self._loaded = {}
+
+    def __getitem__(self, name):
+        if name not in self._declared:
+            raise KeyError(f"Resource {name!r} is not declared in the page's REQUIRES")
+        if name not in self._loaded:
+            with timing.resource_span(f"resource.{name}"):
+                self._loaded[name] = self._loaders[name]()
+        return self._loaded[name]
@@ -0,0 +1,181 @@
+import functools
+import inspect
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+import numpy as np
+import pandas as pd
+
+from pipeline import timing
+
+
+# Memory budget shared by every cached function of the process (all pages,
+# all sessions); DASHBOARD_CACHE_MB overrides it
+DEFAULT_MAX_BYTES = 256 * 1024 ** 2
+MAX_MB_ENV = "DASHBOARD_CACHE_MB"
+
+
+def default_max_bytes():
+    mb = os.environ.get(MAX_MB_ENV)
+    return int(float(mb) * 1024 ** 2) if mb else DEFAULT_MAX_BYTES
+
+
+# Measured size of a cached value: pandas memory usage (including strings),
+# numpy buffers, and containers of those
+def sizeof(value):
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if isinstance(usage, pd.Series) else usage)
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sizeof(key) + sizeof(item) for key, item in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(sizeof(item) for item in value)
+    return sys.getsizeof(value)
+
+
+# Cached frames are shared: hand out shallow copies (cheap with copy-on-write)
+# so a caller adding a column does not change the cached value
+def _shallow_copy(value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy(deep=False)
+    if isinstance(value, tuple):
+        return tuple(_shallow_copy(item) for item in value)
+    return value
+
+
+class _Entry:
+    def __init__(self, function, value, size, expires):
+        self.function = function
+        self.value = value
+        self.size = size
+        self.expires = expires
+        self.created = time.time()
+        self.hits = 0
+
+
+# Results of cached functions under one memory budget. Entries are keyed by
+# function and arguments; the least recently used entries (of any function)
+# are evicted once their measured total exceeds max_bytes. Counters are kept
+# per function.
+class ResultCache:
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes if max_bytes is not None else default_max_bytes()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.counters = defaultdict(lambda: {"hits": 0, "misses": 0, "evictions": 0, "expired": 0})
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+        return entry
+
+    def get(self, key):
+        function = key[0]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires is not None and entry.expires < time.time():
+                self._remove(key)
+                self.counters[function]["expired"] += 1
+                entry = None
+            if entry is None:
+                self.counters[function]["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            entry.hits += 1
+            self.counters[function]["hits"] += 1
+            return entry
+
+    def put(self, key, value, ttl=None, max_entries=None):
+        function = key[0]
+        size = sizeof(value)
+        if size > self.max_bytes:
+            return
+        expires = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(function, value, size, expires)
+            self._bytes += size
+            # Per-function entry limit first, then the shared memory budget
+            if max_entries is not None:
+                keys = [other for other in self._entries if other[0] == function]
+                for other in keys[:max(0, len(keys) - max_entries)]:
+                    self._remove(other)
+                    self.counters[function]["evictions"] += 1
+            while self._bytes > self.max_bytes:
+                evicted_key = next(iter(self._entries))
+                self._remove(evicted_key)
+                self.counters[evicted_key[0]]["evictions"] += 1
+
+    def clear(self, function=None):
+        with self._lock:
+            for key in [key for key in self._entries if function is None or key[0] == function]:
+                self._remove(key)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+    # What currently holds memory: one row per function (entries, MB and
+    # counters), largest first
+    def report(self):
+        with self._lock:
+            rows = {function: {"entries": 0, "mb": 0.0, **counters} for function, counters in self.counters.items()}
+            for entry in self._entries.values():
+                rows[entry.function]["entries"] += 1
+                rows[entry.function]["mb"] += entry.size / 1024 ** 2
+        report = pd.DataFrame.from_dict(rows, orient="index",
+                                        columns=["entries", "mb", "hits", "misses", "evictions", "expired"])
+        return report.rename_axis("function").reset_index().sort_values("mb", ascending=False, ignore_index=True)
+
+    # The largest entries, for finding which arguments hold the memory
+    def largest(self, n=10):
+        with self._lock:
+            entries = sorted(self._entries.items(), key=lambda item: -item[1].size)[:n]
+        return pd.DataFrame([{
+            "function": entry.function,
+            "arguments": ", ".join(f"{name}={value!r}" for name, value in key[1:]),
+            "mb": entry.size / 1024 ** 2,
+            "hits": entry.hits,
+            "age_s": round(time.time() - entry.created),
+        } for key, entry in entries], columns=["function", "arguments", "mb", "hits", "age_s"])
+
+
+# The process-wide cache used by @cached
+RESULTS = ResultCache()
+
+
+# Decorator replacing @st.cache_data for results keyed by small arguments.
+# As with Streamlit, arguments whose name starts with "_" are not part of
+# the key (pass a fingerprint instead). ttl is in seconds; max_entries
+# bounds the entries of this function on top of the shared memory budget.
+def cached(ttl=None, max_entries=None, cache=None):
+    def decorate(function):
+        signature = inspect.signature(function)
+        # Functions of the same name in different pages get their own entries
+        name = f"{function.__module__}.{function.__qualname__}"
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            results = cache or RESULTS
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = (name,) + tuple((argument, value) for argument, value in bound.arguments.items()
+                                  if not argument.startswith("_"))
+            entry = results.get(key)
+            timing.cache_lookup(name, hit=entry is not None)
+            if entry is not None:
+                return _shallow_copy(entry.value)
+            value = function(*args, **kwargs)
+            results.put(key, value, ttl, max_entries)
+            return _shallow_copy(value)
+
+        wrapper.clear = lambda: (cache or RESULTS).clear(name)
+        return wrapper
+    return decorate
@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+
+from pipeline import time_buckets
+
+
+# The 21 '<DayType> - <range>' passenger columns, day-major
+def profile_columns():
+    return [f"{day} - {time_range}"
+            for day in time_buckets.DAY_TYPES
+            for time_range in time_buckets.labels("ridership")]
+
+
+# Passengers per day type and time range (the sums the Variation Over Time
+# page plots), from the 21 columns read as one float32 array. DayType and
+# TimeRange are categoricals built from their codes (TimeRange ordered by
+# time of day); the sums are taken in float64 and stored as float32.
+def build_time_profile(data):
+    values = data[profile_columns()].to_numpy(dtype="float32")
+    time_ranges = time_buckets.labels("ridership")
+    n_ranges = len(time_ranges)
+
+    day_codes = np.repeat(np.arange(len(time_buckets.DAY_TYPES), dtype="int8"), n_ranges)
+    range_codes = np.tile(np.arange(n_ranges, dtype="int8"), len(time_buckets.DAY_TYPES))
+
+    return pd.DataFrame({
+        "DayType": pd.Categorical.from_codes(day_codes, categories=time_buckets.DAY_TYPES),
+        "TimeRange": pd.Categorical.from_codes(range_codes, categories=time_ranges, ordered=True),
+        "Passengers": np.nansum(values, axis=0, dtype="float64").astype("float32"),
+    })
@@ -0,0 +1,219 @@
+"""
+Columnar store of ridership snapshots, one per data.gov.il export (a year
+or a quarter).
+
+    python -m pipeline.ridership_store data/2024_public_transport_ridership.csv --snapshot 2024
+    python -m pipeline.ridership_store ridership_2025_q1.csv --snapshot 2025-Q1
+    python -m pipeline.ridership_store ridership_2025_q1.csv --snapshot 2025-Q1 --replace
+
+Each export is parsed once and written with typed columns (names as
+dictionary-encoded strings) as the parquet partition snapshot=<name> of
+data/ridership. Its demand / supply totals by Metropolin, ClusterName and
+RouteID, and the base of the demand / supply cube (pipeline/demand_cube.py),
+are stored next to it in _aggregates/<name>, and _manifest.json lists the
+snapshots. The pages compare snapshots from these aggregates
+only, without reading route rows. Names are aggregated after the city /
+region corrections (pipeline/dimensions.py), so groups match the pages.
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from pipeline import dimensions, ingest, registry
+
+
+STORE_PATH = os.path.join("data", "ridership")
+AGGREGATES_DIR = "_aggregates"
+
+# Name of the original single export when there is no store
+DEFAULT_SNAPSHOT = "2024"
+
+# Snapshot names sort chronologically: 2024, 2024-Q3, 2025-Q1, ...
+SNAPSHOT_PATTERN = re.compile(r"^\d{4}(-Q[1-4])?$")
+
+STRING_COLUMNS = ["AgencyName", "ClusterName", "Metropolin", "OriginCityName", "DestinationCityName",
+                  "RouteType", "ServiceType", "RouteParticular", "MaxRidership"]
+
+# Demand (passengers) and supply (rides) measures, summed per group
+MEASURES = ["DailyPassengers", "WeeklyPassengers", "DailyRides", "WeekyRides"]
+
+LEVELS = {
+    "metropolin": "Metropolin",
+    "cluster": "ClusterName",
+    "route": "RouteID",
+}
+
+# Grain of the demand / supply cube: a route within its operator, region,
+# route type, service type and origin city (a few thousand rows)
+CUBE_KEYS = ["Metropolin", "ClusterName", "AgencyName", "RouteType", "ServiceType", "OriginCityName", "RouteID"]
+
+
+def snapshot_dir(store, snapshot):
+    return os.path.join(store, f"snapshot={snapshot}")
+
+
+def aggregates_dir(store, snapshot):
+    return os.path.join(store, AGGREGATES_DIR, snapshot)
+
+
+def load_manifest(store):
+    path = os.path.join(store, ingest.MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {"snapshots": {}}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+# Snapshots listed in the manifest, oldest first
+def snapshots(store=STORE_PATH):
+    return sorted(load_manifest(store)["snapshots"])
+
+
+# Route rows of a ridership export (.csv) or of a stored snapshot (parquet),
+# optionally only some columns
+def read_ridership(path, columns=None):
+    if path.endswith(".csv"):
+        return pd.read_csv(path, usecols=columns,
+                           dtype={col: "category" for col in STRING_COLUMNS if columns is None or col in columns})
+    return pd.read_parquet(path, columns=columns)
+
+
+# Source of the current ridership frame: the latest stored snapshot, or the
+# original CSV export when there is no store
+def latest_path(store, default_path):
+    names = snapshots(store)
+    return snapshot_dir(store, names[-1]) if names else default_path
+
+
+# Totals of every measure per group, plus routes and rows, for each level,
+# and the measures and rows per cell of the cube grain
+def aggregate(data):
+    data = data.assign(**{
+        column: dimensions.canonical_names(data[column].astype(object)).to_numpy()
+        for column in (LEVELS["metropolin"], LEVELS["cluster"])
+    })
+    aggregates = {}
+    for level, column in LEVELS.items():
+        grouped = data.groupby(column, observed=True)
+        result = grouped[MEASURES].sum()
+        result["routes"] = grouped["RouteID"].nunique()
+        result["rows"] = grouped.size()
+        aggregates[level] = result.reset_index()
+    grouped = data.groupby(CUBE_KEYS, observed=True)
+    cube = grouped[MEASURES].sum()
+    cube["rows"] = grouped.size()
+    aggregates["cube"] = cube.reset_index()
+    return aggregates
+
+
+def save_aggregates(aggregates, directory):
+    tmp_dir = f"{directory}.{os.getpid()}.tmp"
+    os.makedirs(tmp_dir, exist_ok=True)
+    for level, frame in aggregates.items():
+        frame.to_parquet(os.path.join(tmp_dir, f"{level}.parquet"), index=False)
+    if os.path.isdir(directory):
+        shutil.rmtree(directory)
+    os.replace(tmp_dir, directory)
+
+
+def load_aggregates(store, snapshot):
+    directory = aggregates_dir(store, snapshot)
+    aggregates = {level: pd.read_parquet(os.path.join(directory, f"{level}.parquet")) for level in LEVELS}
+    cube_path = os.path.join(directory, "cube.parquet")
+    if os.path.exists(cube_path):
+        aggregates["cube"] = pd.read_parquet(cube_path)
+    else:
+        # Stored before the cube was added: derived from the snapshot's rows
+        aggregates["cube"] = aggregate(read_ridership(snapshot_dir(store, snapshot), CUBE_KEYS + MEASURES))["cube"]
+    return aggregates
+
+
+# Aggregates of every snapshot, oldest first. Without a store, the original
+# CSV export is aggregated as the only snapshot (a projected read).
+def all_aggregates(store=STORE_PATH, default_path=None):
+    names = snapshots(store)
+    if names:
+        return {snapshot: load_aggregates(store, snapshot) for snapshot in names}
+    columns = CUBE_KEYS + MEASURES
+    return {DEFAULT_SNAPSHOT: aggregate(read_ridership(default_path, columns))}
+
+
+# Headline numbers of the Home page, from a snapshot's route aggregates
+def headline(aggregates):
+    routes = aggregates["route"]
+    return {
+        "total_trips": float(routes["WeekyRides"].sum()),
+        "total_day_trips": float(routes["DailyRides"].sum()),
+        "daily_passengers": int(routes["DailyPassengers"].sum()),
+        "total_routes": int(routes["RouteID"].nunique()),
+    }
+
+
+# Side by side totals per group of two snapshots (e.g. one level of their
+# aggregates), with the change of each measure (absolute and %). Groups
+# present in only one snapshot count as 0 in the other.
+def compare(current, previous, column):
+    values = MEASURES + ["routes"]
+    merged = current[[column] + values].merge(
+        previous[[column] + values], on=column, how="outer", suffixes=("", "_previous")).fillna(0)
+    for measure in values:
+        merged[f"{measure}_change"] = merged[measure] - merged[f"{measure}_previous"]
+        merged[f"{measure}_change_pct"] = (merged[f"{measure}_change"] / merged[f"{measure}_previous"]
+                                           .where(merged[f"{measure}_previous"] != 0) * 100).round(2)
+    return merged
+
+
+def add_snapshot(input_path, snapshot, store=STORE_PATH, replace=False):
+    if not SNAPSHOT_PATTERN.match(snapshot):
+        raise ValueError(f"Snapshot names are a year or a quarter (2024, 2025-Q1), not {snapshot!r}")
+    manifest = load_manifest(store)
+    if snapshot in manifest["snapshots"] and not replace:
+        raise ValueError(f"{snapshot} already stored (use --replace)")
+
+    data = read_ridership(input_path)
+    directory = snapshot_dir(store, snapshot)
+    if os.path.isdir(directory):
+        shutil.rmtree(directory)
+    os.makedirs(directory)
+    data.to_parquet(os.path.join(directory, "part-0.parquet"), index=False)
+
+    os.makedirs(os.path.join(store, AGGREGATES_DIR), exist_ok=True)
+    save_aggregates(aggregate(data), aggregates_dir(store, snapshot))
+
+    # Written last (atomically, as in pipeline/ingest.py): a snapshot exists once listed
+    manifest["snapshots"][snapshot] = {
+        "rows": len(data),
+        "routes": int(data["RouteID"].nunique()),
+        "source": input_path,
+        "source_fingerprint": registry.fingerprint(input_path),
+        "ingested_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+    ingest.save_manifest(store, manifest)
+    return manifest["snapshots"][snapshot]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Add a ridership export to the snapshot store.")
+    parser.add_argument("input", help="ridership export (.csv, as published on data.gov.il)")
+    parser.add_argument("--snapshot", required=True, help="snapshot name: a year (2024) or quarter (2025-Q1)")
+    parser.add_argument("--store", default=STORE_PATH, help="store directory")
+    parser.add_argument("--replace", action="store_true", help="replace a snapshot that is already stored")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    try:
+        entry = add_snapshot(args.input, args.snapshot, args.store, args.replace)
+    except ValueError as error:
+        parser.error(str(error))
+    print(f"stored {args.snapshot}: {entry['rows']:,} rows, {entry['routes']:,} routes "
+          f"in {args.store} ({time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import numpy as np
+
+from pipeline import quantiles
+
+
+# Grain of the delay cube: route x hour x date (operator, cluster, metro area
+# and day name are attributes of route / date and do not add rows)
+CUBE_KEYS = ["OperatorLineId", "operator_nm", "cluster_nm", "metro_area", "hour", "date", "day_name"]
+
+# One trip-count column per delay category
+CATEGORY_COUNT_COLUMNS = {
+    'Early (>5min)': "n_early",
+    'Slightly Early (2-5min)': "n_slightly_early",
+    'On Time (±2min)': "n_on_time",
+    'Slightly Late (2-5min)': "n_slightly_late",
+    'Late (>5min)': "n_late",
+}
+
+# Range of the "Significant delay threshold" slider on the regional tab
+LATE_THRESHOLDS = range(1, 16)
+
+# Additive measures: any rollup of the cube is a plain sum of these
+MEASURES = ["rows", "trips", "delay_sum", "delay_sumsq"] + list(CATEGORY_COUNT_COLUMNS.values())
+
+# Rollups the Under-performing Routes page reads, by grouping keys
+ROLLUP_KEYS = {
+    "route": ["OperatorLineId", "operator_nm", "cluster_nm", "metro_area"],
+    "hour": ["hour"],
+    "date": ["date"],
+    "cluster": ["cluster_nm", "metro_area"],
+}
+
+
+# Aggregate trip rows into the cube through a query backend (pipeline/query.py),
+# so it can be built from a loaded frame or straight from the parquet files.
+# Sums are kept in float64 so mean and standard deviation can be derived
+# exactly from any rollup. Trips with a missing key (e.g. no planned time)
+# keep their own cells, so rollups over the other keys still count them.
+def build_delay_cube(query):
+    stats = query.group_stats(CUBE_KEYS, "delay_minutes", ("count", "sum", "sumsq"), dropna=False)
+    rows = query.count_by(CUBE_KEYS, dropna=False)
+
+    # Both results hold the same groups in the same (key) order
+    cube = stats[CUBE_KEYS].copy()
+    cube["rows"] = rows["rows"].to_numpy(dtype="int32")
+    cube["trips"] = stats["count"].to_numpy(dtype="int32")
+    cube["delay_sum"] = stats["sum"].fillna(0).to_numpy()
+    cube["delay_sumsq"] = stats["sumsq"].fillna(0).to_numpy()
+
+    categories = query.count_by(CUBE_KEYS + ["delay_category"], dropna=False)
+    categories["delay_category"] = categories["delay_category"].astype(str).map(CATEGORY_COUNT_COLUMNS)
+    counts = categories.dropna(subset=["delay_category"]) \
+        .groupby(CUBE_KEYS + ["delay_category"], observed=True, dropna=False)["rows"].sum().unstack(fill_value=0)
+    counts = counts.reindex(columns=list(CATEGORY_COUNT_COLUMNS.values()), fill_value=0).astype("int32")
+    cube = cube.merge(counts.reset_index(), on=CUBE_KEYS, how="left")
+    cube[list(CATEGORY_COUNT_COLUMNS.values())] = cube[list(CATEGORY_COUNT_COLUMNS.values())].fillna(0).astype("int32")
+    return cube
+
+
+# Sum the cube over everything except `by` and derive the statistics
+# the pages show (mean, sample std, on-time ratio)
+def rollup(cube, by):
+    grouped = cube.groupby(by, observed=True)[MEASURES].sum().reset_index()
+    return add_statistics(grouped)
+
+
+def add_statistics(grouped):
+    n = grouped["trips"]
+    grouped["avg_delay"] = grouped["delay_sum"] / n
+    variance = (grouped["delay_sumsq"] - grouped["delay_sum"] ** 2 / n) / (n - 1)
+    grouped["std_delay"] = np.sqrt(variance.clip(lower=0)).where(n > 1)
+    grouped["on_time_ratio"] = grouped["n_on_time"] / grouped["rows"]
+    return grouped
+
+
+# Trip counts per delay category, ordered like value_counts()
+def category_distribution(cube):
+    counts = cube[list(CATEGORY_COUNT_COLUMNS.values())].sum()
+    counts.index = list(CATEGORY_COUNT_COLUMNS.keys())
+    return counts.sort_values(ascending=False)
+
+
+# Per metro area KPIs for the regional tab, including the share of trips
+# above every value of the delay threshold slider. One pass over the trips
+# counts them per metro area and delay value; every KPI is then a sum over
+# those counts.
+def build_metro_kpis(query):
+    by = ["metro_area"]
+    counts = query.count_by(by + ["delay_minutes"], dropna=False).dropna(subset=by)
+    delay = counts["delay_minutes"].astype("float64")
+    rows = counts["rows"]
+    measures = counts[by].assign(
+        rows=rows,
+        trips=rows.where(delay.notna(), 0),
+        delay_sum=(delay * rows).fillna(0),
+        within_2=rows.where(delay.between(-2, 2), 0),
+        **{f"late_over_{threshold}": rows.where(delay > threshold, 0) for threshold in LATE_THRESHOLDS}
+    )
+    return measures.groupby(by, observed=True).sum()
+
+
+# KPI values for one metro area (or "All")
+def metro_kpis(kpis, metro_area, delay_threshold):
+    selected = kpis.sum() if metro_area == "All" else kpis[kpis.index == metro_area].sum()
+    return {
+        "avg_delay": selected["delay_sum"] / selected["trips"],
+        "late_pct": selected[f"late_over_{delay_threshold}"] / selected["rows"] * 100,
+        "on_time_pct": selected["within_2"] / selected["rows"] * 100,
+    }
+
+
+# Delay box statistics per day of week: quartiles and whiskers from the
+# day sketch, exact means from the cube
+def day_boxes(cube, day_sketch):
+    means = rollup(cube, ["day_name"]).set_index("day_name")["avg_delay"]
+    return quantiles.box_stats(day_sketch, "day_name", means)
+
+
+# Everything the Under-performing Routes page aggregates, built once per
+# dataset. Each table has at most a few thousand rows (the cube grows with
+# the number of days). One scan of the trips feeds every quantile sketch.
+def build_delay_rollups(query):
+    cube = build_delay_cube(query)
+    result = {"cube": cube}
+    for name, keys in ROLLUP_KEYS.items():
+        result[name] = rollup(cube, keys)
+    result["category"] = category_distribution(cube)
+    result["metro_kpis"] = build_metro_kpis(query)
+    result.update(quantiles.build_sketches(query.scan(quantiles.SKETCH_COLUMNS + ["delay_minutes"])))
+    result["quantiles"] = quantiles.quantile_rollups(result)
+    result["day_boxes"] = day_boxes(cube, result["day_sketch"])
+    return result
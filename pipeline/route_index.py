@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+
+
+ROUTE_COLUMN = "OperatorLineId"
+
+
+# Performance rows ordered by line id, so each route is one contiguous block
+def sort_by_route(df):
+    if df[ROUTE_COLUMN].is_monotonic_increasing:
+        return df
+    return df.sort_values(ROUTE_COLUMN, kind="stable").reset_index(drop=True)
+
+
+# Offset index over a frame sorted by line id: line id -> [start, stop) rows
+def build_route_index(df):
+    line_ids = df[ROUTE_COLUMN].to_numpy()
+    routes, starts = np.unique(line_ids, return_index=True)
+    stops = np.append(starts[1:], len(line_ids))
+    return pd.DataFrame({"start": starts, "stop": stops}, index=pd.Index(routes, name=ROUTE_COLUMN))
+
+
+# All rows of one route as a positional slice (a view, no copy)
+def route_rows(df, index, route_id):
+    position = index.index.searchsorted(route_id)
+    if position == len(index) or index.index[position] != route_id:
+        return df.iloc[0:0]
+    start, stop = index.iat[position, 0], index.iat[position, 1]
+    return df.iloc[start:stop]
@@ -0,0 +1,129 @@
+import os
+
+import pandas as pd
+
+from pipeline import dimensions, registry, rollups
+
+
+# Optional corrections of the route key mapping: RouteID,OperatorLineId and
+# optionally ClusterName (the ridership region of the route) and cluster_nm
+# (the region of the line). A route listed here is mapped only as listed.
+# Without a ClusterName the entry applies to the route in every region it
+# has; without a cluster_nm it maps to the line in every cluster the line
+# runs in.
+MAPPING_PATH = os.path.join("data", "route_key_mapping.csv")
+
+# Route keys of each dataset: an id within a cluster. Both cluster columns
+# hold the shared cluster codes (pipeline/dimensions.py); ridership names are
+# corrected and performance names are not, so clusters are matched on the
+# corrected name.
+DEMAND_KEYS = ["RouteID", "ClusterName"]
+PERFORMANCE_KEYS = ["OperatorLineId", "cluster_nm"]
+
+# Demand measures summed per route
+DEMAND_MEASURES = ["DailyPassengers", "WeeklyPassengers", "DailyRides", "WeekyRides"]
+
+
+def mapping_fingerprint(path=MAPPING_PATH):
+    return registry.fingerprint(path) if os.path.exists(path) else None
+
+
+def read_overrides(path=MAPPING_PATH):
+    if not os.path.exists(path):
+        return None
+    overrides = pd.read_csv(path, dtype={"ClusterName": "string", "cluster_nm": "string"})
+    for column in ["ClusterName", "cluster_nm"]:
+        if column not in overrides.columns:
+            overrides[column] = pd.Series(pd.NA, index=overrides.index, dtype="string")
+    return overrides[["RouteID", "ClusterName", "OperatorLineId", "cluster_nm"]]
+
+
+# Demand per route and cluster from the ridership rows (a route has a row per
+# variant), with passengers per ride recomputed from the sums
+def route_demand(ridership):
+    grouped = ridership.groupby(DEMAND_KEYS, observed=True)
+    demand = grouped[DEMAND_MEASURES].sum()
+    demand["AVGCommutersPerRide(Weekly)"] = demand["WeeklyPassengers"] / \
+        demand["WeekyRides"].where(demand["WeekyRides"] > 0)
+    demand["AgencyName"] = grouped["AgencyName"].first()
+    return demand.reset_index()
+
+
+# Route key mapping: each ridership route (in a cluster) and the performance
+# line(s) it is, with how the match was made:
+#   id+cluster  the same id in the same cluster
+#   id          the same id, which is a single line in the performance data
+#   override    listed in the mapping file
+def build_mapping(demand, lines, overrides=None):
+    demand_keys = demand[DEMAND_KEYS].drop_duplicates()
+    line_keys = lines[PERFORMANCE_KEYS].drop_duplicates()
+    line_clusters = line_keys.assign(
+        canonical_cluster=dimensions.canonical_names(line_keys["cluster_nm"].astype(object)).to_numpy())
+
+    exact = demand_keys.merge(line_clusters, left_on=DEMAND_KEYS, right_on=["OperatorLineId", "canonical_cluster"])
+    exact["match"] = "id+cluster"
+
+    unmatched = demand_keys[~demand_keys["RouteID"].isin(exact["RouteID"])]
+    single_lines = line_keys[~line_keys["OperatorLineId"].duplicated(keep=False)]
+    by_id = unmatched.merge(single_lines, left_on="RouteID", right_on="OperatorLineId")
+    by_id["match"] = "id"
+
+    mapping = pd.concat([exact, by_id], ignore_index=True)
+    if overrides is not None and len(overrides):
+        # Ridership routes each entry applies to: the route in the listed
+        # region (by corrected name), or in every region without one
+        targets = demand_keys.merge(overrides.rename(columns={"ClusterName": "listed_cluster"}), on="RouteID")
+        listed_cluster = dimensions.canonical_names(targets["listed_cluster"].astype(object))
+        targets = targets[(targets["listed_cluster"].isna() |
+                           (targets["ClusterName"].astype(object) == listed_cluster)).to_numpy(dtype=bool)]
+
+        overridden = targets.merge(line_keys, on="OperatorLineId", suffixes=("_override", ""))
+        listed = overridden["cluster_nm_override"].isna() | \
+            (overridden["cluster_nm_override"] == overridden["cluster_nm"].astype("string"))
+        overridden = overridden.loc[listed.to_numpy(dtype=bool), DEMAND_KEYS + PERFORMANCE_KEYS]
+        overridden["match"] = "override"
+        replaced = mapping.merge(targets[DEMAND_KEYS].drop_duplicates(), on=DEMAND_KEYS,
+                                 how="left", indicator=True)["_merge"] == "both"
+        mapping = pd.concat([mapping[~replaced.to_numpy()], overridden], ignore_index=True)
+    return mapping[DEMAND_KEYS + PERFORMANCE_KEYS + ["match"]]
+
+
+# Demand of each route next to the delays of its matched lines. Both sides
+# are aggregated first (the route delay rollup and route_demand), so the
+# join is a few thousand rows whatever the number of trips.
+def join_routes(demand, route_rollup, mapping):
+    lines = mapping.merge(route_rollup[PERFORMANCE_KEYS + ["metro_area"] + rollups.MEASURES], on=PERFORMANCE_KEYS)
+    grouped = lines.groupby(DEMAND_KEYS, observed=True)
+    delays = grouped[rollups.MEASURES].sum()
+    delays["lines"] = grouped.size()
+    delays["metro_area"] = grouped["metro_area"].first()
+    delays["match"] = grouped["match"].first()
+    delays = rollups.add_statistics(delays.reset_index())
+
+    joined = demand.merge(delays, on=DEMAND_KEYS)
+    joined["late_ratio"] = joined["n_late"] / joined["rows"]
+    # Daily passengers of trips that left more than 5 minutes late, taking a
+    # route's passengers as spread evenly over its trips
+    joined["delayed_passengers"] = joined["DailyPassengers"] * joined["late_ratio"]
+    return joined
+
+
+# Share of the ridership routes (and of their passengers) found in the
+# performance data, per kind of match
+def coverage(demand, joined):
+    return {
+        "routes": int(demand["RouteID"].nunique()),
+        "matched_routes": int(joined["RouteID"].nunique()),
+        "passengers": float(demand["DailyPassengers"].sum()),
+        "matched_passengers": float(joined["DailyPassengers"].sum()),
+        "matches": joined["match"].value_counts().to_dict(),
+    }
+
+
+# Everything the route-level views read: the mapping, the joined routes and
+# the coverage of the join
+def build_route_join(ridership, route_rollup, overrides=None):
+    demand = route_demand(ridership)
+    mapping = build_mapping(demand, route_rollup, overrides)
+    joined = join_routes(demand, route_rollup, mapping)
+    return {"mapping": mapping, "routes": joined, "coverage": coverage(demand, joined)}
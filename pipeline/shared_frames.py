@@ -0,0 +1,97 @@
+import logging
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+
+logger = logging.getLogger(__name__)
+
+# Loaded base datasets stored as uncompressed Arrow IPC files. Read back
+# through a memory map, numeric, timestamp and categorical columns are
+# read-only views of the mapped file and string columns are Arrow-backed
+# (pd.ArrowDtype) over it: pages are read on first use and held once in the
+# OS page cache, whatever the number of sessions (or app processes on the
+# machine). What is copied: the categories of categorical columns, and the
+# one-byte codes of a categorical column with missing values (pandas marks
+# them with -1, which Arrow indices cannot hold).
+SNAPSHOT_DIR = os.path.join("data", "artifacts", "frames")
+
+
+def snapshot_path(name, key):
+    return os.path.join(SNAPSHOT_DIR, f"{name}-{key}.arrow")
+
+
+# Write aside and rename, then remove the snapshots of older versions (a
+# process still mapping one keeps its pages until it lets go)
+def write_snapshot(frame, name, key):
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    path = snapshot_path(name, key)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    table = to_table(frame)
+    with ipc.new_file(tmp_path, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp_path, path)
+    for file_name in os.listdir(SNAPSHOT_DIR):
+        if file_name.startswith(f"{name}-") and file_name.endswith(".arrow") \
+                and os.path.join(SNAPSHOT_DIR, file_name) != path:
+            os.remove(os.path.join(SNAPSHOT_DIR, file_name))
+    return path
+
+
+# Arrow table of a frame that pandas can read back without copying: pandas
+# fills Arrow nulls of a float or timestamp column into a new buffer, so NaN
+# and NaT are stored as plain values instead of nulls
+def to_table(frame):
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    for i, column in enumerate(frame.columns):
+        values = frame[column].to_numpy() if frame[column].dtype.kind in "fM" else None
+        if values is None or not table.column(i).null_count:
+            continue
+        if values.dtype.kind == "f":
+            array = pa.array(values, from_pandas=False)
+        else:
+            array = pa.array(values.view("int64")).view(table.schema.field(i).type)
+        table = table.set_column(i, table.schema.field(i), array)
+    return table
+
+
+def read_table(path):
+    return ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+# Strings stay in the mapped Arrow buffers instead of becoming Python objects
+def _arrow_strings(arrow_type):
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        return pd.ArrowDtype(arrow_type)
+    return None
+
+
+# Pandas view of a mapped table; split_blocks keeps one block per column so
+# pandas does not consolidate (copy) columns of the same dtype
+def read_snapshot(path):
+    return read_table(path).to_pandas(split_blocks=True, types_mapper=_arrow_strings)
+
+
+# The frame stored for `key` (e.g. the fingerprints it was built from),
+# building and storing it first if needed
+def load(name, key, build):
+    path = snapshot_path(name, key)
+    if not os.path.exists(path):
+        frame = build()
+        try:
+            path = write_snapshot(frame, name, key)
+        except OSError as error:
+            # Read-only deployments keep the frame in process memory
+            logger.warning("Could not store the %s snapshot: %s", name, error)
+            return frame
+    return read_snapshot(path)
+
+
+# Stored snapshots and their size on disk (what a mapping can page in)
+def snapshots():
+    if not os.path.isdir(SNAPSHOT_DIR):
+        return {}
+    return {name: os.path.getsize(os.path.join(SNAPSHOT_DIR, name))
+            for name in sorted(os.listdir(SNAPSHOT_DIR)) if name.endswith(".arrow")}
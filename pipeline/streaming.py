@@ -0,0 +1,200 @@
+"""
+Out-of-core delay rollups for datasets that do not fit in memory (e.g. the
+full-year `data/2024_bus_performance.parquet`).
+
+The parquet data is read one record batch at a time. Each batch is reduced
+to small partial aggregates (the delay cube of counts, sums, sums of
+squares and delay category counts, per metro area KPIs, quantile sketches
+and a delay histogram), and partials are merged by addition. Peak memory is
+bounded by the batch size plus the partials, whose size depends on the
+number of routes, hours, dates and regions, not on the number of trips.
+
+    python -m pipeline.streaming data/2024_bus_performance.parquet
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow.dataset as ds
+
+from pipeline import loaders, preprocess, quantiles, query, rollups
+
+
+DEFAULT_BATCH_SIZE = 500_000
+
+# Columns read from preprocessed data; raw exports (no delay_minutes) are
+# read with the raw columns instead and derived batch by batch
+STREAM_COLUMNS = ["OperatorLineId", "operator_nm", "cluster_nm", "metro_area",
+                  "hour", "date", "day_name", "delay_minutes", "delay_category"]
+RAW_STREAM_COLUMNS = ["OperatorLineId", "operator_nm"] + preprocess.RAW_COLUMNS
+
+# Per metro area measures behind the regional KPIs (see rollups.build_metro_kpis)
+METRO_MEASURES = ["rows", "trips", "delay_sum", "within_2"] + \
+                 [f"late_over_{threshold}" for threshold in rollups.LATE_THRESHOLDS]
+
+# Tables of a set of partials (see save_partials)
+PARTIAL_TABLES = ["cube", "metro"] + list(quantiles.SKETCHES) + ["histogram"]
+
+# Grouping keys of the partial tables merged by summing
+PARTIAL_KEYS = dict({"cube": rollups.CUBE_KEYS, "metro": ["metro_area"]},
+                    **{name: keys + ["bin"] for name, keys in quantiles.SKETCHES.items()})
+
+# Fixed one-minute bins, so histograms of different batches add up;
+# delays outside the range are counted in the first / last bin
+DELAY_HISTOGRAM_EDGES = np.arange(-60, 61, 1, dtype="float64")
+
+
+# Record batches of a parquet file or partitioned dataset, as pandas frames
+# with the derived delay columns
+def iter_performance_batches(file_path, batch_size=DEFAULT_BATCH_SIZE):
+    dataset = ds.dataset(file_path, format="parquet", partitioning="hive")
+    derive = "delay_minutes" not in dataset.schema.names
+    columns = RAW_STREAM_COLUMNS if derive else STREAM_COLUMNS
+    columns = [col for col in columns if col in dataset.schema.names]
+    for batch in dataset.to_batches(columns=columns, batch_size=batch_size):
+        df = batch.to_pandas()
+        if derive:
+            df = preprocess.derive_performance_columns(df)[STREAM_COLUMNS]
+        yield loaders.compact_performance_types(df)
+
+
+# Partial aggregates of one batch: the delay cube (additive measures, see
+# rollups.build_delay_cube), per metro area KPIs, the delay quantile
+# sketches and the delay histogram
+def batch_partials(df):
+    delay = df["delay_minutes"].astype("float64")
+    category = df["delay_category"].astype(str)
+    work = df[rollups.CUBE_KEYS].assign(
+        rows=1,
+        trips=delay.notna().astype("int64"),
+        delay_sum=delay.fillna(0),
+        delay_sumsq=delay.fillna(0) ** 2,
+        **{column: (category == label).astype("int64")
+           for label, column in rollups.CATEGORY_COUNT_COLUMNS.items()}
+    )
+    partials = {"cube": work.groupby(rollups.CUBE_KEYS, observed=True, dropna=False)[rollups.MEASURES]
+                .sum().reset_index()}
+
+    metro = work[["metro_area", "rows", "trips", "delay_sum"]].assign(
+        within_2=delay.between(-2, 2).astype("int64"),
+        **{f"late_over_{threshold}": (delay > threshold).astype("int64")
+           for threshold in rollups.LATE_THRESHOLDS}
+    )
+    partials["metro"] = metro.groupby("metro_area", observed=True)[METRO_MEASURES].sum().reset_index()
+    partials.update(quantiles.build_sketches(df))
+
+    values = delay.dropna().clip(DELAY_HISTOGRAM_EDGES[0], DELAY_HISTOGRAM_EDGES[-1])
+    partials["histogram"], _ = np.histogram(values, bins=DELAY_HISTOGRAM_EDGES)
+    return partials
+
+
+# Merge two sets of partials (either may be None): measures are summed per group
+def merge_partials(left, right):
+    if left is None or right is None:
+        return right if left is None else left
+    merged = {"histogram": left["histogram"] + right["histogram"]}
+    for name, by in PARTIAL_KEYS.items():
+        # Empty partials (e.g. no valid delay in a batch) are left out, as
+        # concat would no longer ignore their dtypes
+        frames = [frame for frame in (left[name], right[name]) if len(frame)]
+        if len(frames) < 2:
+            merged[name] = frames[0] if frames else left[name]
+            continue
+        combined = pd.concat(frames, ignore_index=True)
+        merged[name] = combined.groupby(by, observed=True, dropna=False).sum().reset_index()
+    return merged
+
+
+# Fold every batch of the data into one set of partials
+def stream_partials(file_path, batch_size=DEFAULT_BATCH_SIZE, on_batch=None):
+    partials = None
+    for df in iter_performance_batches(file_path, batch_size):
+        partials = merge_partials(partials, batch_partials(df))
+        if on_batch is not None:
+            on_batch(df, partials)
+    return partials
+
+
+# Rollups in the format of rollups.build_delay_rollups, plus the overall
+# delay histogram. postprocess is applied to every table, e.g. to map names
+# onto the shared dimension codes.
+def rollups_from_partials(partials, postprocess=None):
+    def finish(frame):
+        frame = loaders.compact_performance_types(frame)
+        return postprocess(frame) if postprocess else frame
+
+    cube = query.sort_by_keys(finish(partials["cube"]), rollups.CUBE_KEYS)
+    result = {"cube": cube}
+    for name, keys in rollups.ROLLUP_KEYS.items():
+        result[name] = rollups.rollup(cube, keys)
+    result["category"] = rollups.category_distribution(cube)
+    result["metro_kpis"] = finish(partials["metro"]).groupby("metro_area", observed=True).sum()
+    for name in quantiles.SKETCHES:
+        result[name] = finish(partials[name])
+    result["quantiles"] = quantiles.quantile_rollups(result)
+    result["day_boxes"] = rollups.day_boxes(cube, result["day_sketch"])
+    result["delay_histogram"] = (partials["histogram"], DELAY_HISTOGRAM_EDGES)
+    return result
+
+
+def stream_rollups(file_path, batch_size=DEFAULT_BATCH_SIZE, postprocess=None):
+    return rollups_from_partials(stream_partials(file_path, batch_size), postprocess)
+
+
+# Partials as one small parquet file per table, e.g. to keep them next to
+# the dataset they summarize (see pipeline/ingest.py)
+def save_partials(partials, directory):
+    os.makedirs(directory, exist_ok=True)
+    for name, frame in partials.items():
+        if name == "histogram":
+            frame = pd.DataFrame({"count": frame})
+        frame.to_parquet(os.path.join(directory, f"{name}.parquet"), index=False)
+
+
+def load_partials(directory):
+    partials = {}
+    for name in PARTIAL_TABLES:
+        partials[name] = pd.read_parquet(os.path.join(directory, f"{name}.parquet"))
+    partials["histogram"] = partials["histogram"]["count"].to_numpy()
+    return partials
+
+
+# True if `directory` holds a complete set of partials in the current format
+def has_partials(directory):
+    return all(os.path.exists(os.path.join(directory, f"{name}.parquet")) for name in PARTIAL_TABLES)
+
+
+def partials_mb(partials):
+    return sum(loaders.memory_mb(frame) for name, frame in partials.items() if name != "histogram")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the delay rollups batch by batch.")
+    parser.add_argument("input", nargs="?", default=loaders.FULL_YEAR_PERFORMANCE_PATH,
+                        help="performance parquet file or dataset directory")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="rows per batch")
+    args = parser.parse_args()
+
+    progress = {"batches": 0, "rows": 0, "batch_mb": 0.0, "partials_mb": 0.0}
+
+    def on_batch(df, partials):
+        progress["batches"] += 1
+        progress["rows"] += len(df)
+        progress["batch_mb"] = max(progress["batch_mb"], loaders.memory_mb(df))
+        progress["partials_mb"] = max(progress["partials_mb"], partials_mb(partials))
+
+    start = time.perf_counter()
+    result = rollups_from_partials(stream_partials(args.input, args.batch_size, on_batch))
+    elapsed = time.perf_counter() - start
+
+    print(f"{args.input}: {progress['rows']:,} rows in {progress['batches']} batches, {elapsed:.1f}s")
+    print(f"  largest batch:    {progress['batch_mb']:8.1f} MB")
+    print(f"  partials (peak):  {progress['partials_mb']:8.1f} MB")
+    for name in rollups.ROLLUP_KEYS:
+        print(f"  {name + ':':17} {len(result[name]):8,} rows")
+
+
+if __name__ == "__main__":
+    main()
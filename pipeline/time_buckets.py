@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+
+# Bucket schemes over minute-of-day: (bucket start minutes, labels)
+def _regular_scheme(step):
+    starts = list(range(0, 24 * 60, step))
+    return starts, [f"{start // 60:02d}:{start % 60:02d}" for start in starts]
+
+
+SCHEMES = {
+    # The seven time ranges of the ridership dataset columns
+    "ridership": (
+        [0, 4 * 60, 6 * 60, 9 * 60, 12 * 60, 15 * 60, 19 * 60],
+        ['00:00-03:59', '04:00-05:59', '06:00-08:59', '09:00-11:59',
+         '12:00-14:59', '15:00-18:59', '19:00-23:59']
+    ),
+    "hourly": _regular_scheme(60),
+    "15min": _regular_scheme(15),
+}
+
+# trip_day_in_week: 1 = Sunday ... 7 = Saturday
+DAY_TYPES = ['WorkDay', 'Friday', 'Saturday']
+_DAY_TYPE_CODES = np.array([-1, 0, 0, 0, 0, 0, 1, 2], dtype="int8")
+
+
+def labels(scheme="ridership"):
+    return SCHEMES[scheme][1]
+
+
+# Minute of day (0-1439) as int16 from 'HH:MM[:SS]' strings, -1 where the
+# time is missing (bucket() maps it to no bucket)
+def minute_of_day(trip_time):
+    seconds = pd.to_timedelta(trip_time).dt.total_seconds()
+    return (seconds // 60 % (24 * 60)).fillna(-1).astype("int16")
+
+
+# Ordered categorical of time buckets, assigned by a binned lookup on the
+# minute-of-day codes (no per-row Python)
+def bucket(minutes, scheme="ridership"):
+    starts, names = SCHEMES[scheme]
+    codes = np.searchsorted(np.asarray(starts), np.asarray(minutes), side="right") - 1
+    return pd.Categorical.from_codes(codes, categories=names, ordered=True)
+
+
+# 0-based day of week (0 = Sunday) of trip_day_in_week values, -1 where the
+# value is missing or not a day 1-7
+def day_index(trip_day_in_week):
+    days = pd.to_numeric(pd.Series(np.asarray(trip_day_in_week, dtype=object)), errors="coerce").to_numpy(dtype="float64")
+    valid = (days >= 1) & (days <= 7) & (days == np.floor(days))
+    return np.where(valid, np.nan_to_num(days) - 1, -1).astype("int64")
+
+
+# Day type of each trip_day_in_week value (missing for invalid days)
+def day_type(trip_day_in_week):
+    codes = _DAY_TYPE_CODES[day_index(trip_day_in_week) + 1]
+    return pd.Categorical.from_codes(codes, categories=DAY_TYPES)
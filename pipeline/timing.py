@@ -0,0 +1,183 @@
+"""
+Per-rerun timing spans and cache hit/miss counters.
+
+Each script run of a session starts a trace; code anywhere below it opens
+named spans (nested spans are kept with their depth) and records cache
+lookups. Outside a trace (CLI tools, benchmarks) spans cost nothing. At the
+end of the run the trace becomes one JSON record, shown in the sidebar
+performance panel and appended to a JSON-lines log.
+
+    python -m pipeline.timing data/logs/timings.jsonl    # p50 / p95 per page and span
+"""
+import argparse
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import numpy as np
+
+
+# One JSON line per script run; DASHBOARD_TIMING_LOG overrides the path and
+# an empty value turns the log off
+LOG_PATH = os.path.join("data", "logs", "timings.jsonl")
+LOG_ENV = "DASHBOARD_TIMING_LOG"
+
+# Streamlit runs each session's script in its own thread
+_local = threading.local()
+
+
+def log_path():
+    return os.environ.get(LOG_ENV, LOG_PATH) or None
+
+
+class Trace:
+    def __init__(self, page):
+        self.page = page
+        self.started_at = datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+        self.started = time.perf_counter()
+        self.spans = []
+        self.caches = defaultdict(lambda: {"hits": 0, "misses": 0})
+        self.seconds = None
+        self._depth = 0
+
+    # The trace as a JSON-serializable record (spans in the order they ended)
+    def record(self):
+        return {
+            "started_at": self.started_at,
+            "page": self.page,
+            "seconds": self.seconds,
+            "spans": self.spans,
+            "caches": dict(self.caches),
+        }
+
+
+def start(page):
+    _local.trace = Trace(page)
+    return _local.trace
+
+
+def current():
+    return getattr(_local, "trace", None)
+
+
+# End the current trace and append it to the log; returns the record
+def finish(path=None):
+    trace = current()
+    if trace is None:
+        return None
+    _local.trace = None
+    trace.seconds = round(time.perf_counter() - trace.started, 4)
+    record = trace.record()
+    path = path or log_path()
+    if path:
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError:
+            # Read-only deployments still show the panel
+            pass
+    return record
+
+
+@contextlib.contextmanager
+def span(name):
+    trace = current()
+    if trace is None:
+        yield
+        return
+    start_time = time.perf_counter()
+    depth = trace._depth
+    trace._depth += 1
+    try:
+        yield
+    finally:
+        trace._depth = depth
+        trace.spans.append({
+            "name": name,
+            "start": round(start_time - trace.started, 4),
+            "seconds": round(time.perf_counter() - start_time, 4),
+            "depth": depth,
+        })
+
+
+def cache_lookup(name, hit):
+    trace = current()
+    if trace is not None:
+        trace.caches[name]["hits" if hit else "misses"] += 1
+
+
+# Decorator: every call of the function is a span. With cache=True it is the
+# body of a Streamlit cache (put it under @st.cache_*), which only runs on a
+# miss, so each call is also counted as a miss of that cache. Functions under
+# @result_cache.cached need no flag: that cache counts its own lookups.
+def timed(name, cache=False):
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if cache:
+                cache_lookup(name, hit=False)
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# Cached resource loads: a hit when no cache missed while it was being loaded
+@contextlib.contextmanager
+def resource_span(name):
+    trace = current()
+    if trace is None:
+        yield
+        return
+    misses = sum(counts["misses"] for counts in trace.caches.values())
+    with span(name):
+        yield
+    cache_lookup(name, hit=sum(counts["misses"] for counts in trace.caches.values()) == misses)
+
+
+def read_log(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+# p50 / p95 (seconds) and run counts per page, and per page and span
+def summarize(records):
+    pages = defaultdict(list)
+    spans = defaultdict(list)
+    for record in records:
+        pages[record["page"]].append(record["seconds"])
+        for entry in record["spans"]:
+            spans[(record["page"], entry["name"])].append(entry["seconds"])
+
+    def stats(values):
+        return {"runs": len(values),
+                "p50": round(float(np.percentile(values, 50)), 4),
+                "p95": round(float(np.percentile(values, 95)), 4)}
+
+    return {
+        "pages": {page: stats(values) for page, values in pages.items()},
+        "spans": {f"{page} / {name}": stats(values) for (page, name), values in spans.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency percentiles from the dashboard timing log.")
+    parser.add_argument("log", nargs="?", default=LOG_PATH, help="JSON-lines timing log")
+    args = parser.parse_args()
+
+    summary = summarize(read_log(args.log))
+    for section in ("pages", "spans"):
+        print(f"{section[:-1]:60} {'runs':>6} {'p50':>9} {'p95':>9}")
+        for name, stats in sorted(summary[section].items(), key=lambda item: -item[1]["p95"]):
+            print(f"{name:60} {stats['runs']:6} {stats['p50']:8.3f}s {stats['p95']:8.3f}s")
+        print()
+
+
+if __name__ == "__main__":
+    main()
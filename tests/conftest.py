@@ -0,0 +1,47 @@
+import pytest
+
+from benchmarks import synthetic
+from pipeline import dimensions, loaders, preprocess, query, route_index
+
+
+# A small month of synthetic trips, written in both layouts the app reads:
+# a single parquet file and the partitioned dataset of pipeline.preprocess.
+# A few trips have no planned time or no departure, so missing keys and
+# missing delays are covered.
+@pytest.fixture(scope="session")
+def performance_paths(tmp_path_factory):
+    ridership = synthetic.make_ridership(0.005, seed=1)
+    raw = synthetic.make_raw_trips(ridership, 20_000, seed=1)
+    raw.loc[:19, "trip_time"] = None
+    raw.loc[20:39, "bitzua_history_start_dt"] = None
+    derived = preprocess.derive_performance_columns(raw)
+
+    directory = tmp_path_factory.mktemp("performance")
+    file_path = directory / "performance.parquet"
+    derived.drop(columns=["month"]).to_parquet(file_path, index=False)
+    preprocess.write_partitioned(derived, str(directory / "dataset"))
+    return {"ridership": ridership, "file": str(file_path), "dataset": str(directory / "dataset")}
+
+
+# One layout of the data, set up as main.py does: the path, the loaded frame
+# mapped onto the shared dimension codes, and the same mapping for results
+# read without loading the frame
+@pytest.fixture(scope="session", params=["file", "dataset"])
+def performance_data(request, performance_paths):
+    path = performance_paths[request.param]
+    dims = dimensions.build_dimensions(performance_paths["ridership"][dimensions.RIDERSHIP_COLUMNS],
+                                       loaders.distinct_rows(path, dimensions.PERFORMANCE_COLUMNS))
+    frame = dimensions.encode_performance(loaders.load_performance(path)[0], dims)
+
+    def encode_result(result):
+        return dimensions.encode_performance(loaders.compact_performance_types(result), dims)
+
+    return {"path": path, "frame": frame, "encode_result": encode_result}
+
+
+# The pandas and the Arrow backend over the same data
+@pytest.fixture(scope="session")
+def backends(performance_data):
+    frame = performance_data["frame"]
+    return (query.PandasBackend(frame, routes=route_index.build_route_index(frame)),
+            query.ArrowBackend(performance_data["path"], performance_data["encode_result"]))
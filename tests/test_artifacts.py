@@ -0,0 +1,13 @@
+from pipeline import artifacts
+
+
+# Storing an artifact removes the ones of older fingerprints, and only those
+def test_older_artifacts_removed(tmp_path, monkeypatch):
+    monkeypatch.setattr(artifacts, "ARTIFACTS_DIR", str(tmp_path))
+    artifacts.save_json("headlines", "v1", {"trips": 1})
+    artifacts.save_json("headline_kpis", "v1", {"trips": 1})
+    assert artifacts.cached_json("headlines", "v2", lambda: {"trips": 2}) == {"trips": 2}
+
+    assert artifacts.load_json("headlines", "v1") is None
+    assert artifacts.load_json("headlines", "v2") == {"trips": 2}
+    assert artifacts.load_json("headline_kpis", "v1") == {"trips": 1}
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks import synthetic
+from pipeline import demand_cube, ridership_store
+
+
+SUMMED = ridership_store.MEASURES + ["rows"]
+
+
+@pytest.fixture(scope="module")
+def base():
+    return ridership_store.aggregate(synthetic.make_ridership(0.05, seed=3))["cube"]
+
+
+@pytest.fixture(scope="module")
+def cube(base):
+    return demand_cube.build_cube(base)
+
+
+@pytest.mark.parametrize("dimension", demand_cube.DIMENSIONS)
+def test_rollups_sum_to_base(base, cube, dimension):
+    result = demand_cube.query(cube, [dimension])
+    assert result[dimension].is_unique
+    np.testing.assert_allclose(result[SUMMED].sum().to_numpy(), base[SUMMED].sum().to_numpy())
+    expected = base.groupby(dimension, observed=True)["RouteID"].nunique()
+    assert (result.set_index(dimension)["routes"] == expected.reindex(result[dimension])).all()
+
+
+# A selection two levels down the drill path: its operators, their totals
+# from the rollup, and the routes below one of them from the base
+def test_drill_down_filters(base, cube):
+    metro, cluster = base.groupby(["Metropolin", "ClusterName"], observed=True).size().idxmax()
+    filters = {"Metropolin": metro, "ClusterName": cluster}
+    selected = base[(base["Metropolin"] == metro) & (base["ClusterName"] == cluster)]
+
+    level, result = demand_cube.drill_down(cube, filters)
+    assert level == "AgencyName"
+    expected = selected.groupby("AgencyName", observed=True)[SUMMED].sum()
+    pd.testing.assert_frame_equal(result.set_index("AgencyName")[SUMMED].sort_index(), expected.sort_index(),
+                                  check_dtype=False, check_names=False)
+    assert demand_cube.members(cube, "AgencyName", filters) == sorted(selected["AgencyName"].astype(str).unique())
+
+    agency = result["AgencyName"].iloc[0]
+    level, routes = demand_cube.drill_down(cube, {**filters, "AgencyName": agency})
+    assert level == "RouteID"
+    assert sorted(routes["RouteID"]) == sorted(selected.loc[selected["AgencyName"] == agency, "RouteID"].unique())
+    assert (routes["routes"] == 1).all()
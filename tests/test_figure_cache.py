@@ -0,0 +1,60 @@
+import json
+
+import plotly.graph_objects as go
+
+from pipeline.figure_cache import FigureCache
+
+
+def figure(name):
+    return go.Figure(go.Bar(x=[name], y=[1]))
+
+
+def spec_size(fig):
+    return len(fig.to_json().encode("utf-8"))
+
+
+# Sizes are UTF-8 bytes: Hebrew labels take two per character
+def test_lru_eviction_by_utf8_size():
+    hebrew, latin = figure("תחנה מרכזית" * 20), figure("Central station" * 20)
+    assert spec_size(hebrew) > len(hebrew.to_json())
+    cache = FigureCache(max_bytes=2 * spec_size(hebrew) + spec_size(latin) - 1)
+    keys = [FigureCache.make_key("page", "v1", n=n) for n in range(3)]
+    cache.figure(keys[0], lambda: hebrew)
+    cache.figure(keys[1], lambda: hebrew)
+    assert cache.get(keys[0]) is not None
+    cache.figure(keys[2], lambda: latin)
+
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None and cache.get(keys[2]) is not None
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["bytes"] == spec_size(hebrew) + spec_size(latin)
+
+
+# A hit returns the cached spec as a dict, a miss the figure built
+def test_hit_returns_dict_miss_returns_figure():
+    cache = FigureCache()
+    key = FigureCache.make_key("page", "v1", metro="North")
+    built = cache.figure(key, lambda: figure("North"))
+    assert isinstance(built, go.Figure)
+
+    cached = cache.figure(key, lambda: figure("other"))
+    assert isinstance(cached, dict)
+    assert cached == json.loads(built.to_json())
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+# Artifacts written by one process are found by another for the same
+# fingerprint, and not for a new one
+def test_artifacts_keyed_by_fingerprint(tmp_path):
+    writer = FigureCache(artifact_dir=str(tmp_path), write_artifacts=True)
+    writer.figure(FigureCache.make_key("page", "v1", metro="North"), lambda: figure("North"))
+
+    reader = FigureCache(artifact_dir=str(tmp_path))
+    cached = reader.figure(FigureCache.make_key("page", "v1", metro="North"), lambda: figure("other"))
+    assert cached["data"][0]["x"] == ["North"]
+    assert reader.stats()["artifact_hits"] == 1
+    rebuilt = reader.figure(FigureCache.make_key("page", "v2", metro="North"), lambda: figure("new"))
+    assert isinstance(rebuilt, go.Figure)
+    assert reader.stats()["misses"] == 1
+    assert len(list(tmp_path.iterdir())) == 1
@@ -0,0 +1,100 @@
+import shutil
+
+import pyarrow.dataset as ds
+import pytest
+
+from benchmarks import synthetic
+from pipeline import ingest, preprocess, streaming
+
+
+# Raw export of one month of synthetic trips (the generator writes March)
+def raw_month(ridership, month, rows, seed):
+    raw = synthetic.make_raw_trips(ridership, rows, seed=seed)
+    raw["trip_dt"] = raw["trip_dt"].str.replace(synthetic.MONTH, month)
+    return raw
+
+
+def write_raw(tmp_path, name, raw):
+    path = str(tmp_path / f"{name}.parquet")
+    raw.to_parquet(path, index=False)
+    return path
+
+
+def rows_on_disk(dataset):
+    return ds.dataset(dataset, format="parquet", partitioning="hive").count_rows()
+
+
+def total_rows(dataset):
+    return int(ingest.current_partials(dataset)["metro"]["rows"].sum())
+
+
+@pytest.fixture(scope="module")
+def ridership():
+    return synthetic.make_ridership(0.005, seed=4)
+
+
+def test_append_months(tmp_path, ridership):
+    dataset = str(tmp_path / "dataset")
+    assert ingest.ingest(write_raw(tmp_path, "march", raw_month(ridership, "2024-03", 2_000, 1)), dataset) \
+        == ["2024-03"]
+    assert ingest.ingest(write_raw(tmp_path, "may", raw_month(ridership, "2024-05", 1_500, 2)), dataset) \
+        == ["2024-05"]
+
+    assert sorted(ingest.load_manifest(dataset)["months"]) == ["2024-03", "2024-05"]
+    assert total_rows(dataset) == rows_on_disk(dataset) == 3_500
+    # The totals equal the partials of the whole dataset read back
+    expected = streaming.stream_partials(dataset)
+    assert (ingest.current_partials(dataset)["histogram"] == expected["histogram"]).all()
+
+    with pytest.raises(ValueError):
+        ingest.ingest(write_raw(tmp_path, "march_again", raw_month(ridership, "2024-03", 100, 3)), dataset)
+
+
+def test_replace_month(tmp_path, ridership):
+    dataset = str(tmp_path / "dataset")
+    ingest.ingest(write_raw(tmp_path, "march", raw_month(ridership, "2024-03", 2_000, 1)), dataset)
+    ingest.ingest(write_raw(tmp_path, "may", raw_month(ridership, "2024-05", 1_500, 2)), dataset)
+    ingest.ingest(write_raw(tmp_path, "march_fixed", raw_month(ridership, "2024-03", 800, 5)), dataset,
+                  replace=True)
+
+    manifest = ingest.load_manifest(dataset)
+    assert manifest["months"]["2024-03"]["rows"] == 800
+    assert total_rows(dataset) == rows_on_disk(dataset) == 2_300
+
+
+# A dataset written by pipeline.preprocess is adopted by --sync, and a month
+# removed from disk is dropped from the totals
+def test_sync(tmp_path, ridership):
+    dataset = str(tmp_path / "dataset")
+    raw = raw_month(ridership, "2024-03", 2_000, 1)
+    preprocess.write_partitioned(preprocess.derive_performance_columns(raw), dataset)
+    preprocess.write_partitioned(preprocess.derive_performance_columns(raw_month(ridership, "2024-05", 700, 2)),
+                                 dataset)
+    assert ingest.current_partials(dataset) is None
+
+    manifest = ingest.sync_manifest(dataset)
+    assert sorted(manifest["months"]) == ["2024-03", "2024-05"]
+    assert total_rows(dataset) == rows_on_disk(dataset) == 2_700
+
+    shutil.rmtree(ingest.month_dir(dataset, "2024-05"))
+    assert ingest.current_partials(dataset) is None
+    ingest.sync_manifest(dataset)
+    assert total_rows(dataset) == rows_on_disk(dataset) == 2_000
+
+
+# Trips without a planned time are stored in the month of their trip date
+# and counted in the totals; rows without a trip date are not written
+def test_missing_planned_times(tmp_path, ridership):
+    dataset = str(tmp_path / "dataset")
+    march = raw_month(ridership, "2024-03", 1_000, 1)
+    march.loc[:9, "trip_time"] = None
+    march.loc[10:14, "trip_dt"] = None
+    assert ingest.ingest(write_raw(tmp_path, "march", march), dataset) == ["2024-03"]
+    assert ingest.months_on_disk(dataset) == ["2024-03"]
+    assert total_rows(dataset) == rows_on_disk(dataset) == 995
+
+    may = raw_month(ridership, "2024-05", 500, 2)
+    may.loc[:9, "trip_time"] = None
+    ingest.ingest(write_raw(tmp_path, "may", may), dataset)
+    assert ingest.months_on_disk(dataset) == ["2024-03", "2024-05"]
+    assert total_rows(dataset) == rows_on_disk(dataset) == 1_495
@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks import synthetic
+from pipeline import dimensions, od_matrix
+
+
+PAIR = ["OriginCityName", "DestinationCityName"]
+
+
+# Ridership encoded as main.py does, with a few routes missing a city
+@pytest.fixture(scope="module")
+def ridership():
+    data = synthetic.make_ridership(0.05, seed=6)
+    data.loc[:4, "OriginCityName"] = None
+    data.loc[5:9, "DestinationCityName"] = None
+    data.loc[10:14, "WeeklyPassengers"] = None
+    return dimensions.encode_ridership(data, dimensions.build_ridership_dimensions(data))
+
+
+@pytest.fixture(scope="module")
+def od(ridership):
+    return od_matrix.build_od_matrix(ridership)
+
+
+# Totals per origin / destination pair, by name
+@pytest.fixture(scope="module")
+def pair_totals(ridership):
+    grouped = ridership.groupby(PAIR, observed=True)
+    totals = grouped[od_matrix.MEASURES].sum()
+    totals["routes"] = grouped["RouteID"].nunique()
+    return totals.reset_index().astype({column: str for column in PAIR}).set_index(PAIR)
+
+
+def named(od, frame):
+    return frame.assign(OriginCityName=od["cities"][frame["origin"]],
+                        DestinationCityName=od["cities"][frame["destination"]]).set_index(PAIR)
+
+
+def test_matches_groupby(od, pair_totals):
+    matrix = od["matrix"]
+    assert matrix["WeeklyPassengers"].is_monotonic_decreasing
+    result = named(od, matrix)[od_matrix.MEASURES + ["routes"]]
+    pd.testing.assert_frame_equal(result.sort_index(), pair_totals.sort_index(), check_dtype=False)
+
+    totals = od["totals"]
+    outbound = pair_totals.groupby(level=0)["WeeklyPassengers"].sum()
+    np.testing.assert_allclose(totals.loc[od["cities"].get_indexer(outbound.index), "out_WeeklyPassengers"],
+                               outbound.to_numpy())
+
+
+@pytest.mark.parametrize("measure", od_matrix.MEASURES)
+@pytest.mark.parametrize("within_city", [False, True])
+def test_top_corridors(od, pair_totals, measure, within_city):
+    expected = pair_totals.reset_index()
+    if not within_city:
+        expected = expected[expected["OriginCityName"] != expected["DestinationCityName"]]
+    top = od_matrix.top_corridors(od, 10, measure, within_city=within_city)
+    np.testing.assert_allclose(top[measure].to_numpy(), expected[measure].nlargest(10).to_numpy())
+    if not within_city:
+        assert (top["origin_name"] != top["destination_name"]).all()
+
+
+def test_top_corridors_of_a_city(od, pair_totals):
+    city = od_matrix.ranked_cities(od)[0]
+    top = od_matrix.top_corridors(od, 5, city=city)
+    assert ((top["origin_name"] == city) | (top["destination_name"] == city)).all()
+    assert (top["origin_name"] != top["destination_name"]).all()
+    expected = pair_totals.reset_index()
+    expected = expected[((expected["OriginCityName"] == city) | (expected["DestinationCityName"] == city))
+                        & (expected["OriginCityName"] != expected["DestinationCityName"])]
+    np.testing.assert_allclose(top["WeeklyPassengers"].to_numpy(),
+                               expected["WeeklyPassengers"].nlargest(5).to_numpy())
+
+
+@pytest.mark.parametrize("within_city", [False, True])
+def test_top_cities_matrix(od, pair_totals, within_city):
+    dense = od_matrix.top_cities_matrix(od, 8, within_city=within_city)
+    cities = od_matrix.ranked_cities(od)[:8]
+    assert list(dense.index) == list(dense.columns) == list(cities)
+
+    expected = pair_totals["WeeklyPassengers"].unstack(fill_value=0).reindex(index=cities, columns=cities,
+                                                                             fill_value=0).to_numpy()
+    if not within_city:
+        np.fill_diagonal(expected, 0)
+    np.testing.assert_allclose(dense.to_numpy(), expected)
@@ -0,0 +1,55 @@
+import pandas as pd
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from benchmarks import synthetic
+from pipeline import loaders, preprocess
+
+
+# Each written file holds several row groups with disjoint line id ranges,
+# so a route filter reads only the row groups holding that route
+def test_row_groups_prune_routes(tmp_path):
+    ridership = synthetic.make_ridership(0.005, seed=2)
+    derived = preprocess.derive_performance_columns(synthetic.make_raw_trips(ridership, 20_000, seed=2))
+    preprocess.write_partitioned(derived, str(tmp_path), row_group_rows=1_000)
+
+    for path in loaders.parquet_files(str(tmp_path)):
+        metadata = pq.ParquetFile(path).metadata
+        column = metadata.schema.to_arrow_schema().get_field_index("OperatorLineId")
+        ranges = [(metadata.row_group(i).column(column).statistics.min,
+                   metadata.row_group(i).column(column).statistics.max) for i in range(metadata.num_row_groups)]
+        assert all(group.num_rows <= 1_000 for group in map(metadata.row_group, range(metadata.num_row_groups)))
+        assert all(previous[1] <= current[0] for previous, current in zip(ranges, ranges[1:]))
+
+    route_id = int(derived["OperatorLineId"].iloc[0])
+    condition = ds.field("OperatorLineId") == route_id
+    dataset = ds.dataset(str(tmp_path), format="parquet", partitioning="hive")
+    total = sum(fragment.num_row_groups for fragment in dataset.get_fragments())
+    read = [group for fragment in dataset.get_fragments(filter=condition)
+            for group in fragment.split_by_row_group(condition)]
+    assert len(read) < total / 4
+    assert sum(group.count_rows(filter=condition) for group in read) == (derived["OperatorLineId"] == route_id).sum()
+
+
+# Parquet input is split into even row ranges whatever its row groups, and
+# the chunks together write every row once
+def test_parallel_row_ranges(tmp_path):
+    ridership = synthetic.make_ridership(0.005, seed=3)
+    raw = synthetic.make_raw_trips(ridership, 5_000, seed=3)
+    input_path = str(tmp_path / "raw.parquet")
+    raw.to_parquet(input_path, index=False, row_group_size=3_000)
+
+    chunks = preprocess.parquet_chunks(input_path, chunk_rows=1_200)
+    assert [stop - start for start, stop in chunks] == [1_200] * 4 + [200]
+    pd.testing.assert_frame_equal(preprocess.read_row_range(input_path, 2_400, 3_600),
+                                  pd.read_parquet(input_path).iloc[2_400:3_600].reset_index(drop=True))
+
+    results = preprocess.preprocess_parallel(input_path, str(tmp_path / "dataset"), workers=2, chunk_rows=1_200)
+    assert [result["rows"] for result in results] == [1_200] * 4 + [200]
+    assert ds.dataset(str(tmp_path / "dataset"), format="parquet", partitioning="hive").count_rows() == len(raw)
+
+
+def test_parallel_empty_input(tmp_path):
+    input_path = str(tmp_path / "raw.parquet")
+    pd.DataFrame({column: pd.Series(dtype=str) for column in preprocess.RAW_COLUMNS}).to_parquet(input_path)
+    assert preprocess.preprocess_parallel(input_path, str(tmp_path / "dataset"), workers=2) == []
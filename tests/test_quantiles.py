@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pipeline import quantiles
+
+
+GROUPINGS = {
+    "route": ("route_sketch", ["OperatorLineId"]),
+    "hour": ("hour_sketch", ["hour"]),
+    "cluster": ("route_sketch", ["cluster_nm", "metro_area"]),
+    "metro": ("route_sketch", ["metro_area"]),
+    "all": ("route_sketch", []),
+    "day": ("day_sketch", ["day_name"]),
+}
+
+# Selections whose sketches are built apart and merged with the rest
+SELECTIONS = {
+    "metro": lambda frame: frame["metro_area"] == "North",
+    "hours": lambda frame: frame["hour"].isin(["07:00", "08:00", "17:00"]),
+    "routes": lambda frame: frame["OperatorLineId"] < frame["OperatorLineId"].median(),
+}
+
+
+# Quantiles checked in the tails
+TAIL_QUANTILES = {"min": 0.0, "p01": 0.01, "median": 0.5, "p99": 0.99, "max": 1.0}
+
+
+# Exact quantiles per group (numpy's method="lower"), in the row order of `result`
+def exact_quantiles(frame, by, result, qs=quantiles.QUANTILES):
+    values = frame[frame["delay_minutes"].notna()]
+    if not by:
+        groups = {(): values["delay_minutes"]}
+    else:
+        groups = {key if isinstance(key, tuple) else (key,): group
+                  for key, group in values.groupby(by, observed=True)["delay_minutes"]}
+    keys = [tuple(row) for row in result[by].itertuples(index=False)] if by else [()]
+    return {name: np.array([np.quantile(groups[key].to_numpy(dtype="float64"), q, method="lower") for key in keys])
+            for name, q in qs.items()}
+
+
+# Every estimate lies within the width of the bin holding the exact value
+# (overflow bins report their finite edge)
+def assert_within_bins(estimates, exact):
+    bins = quantiles.bin_of(exact)
+    width = quantiles.SKETCH_EDGES[bins + 1] - quantiles.SKETCH_EDGES[bins]
+    finite = np.isfinite(width)
+    assert (np.abs(estimates - exact)[finite] <= width[finite]).all()
+    np.testing.assert_array_equal(estimates[~finite], quantiles.bin_points(bins[~finite]))
+
+
+def assert_sketches_equal(result, expected, keys):
+    def ordered(sketch):
+        sketch = sketch.astype({key: str for key in keys if isinstance(sketch[key].dtype, pd.CategoricalDtype)})
+        return sketch.sort_values(keys + ["bin"], ignore_index=True)
+    pd.testing.assert_frame_equal(ordered(result), ordered(expected), check_dtype=False)
+
+
+# Trips with delays far into the tails, including beyond a day either way
+@pytest.fixture(scope="module")
+def heavy_tails():
+    rng = np.random.default_rng(3)
+    n = 5_000
+    delay = np.concatenate([rng.normal(2, 4, n - 500), rng.normal(0, 200, 450), rng.choice([-3000, 2000], 50)])
+    return pd.DataFrame({
+        "OperatorLineId": rng.integers(1, 20, n),
+        "operator_nm": "Operator",
+        "cluster_nm": rng.choice(["A", "B", "C"], n),
+        "metro_area": rng.choice(["North", "South"], n),
+        "hour": rng.choice(["06:00", "07:00", "08:00"], n),
+        "day_name": rng.choice(["Sunday", "Monday"], n),
+        "delay_minutes": delay,
+    })
+
+
+@pytest.mark.parametrize("grouping", GROUPINGS)
+def test_quantiles_within_bins(performance_data, grouping):
+    frame = performance_data["frame"]
+    name, by = GROUPINGS[grouping]
+    result = quantiles.sketch_quantiles(quantiles.build_sketches(frame)[name], by)
+    exact = exact_quantiles(frame, by, result)
+    for quantile in quantiles.QUANTILES:
+        assert_within_bins(result[quantile].to_numpy(), exact[quantile])
+
+
+@pytest.mark.parametrize("grouping", GROUPINGS)
+def test_heavy_tails(heavy_tails, grouping):
+    name, by = GROUPINGS[grouping]
+    sketch = quantiles.build_sketch(heavy_tails, quantiles.SKETCHES[name])
+    result = quantiles.sketch_quantiles(sketch, by, TAIL_QUANTILES)
+    exact = exact_quantiles(heavy_tails, by, result, TAIL_QUANTILES)
+    for quantile in TAIL_QUANTILES:
+        assert_within_bins(result[quantile].to_numpy(), exact[quantile])
+
+
+def test_overflow_bins(heavy_tails):
+    sketch = quantiles.build_sketch(heavy_tails, [])
+    result = quantiles.sketch_quantiles(sketch, [], TAIL_QUANTILES).iloc[0]
+    assert result["min"] == -1440 and result["max"] == 1440
+    overflow = sketch[sketch["bin"].isin([0, len(quantiles.SKETCH_EDGES) - 2])]
+    assert overflow["count"].sum() == (heavy_tails["delay_minutes"].abs() > 1440).sum()
+
+
+# Sketches of a selection and of the rest merge into the sketch of the whole
+# data, and the selection's own sketch answers its quantiles within the bound
+@pytest.mark.parametrize("selection", SELECTIONS)
+def test_merged_sketches(performance_data, selection):
+    frame = performance_data["frame"]
+    selected = SELECTIONS[selection](frame).to_numpy()
+    whole = quantiles.build_sketches(frame)
+    part, rest = quantiles.build_sketches(frame[selected]), quantiles.build_sketches(frame[~selected])
+    for name, keys in quantiles.SKETCHES.items():
+        assert_sketches_equal(quantiles.merge_sketches(part[name], rest[name], keys), whole[name], keys)
+
+    for grouping, (name, by) in GROUPINGS.items():
+        result = quantiles.sketch_quantiles(part[name], by)
+        exact = exact_quantiles(frame[selected], by, result)
+        for quantile in quantiles.QUANTILES:
+            assert_within_bins(result[quantile].to_numpy(), exact[quantile])
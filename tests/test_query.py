@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pipeline import loaders, quantiles, query, rollups
+
+
+FILTERS = [
+    None,
+    [("metro_area", "==", "North")],
+    [("delay_minutes", ">", 5), ("hour", "in", ["07:00", "08:00", "17:00"])],
+    [("delay_minutes", ">=", -2), ("delay_minutes", "<=", 2), ("day_name", "!=", "Saturday")],
+]
+
+
+def route_filter(backend):
+    route_id = int(backend.count_by(["OperatorLineId"]).nlargest(1, "rows")["OperatorLineId"].iloc[0])
+    return [("OperatorLineId", "==", route_id), ("delay_minutes", "<", 10)]
+
+
+def test_scan(backends):
+    pandas_backend, arrow_backend = backends
+    columns = ["OperatorLineId", "cluster_nm", "hour", "date", "minute_of_day", "delay_minutes"]
+    for filters in FILTERS[1:] + [route_filter(pandas_backend)]:
+        # Row order is the storage order of each backend
+        expected = pandas_backend.scan(columns, filters).sort_values(columns, ignore_index=True)
+        result = arrow_backend.scan(columns, filters).sort_values(columns, ignore_index=True)
+        pd.testing.assert_frame_equal(result, expected)
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+@pytest.mark.parametrize("by", [["metro_area"], ["cluster_nm", "hour"], ["OperatorLineId", "date"]])
+def test_group_stats(backends, by, filters):
+    pandas_backend, arrow_backend = backends
+    for dropna in (True, False):
+        pd.testing.assert_frame_equal(
+            arrow_backend.group_stats(by, "delay_minutes", query.STATS, filters, dropna=dropna),
+            pandas_backend.group_stats(by, "delay_minutes", query.STATS, filters, dropna=dropna))
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+@pytest.mark.parametrize("by", [["metro_area"], ["operator_nm", "day_name"], ["hour", "delay_category"]])
+def test_count_by(backends, by, filters):
+    pandas_backend, arrow_backend = backends
+    for dropna in (True, False):
+        pd.testing.assert_frame_equal(arrow_backend.count_by(by, filters, dropna=dropna),
+                                      pandas_backend.count_by(by, filters, dropna=dropna))
+
+
+@pytest.mark.parametrize("stat", ["mean", "std", "count", "max"])
+def test_top_n(backends, stat):
+    pandas_backend, arrow_backend = backends
+    pd.testing.assert_frame_equal(
+        arrow_backend.top_n(["OperatorLineId"], "delay_minutes", 10, stat, min_count=20),
+        pandas_backend.top_n(["OperatorLineId"], "delay_minutes", 10, stat, min_count=20))
+
+
+# Names that the postprocess maps onto one key form one group in both
+# backends, although Arrow aggregates them separately
+def test_keys_merged_by_postprocess(performance_paths):
+    path = performance_paths["dataset"]
+    clusters = sorted(loaders.distinct_rows(path, ["cluster_nm"])["cluster_nm"])
+
+    def merge_clusters(frame):
+        frame = loaders.compact_performance_types(frame)
+        frame["cluster_nm"] = frame["cluster_nm"].astype(object).replace({clusters[0]: clusters[1]}) \
+            .astype("category")
+        return frame
+
+    pandas_backend = query.PandasBackend(merge_clusters(loaders.load_performance(path)[0]))
+    arrow_backend = query.ArrowBackend(path, merge_clusters)
+    result = arrow_backend.group_stats(["cluster_nm"], "delay_minutes", query.STATS)
+    assert clusters[0] not in set(result["cluster_nm"])
+    pd.testing.assert_frame_equal(result, pandas_backend.group_stats(["cluster_nm"], "delay_minutes", query.STATS))
+    pd.testing.assert_frame_equal(arrow_backend.count_by(["cluster_nm", "hour"]),
+                                  pandas_backend.count_by(["cluster_nm", "hour"]))
+
+
+def test_histogram(backends):
+    pandas_backend, arrow_backend = backends
+    for filters in FILTERS:
+        expected_counts, expected_edges = pandas_backend.histogram("delay_minutes", 30, (-10, 20), filters)
+        counts, edges = arrow_backend.histogram("delay_minutes", 30, (-10, 20), filters)
+        np.testing.assert_array_equal(counts, expected_counts)
+        np.testing.assert_array_equal(edges, expected_edges)
+
+
+def test_delay_rollups(backends):
+    pandas_backend, arrow_backend = backends
+    expected = rollups.build_delay_rollups(pandas_backend)
+    result = rollups.build_delay_rollups(arrow_backend)
+    assert result.keys() == expected.keys()
+    for name in ["cube"] + list(quantiles.SKETCHES) + list(rollups.ROLLUP_KEYS) + ["metro_kpis"]:
+        pd.testing.assert_frame_equal(result[name], expected[name], obj=name)
+    pd.testing.assert_series_equal(result["category"], expected["category"])
+    for name, table in expected["quantiles"].items():
+        if isinstance(table, pd.Series):
+            pd.testing.assert_series_equal(result["quantiles"][name], table)
+        else:
+            pd.testing.assert_frame_equal(result["quantiles"][name], table, obj=f"quantiles {name}")
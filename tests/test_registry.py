@@ -0,0 +1,59 @@
+import os
+
+import pandas as pd
+
+from pipeline import registry
+
+
+def write(path, rows, mtime_ns):
+    pd.DataFrame({"value": range(rows)}).to_parquet(path, index=False)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_reload_on_change(tmp_path):
+    path = str(tmp_path / "data.parquet")
+    write(path, 10, 1_000_000_000_000)
+    loads = []
+
+    def loader(source):
+        loads.append(source)
+        return pd.read_parquet(source)
+
+    datasets = registry.DatasetRegistry()
+    datasets.register("data", path, loader)
+    first = datasets.get("data")
+    assert datasets.get("data") is first
+    assert registry.fingerprint(path) == first.fingerprint
+    assert len(loads) == 1
+
+    # Rewritten: same size, new mtime
+    write(path, 10, 2_000_000_000_000)
+    assert datasets.fingerprint("data") != first.fingerprint
+    second = datasets.get("data")
+    assert second is not first and second.fingerprint == datasets.fingerprint("data")
+    assert len(loads) == 2
+    assert datasets.get("data") is second
+
+
+# A partitioned dataset changes version when a file is added
+def test_directory_fingerprint(tmp_path):
+    directory = tmp_path / "dataset"
+    (directory / "month=2024-03").mkdir(parents=True)
+    write(str(directory / "month=2024-03" / "part-0.parquet"), 10, 1_000_000_000_000)
+    before = registry.fingerprint(str(directory))
+    assert registry.fingerprint(str(directory)) == before
+
+    (directory / "month=2024-04").mkdir()
+    write(str(directory / "month=2024-04" / "part-0.parquet"), 10, 1_000_000_000_000)
+    assert registry.fingerprint(str(directory)) != before
+
+
+# Callers get shallow copies: a column they add is not in the shared frame
+def test_data_is_a_copy(tmp_path):
+    path = str(tmp_path / "data.parquet")
+    write(path, 10, 1_000_000_000_000)
+    datasets = registry.DatasetRegistry()
+    datasets.register("data", path, pd.read_parquet)
+    frame = datasets.get("data").data
+    frame["doubled"] = frame["value"] * 2
+    assert list(datasets.get("data").data.columns) == ["value"]
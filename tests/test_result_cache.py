@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+
+from pipeline import result_cache
+
+
+KB = 1024
+
+
+def block(kb):
+    return np.zeros(kb * KB, dtype=np.uint8)
+
+
+def key(function, n):
+    return (function, ("n", n))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000.0]
+    monkeypatch.setattr(result_cache.time, "time", lambda: now[0])
+    return now
+
+
+# The least recently used entries of any function are evicted once the
+# measured total exceeds the budget
+def test_budget_eviction():
+    cache = result_cache.ResultCache(max_bytes=300 * KB)
+    for n in range(3):
+        cache.put(key("a", n), block(90))
+    assert cache.get(key("a", 0)) is not None
+    cache.put(key("b", 0), block(90))
+
+    assert cache.get(key("a", 1)) is None
+    assert all(cache.get(other) is not None for other in [key("a", 0), key("a", 2), key("b", 0)])
+    assert cache.stats()["bytes"] == 4 * 90 * KB - 90 * KB
+    assert cache.counters["a"]["evictions"] == 1 and cache.counters["b"]["evictions"] == 0
+
+
+def test_max_entries():
+    cache = result_cache.ResultCache(max_bytes=10 * 1024 * KB)
+    cache.put(key("b", 0), block(1))
+    for n in range(4):
+        cache.put(key("a", n), block(1), max_entries=2)
+
+    assert [cache.get(key("a", n)) is not None for n in range(4)] == [False, False, True, True]
+    assert cache.get(key("b", 0)) is not None
+    assert cache.counters["a"]["evictions"] == 2
+
+
+def test_ttl_expiry(clock):
+    cache = result_cache.ResultCache()
+    cache.put(key("a", 0), block(1), ttl=60)
+    cache.put(key("a", 1), block(1))
+    clock[0] += 59
+    assert cache.get(key("a", 0)) is not None
+    clock[0] += 2
+    assert cache.get(key("a", 0)) is None
+    assert cache.get(key("a", 1)) is not None
+    assert cache.counters["a"]["expired"] == 1
+    assert cache.stats()["entries"] == 1
+
+
+# A value larger than the whole budget is not stored and evicts nothing
+def test_oversize_value():
+    cache = result_cache.ResultCache(max_bytes=100 * KB)
+    cache.put(key("a", 0), block(50))
+    cache.put(key("a", 1), block(101))
+    assert cache.get(key("a", 1)) is None
+    assert cache.get(key("a", 0)) is not None
+    assert cache.stats() == {"entries": 1, "bytes": 50 * KB, "max_bytes": 100 * KB}
+
+
+def test_counters():
+    cache = result_cache.ResultCache()
+    calls = []
+
+    @result_cache.cached(cache=cache)
+    def square(n, _label=None):
+        calls.append(n)
+        return n * n
+
+    assert [square(2), square(2, _label="other"), square(3), square(2)] == [4, 4, 9, 4]
+    assert calls == [2, 3]
+    name = f"{__name__}.test_counters.<locals>.square"
+    assert cache.counters[name] == {"hits": 2, "misses": 2, "evictions": 0, "expired": 0}
+    report = cache.report().set_index("function")
+    assert report.loc[name, "entries"] == 2 and report.loc[name, "hits"] == 2
+
+    square.clear()
+    assert cache.stats()["entries"] == 0
+
+
+# Functions sharing a name (e.g. a loader in two pages) do not share entries
+def test_functions_with_the_same_name():
+    cache = result_cache.ResultCache()
+
+    def routes_page():
+        @result_cache.cached(cache=cache)
+        def load(n):
+            return n
+        return load
+
+    def demand_page():
+        @result_cache.cached(cache=cache)
+        def load(n):
+            return n + 100
+        return load
+
+    assert routes_page()(1) == 1
+    assert demand_page()(1) == 101
+    assert cache.stats()["entries"] == 2
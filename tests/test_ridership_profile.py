@@ -0,0 +1,33 @@
+import pandas as pd
+
+from benchmarks import synthetic
+from pipeline import ridership_profile, time_buckets
+
+
+# The per day type / time range sums of the page's former three melts
+def melted_totals(data):
+    melted = []
+    for day_type in time_buckets.DAY_TYPES:
+        columns = [column for column in data.columns if column.startswith(day_type)]
+        frame = data.melt(id_vars=["RouteID", "Metropolin"], value_vars=columns,
+                          var_name="TimePeriod", value_name="Passengers")
+        frame["DayType"] = day_type
+        frame["TimeRange"] = frame["TimePeriod"].str.split(" - ").str[1]
+        melted.append(frame)
+    return pd.concat(melted).groupby(["DayType", "TimeRange"])["Passengers"].sum()
+
+
+def test_matches_melted_totals():
+    data = synthetic.make_ridership(0.05, seed=2)
+    data.loc[:9, ridership_profile.profile_columns()[:4]] = None
+    profile = ridership_profile.build_time_profile(data)
+
+    assert profile["DayType"].cat.categories.tolist() == time_buckets.DAY_TYPES
+    assert profile["TimeRange"].cat.ordered
+    assert profile["TimeRange"].cat.categories.tolist() == time_buckets.labels("ridership")
+    assert profile["Passengers"].dtype == "float32"
+
+    expected = melted_totals(data)
+    result = profile.astype({"DayType": str, "TimeRange": str}).set_index(["DayType", "TimeRange"])["Passengers"]
+    pd.testing.assert_series_equal(result.sort_index().astype("float64"), expected.sort_index(), check_names=False,
+                                   rtol=1e-6)
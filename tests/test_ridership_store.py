@@ -0,0 +1,103 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks import synthetic
+from pipeline import dimensions, ridership_store
+
+
+RAW_NAME = "קווי נצרת - נסיעות ותיירות"
+
+
+# An export where some routes carry a cluster name that is corrected on
+# aggregation, and the same export a year later with 10% more of everything
+# and one cluster gone
+@pytest.fixture(scope="module")
+def exports(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("exports")
+    previous = synthetic.make_ridership(0.05, seed=7)
+    previous.loc[:19, "ClusterName"] = RAW_NAME
+    previous.loc[20:39, "ClusterName"] = dimensions.NAME_CORRECTIONS[RAW_NAME]
+    current = previous.copy()
+    current[ridership_store.MEASURES] *= 1.1
+    dropped = current["ClusterName"].iloc[-1]
+    current = current[current["ClusterName"] != dropped]
+    paths = {}
+    for snapshot, frame in [("2024", previous), ("2025", current)]:
+        paths[snapshot] = str(directory / f"ridership_{snapshot}.csv")
+        frame.to_csv(paths[snapshot], index=False)
+    return {"paths": paths, "dropped": dropped}
+
+
+@pytest.fixture(scope="module")
+def store(tmp_path_factory, exports):
+    store = str(tmp_path_factory.mktemp("store") / "ridership")
+    for snapshot, path in exports["paths"].items():
+        ridership_store.add_snapshot(path, snapshot, store)
+    return store
+
+
+def assert_aggregates_equal(result, expected):
+    assert sorted(result) == sorted(expected)
+    for level in expected:
+        pd.testing.assert_frame_equal(result[level].astype(str), expected[level].astype(str), check_dtype=False)
+
+
+def test_snapshot_round_trip(store, exports):
+    assert ridership_store.snapshots(store) == ["2024", "2025"]
+    expected = ridership_store.aggregate(ridership_store.read_ridership(exports["paths"]["2024"]))
+    assert_aggregates_equal(ridership_store.load_aggregates(store, "2024"), expected)
+
+    rows = ridership_store.read_ridership(ridership_store.snapshot_dir(store, "2024"))
+    assert len(rows) == ridership_store.load_manifest(store)["snapshots"]["2024"]["rows"]
+    assert int(expected["route"]["rows"].sum()) == len(rows)
+
+
+# Snapshots stored before the cube was added derive it from their rows
+def test_cube_derived_when_missing(tmp_path, exports):
+    store = str(tmp_path / "ridership")
+    ridership_store.add_snapshot(exports["paths"]["2024"], "2024", store)
+    stored = ridership_store.load_aggregates(store, "2024")
+    os.remove(os.path.join(ridership_store.aggregates_dir(store, "2024"), "cube.parquet"))
+    assert_aggregates_equal(ridership_store.load_aggregates(store, "2024"), stored)
+
+
+def test_snapshot_names(tmp_path, exports):
+    store = str(tmp_path / "ridership")
+    with pytest.raises(ValueError):
+        ridership_store.add_snapshot(exports["paths"]["2024"], "2024-Q5", store)
+    ridership_store.add_snapshot(exports["paths"]["2024"], "2024", store)
+    with pytest.raises(ValueError):
+        ridership_store.add_snapshot(exports["paths"]["2025"], "2024", store)
+    ridership_store.add_snapshot(exports["paths"]["2025"], "2024", store, replace=True)
+    assert ridership_store.load_aggregates(store, "2024")["route"]["rows"].sum() \
+        == len(ridership_store.read_ridership(exports["paths"]["2025"]))
+
+
+# Corrected names are aggregated together, in the levels and in the cube
+def test_names_canonicalized(store):
+    aggregates = ridership_store.load_aggregates(store, "2024")
+    corrected = dimensions.NAME_CORRECTIONS[RAW_NAME]
+    clusters = aggregates["cluster"].set_index("ClusterName")
+    assert RAW_NAME not in clusters.index
+    assert clusters.loc[corrected, "rows"] >= 40
+    assert RAW_NAME not in set(aggregates["cube"]["ClusterName"].astype(str))
+    assert aggregates["cube"].loc[aggregates["cube"]["ClusterName"] == corrected, "rows"].sum() \
+        == clusters.loc[corrected, "rows"]
+
+
+def test_year_over_year(store, exports):
+    previous = ridership_store.load_aggregates(store, "2024")["cluster"]
+    current = ridership_store.load_aggregates(store, "2025")["cluster"]
+    comparison = ridership_store.compare(current, previous, "ClusterName").set_index("ClusterName")
+
+    dropped = comparison.loc[exports["dropped"]]
+    assert dropped["WeeklyPassengers"] == 0 and dropped["WeeklyPassengers_change_pct"] == -100
+    kept = comparison.drop(index=exports["dropped"])
+    for measure in ridership_store.MEASURES:
+        np.testing.assert_allclose(kept[f"{measure}_change"], kept[f"{measure}_previous"] * 0.1, rtol=1e-6)
+        positive = kept[f"{measure}_previous"] > 0
+        np.testing.assert_allclose(kept.loc[positive, f"{measure}_change_pct"], 10, atol=0.01)
+    assert (kept["routes_change"] == 0).all()
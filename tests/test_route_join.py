@@ -0,0 +1,30 @@
+import pandas as pd
+
+from pipeline import route_join
+
+
+def overrides(rows):
+    frame = pd.DataFrame(rows, columns=["RouteID", "ClusterName", "OperatorLineId", "cluster_nm"])
+    return frame.astype({"ClusterName": "string", "cluster_nm": "string"})
+
+
+def mapped(mapping):
+    return sorted((row.RouteID, row.ClusterName, row.OperatorLineId, row.cluster_nm, row.match)
+                  for row in mapping.astype({"ClusterName": object, "cluster_nm": object}).itertuples())
+
+
+# Route 10 runs in two regions; an entry with a ClusterName replaces the
+# mapping of that region only, one without replaces every region's
+def test_overrides_keyed_by_route_and_region():
+    demand = pd.DataFrame({"RouteID": [10, 10, 20], "ClusterName": ["A", "B", "A"]}).astype({"ClusterName": "category"})
+    lines = pd.DataFrame({"OperatorLineId": [10, 10, 30, 30],
+                          "cluster_nm": ["A", "B", "A", "C"]}).astype({"cluster_nm": "category"})
+
+    assert mapped(route_join.build_mapping(demand, lines)) == [
+        (10, "A", 10, "A", "id+cluster"), (10, "B", 10, "B", "id+cluster")]
+
+    result = route_join.build_mapping(demand, lines, overrides([(10, "B", 30, None), (20, None, 30, "C")]))
+    assert mapped(result) == [
+        (10, "A", 10, "A", "id+cluster"),
+        (10, "B", 30, "A", "override"), (10, "B", 30, "C", "override"),
+        (20, "A", 30, "C", "override")]
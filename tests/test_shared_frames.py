@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from pipeline import shared_frames
+
+
+ROWS = 100_000
+
+
+def sample_frame():
+    rng = np.random.default_rng(0)
+    delay = rng.normal(0, 5, ROWS).astype("float32")
+    delay[::50] = np.nan
+    date = pd.Series(pd.to_datetime("2024-03-01") + pd.to_timedelta(rng.integers(0, 31, ROWS), unit="D"))
+    date[::70] = pd.NaT
+    return pd.DataFrame({
+        "OperatorLineId": rng.integers(1, 1000, ROWS).astype("int32"),
+        "delay_minutes": delay,
+        "date": date,
+        "operator_nm": pd.Categorical(rng.choice(["a", "b", "c"], ROWS)),
+        "RouteType": rng.choice(["urban", "intercity"], ROWS).astype(object),
+    })
+
+
+# Read back through the memory map, columns with missing values included,
+# every numeric, date and categorical column is a read-only view of the
+# file and strings stay Arrow-backed, so next to nothing is allocated
+def test_snapshot_is_not_copied(tmp_path, monkeypatch):
+    monkeypatch.setattr(shared_frames, "SNAPSHOT_DIR", str(tmp_path))
+    frame = sample_frame()
+    path = shared_frames.write_snapshot(frame, "performance", "key")
+
+    before = pa.total_allocated_bytes()
+    snapshot = shared_frames.read_snapshot(path)
+    assert pa.total_allocated_bytes() - before < 4_096
+
+    for column in ["OperatorLineId", "delay_minutes", "date"]:
+        assert not snapshot[column].to_numpy().flags.writeable, column
+    assert not snapshot["operator_nm"].cat.codes.to_numpy().flags.writeable
+    assert isinstance(snapshot["RouteType"].dtype, pd.ArrowDtype)
+
+    pd.testing.assert_frame_equal(snapshot.astype({"RouteType": object}), frame)
+
+
+def test_older_snapshots_removed(tmp_path, monkeypatch):
+    monkeypatch.setattr(shared_frames, "SNAPSHOT_DIR", str(tmp_path))
+    frame = sample_frame().head(10)
+    shared_frames.write_snapshot(frame, "performance", "old")
+    shared_frames.write_snapshot(frame, "ridership", "old")
+    shared_frames.write_snapshot(frame, "performance", "new")
+    assert sorted(shared_frames.snapshots()) == ["performance-new.arrow", "ridership-old.arrow"]
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks import synthetic
+from pipeline import chart_summaries, preprocess, quantiles, query, rollups, streaming
+
+
+# Small batches, so partials of many batches are merged
+BATCH_SIZE = 3_000
+
+
+def test_streaming_rollups(performance_data):
+    expected = rollups.build_delay_rollups(query.PandasBackend(performance_data["frame"]))
+    result = streaming.stream_rollups(performance_data["path"], BATCH_SIZE, performance_data["encode_result"])
+    assert set(expected) <= set(result)
+    for name in ["cube", "day_boxes"] + list(quantiles.SKETCHES) + list(rollups.ROLLUP_KEYS):
+        pd.testing.assert_frame_equal(result[name], expected[name], check_dtype=False, obj=name)
+    pd.testing.assert_frame_equal(result["metro_kpis"], expected["metro_kpis"], check_dtype=False)
+    pd.testing.assert_series_equal(result["category"], expected["category"])
+
+
+# Day of week boxes from the sketch against the exact box statistics: within
+# the width of the bins around the values (0.5 minutes within +-10 minutes,
+# 1 minute within +-30), with exact means and counts
+def test_day_boxes(performance_data):
+    frame = performance_data["frame"]
+    expected = chart_summaries.grouped_box_stats(frame, "day_name", "delay_minutes")
+    result = rollups.build_delay_rollups(query.PandasBackend(frame))["day_boxes"]
+    assert result["day_name"].astype(str).tolist() == expected["day_name"].astype(str).tolist()
+    for column in ["q1", "median", "q3", "lowerfence", "upperfence"]:
+        np.testing.assert_allclose(result[column], expected[column], atol=1, err_msg=column)
+    np.testing.assert_allclose(result["mean"], expected["mean"], rtol=1e-6)
+    np.testing.assert_array_equal(result["count"], expected["count"])
+
+
+# A batch without any planned time or delay has empty sketches and all-NA
+# keys; merging it must neither warn nor lose its rows
+@pytest.mark.filterwarnings("error::FutureWarning")
+def test_merge_batches_without_delays(tmp_path):
+    ridership = synthetic.make_ridership(0.005, seed=1)
+    raw = synthetic.make_raw_trips(ridership, 3_000, seed=5)
+    raw.loc[:999, ["trip_time", "bitzua_history_start_dt"]] = None
+    path = str(tmp_path / "performance.parquet")
+    preprocess.derive_performance_columns(raw).drop(columns=["month"]).to_parquet(path, index=False)
+
+    partials = streaming.stream_partials(path, batch_size=1_000)
+    assert partials["cube"]["rows"].sum() == 3_000
+    assert partials["route_sketch"]["count"].sum() == raw["bitzua_history_start_dt"].notna().sum()